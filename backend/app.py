@@ -1,14 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_file
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
+import io
+import csv
 import uuid
 import sqlite3
 import json
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from twilio.twiml.voice_response import VoiceResponse
-from services.twilio_routes import twilio_bp
+from services.twilio_routes import twilio_bp, get_twilio_client
 
 
 # Service imports
@@ -16,6 +18,31 @@ from services.twilio_service import TwilioService
 from services.llm_service import LLMService
 from services.deepgram_service import DeepgramService
 from services.knowledge_service import KnowledgeService
+from services.vad_service import MediaStreamSession
+from services.call_control import call_interrupts
+from services.background import PeriodicTask
+from services.call_sync import call_sync, TERMINAL_STATUSES
+from services.recording_resolver import recording_resolver
+from services.recording_index import recording_index
+from services.daily_stats import daily_stats
+from services.response_cache import response_cache
+from services.twilio_clients import twilio_clients
+from services.phone_routes import phone_routes
+from services.campaign_service import campaign_dialer
+from services.twiml_templates import twiml_templates
+from services.webhook_inbox import webhook_inbox
+from services.tracing import tracer
+from services.llm_providers import llm_router, migrate_legacy_config
+from services.circuit_breaker import circuit_breakers
+from services.profiling import profiler, MODES as PROFILE_MODES
+from services.speculation import speculator
+from services.slot_filling import slot_filler
+
+# Media streams (server-side VAD and barge-in) need websocket support
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
 
 import logging
 logger = logging.getLogger(__name__)
@@ -30,11 +57,14 @@ logging.basicConfig(
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor', 'X-Profile-Name'])
 
  # Register the Twilio blueprint
 app.register_blueprint(twilio_bp)
 
+# Websocket endpoints are only available when flask-sock is installed
+sock = Sock(app) if Sock else None
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx', 'csv', 'json'}
@@ -47,10 +77,71 @@ def get_db_connection():
     conn.row_factory = sqlite3.Row
     return conn
 
+# Columns added after the first release, so existing databases get them too
+MIGRATIONS = [
+    ('active_calls', 'customer_number', 'TEXT'),
+    ('call_logs', 'status', 'TEXT'),
+    ('active_calls', 'version', 'INTEGER DEFAULT 1'),
+    ('recordings', 'channels', 'INTEGER'),
+    ('recordings', 'date_created', 'TEXT'),
+    ('transcriptions', 'date_created', 'TEXT'),
+    ('webhook_inbox', 'ordering_key', 'TEXT'),
+    ('webhook_inbox', 'next_attempt_at', 'TEXT'),
+]
+
+# Tables that used to be created on the fly without unique keys: (table, key column)
+DEDUPLICATE = [
+    ('recordings', 'recording_sid'),
+    ('transcriptions', 'transcription_sid'),
+]
+
+def migrate_db(conn):
+    for table, column, column_type in MIGRATIONS:
+        columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if columns and column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+    
+    # Drop duplicate rows so the unique indexes in the schema can be created
+    for table, key in DEDUPLICATE:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+            conn.execute(f'DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {key})')
+            conn.execute(f'UPDATE {table} SET date_created = created_at WHERE date_created IS NULL')
+    conn.commit()
+
+# Bumped by one-off data migrations in init_db (PRAGMA user_version)
+DATA_VERSION = 1
+
+def migrate_data(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    
+    if version < 1:
+        # Tenants saved with the config form's old OpenAI default always ran on Groq, keep them there
+        for row in conn.execute('SELECT user_id, llm_config FROM user_config').fetchall():
+            migrated = migrate_legacy_config(json.loads(row['llm_config'] or '{}'))
+            if migrated is not None:
+                conn.execute('UPDATE user_config SET llm_config = ? WHERE user_id = ?', (json.dumps(migrated), row['user_id']))
+    
+    conn.execute(f'PRAGMA user_version = {DATA_VERSION}')
+    conn.commit()
+
 def init_db():
     conn = get_db_connection()
+    # Bring old tables up to date before the schema creates indexes on new columns
+    migrate_db(conn)
     with open('schema.sql') as f:
         conn.executescript(f.read())
+    migrate_data(conn)
+    
+    # Fill the rollup once for databases created before it existed
+    if not conn.execute('SELECT 1 FROM daily_stats LIMIT 1').fetchone():
+        with conn:
+            daily_stats.rebuild(conn)
+    
+    # Likewise route numbers configured before phone_routes existed
+    if not conn.execute('SELECT 1 FROM phone_routes LIMIT 1').fetchone():
+        with conn:
+            phone_routes.rebuild(conn)
+        phone_routes.invalidate()
     conn.close()
 
 # Initialize database tables if they don't exist
@@ -66,6 +157,50 @@ llm_service = LLMService()
 deepgram_service = DeepgramService()
 knowledge_service = KnowledgeService()
 
+# Mirror the Twilio call list incrementally so call logs are served locally
+def sync_twilio_calls():
+    client = get_twilio_client()
+    if client:
+        call_sync.sync(client)
+        
+        # Backfill recordings the webhooks missed into the local index; the call log
+        # pages only read that index, so they never wait on Twilio for this
+        try:
+            refresh_hours = int(os.getenv('RECORDING_REFRESH_HOURS', '24'))
+            recording_resolver.resolve(client, datetime.now(timezone.utc) - timedelta(hours=refresh_hours))
+        except Exception as e:
+            logger.error(f"Error refreshing recordings: {str(e)}")
+
+call_list_sync = PeriodicTask(
+    'twilio-call-sync',
+    int(os.getenv('TWILIO_SYNC_INTERVAL', '60')),
+    sync_twilio_calls
+).start()
+
+# Reap calls whose terminal status callback never arrived
+call_sweeper = PeriodicTask(
+    'call-sweeper',
+    int(os.getenv('CALL_SWEEP_INTERVAL', '60')),
+    lambda: llm_service.reap_stale_calls(int(os.getenv('CALL_MAX_IDLE_SECONDS', '1800')))
+).start()
+
+# Apply queued Twilio webhooks in batches
+webhook_consumer = PeriodicTask(
+    'webhook-consumer',
+    float(os.getenv('WEBHOOK_CONSUMER_INTERVAL', '0.5')),
+    webhook_inbox.drain
+).start()
+
+# Forget processed webhooks once Twilio can no longer retry them
+webhook_purger = PeriodicTask('webhook-purge', 3600, webhook_inbox.purge).start()
+
+# Dial running outbound campaigns within their concurrency and rate budgets
+campaign_scheduler = PeriodicTask(
+    'campaign-dialer',
+    float(os.getenv('CAMPAIGN_TICK_INTERVAL', '1')),
+    campaign_dialer.tick
+).start()
+
 # Routes
 @app.route('/api/user/config', methods=['POST'])
 def save_user_config():
@@ -83,6 +218,7 @@ def save_user_config():
     
     # Save to database
     conn = get_db_connection()
+    previous = conn.execute('SELECT twilio_config FROM user_config WHERE user_id = ?', (user_id,)).fetchone()
     conn.execute(
         """
         INSERT OR REPLACE INTO user_config 
@@ -91,9 +227,22 @@ def save_user_config():
         """, 
         (user_id, json.dumps(twilio_config), json.dumps(llm_config), json.dumps(deepgram_config))
     )
+    # Route the user's number to them in the same transaction
+    phone_routes.set_user_numbers(user_id, [twilio_config.get('phoneNumber')], conn=conn)
     conn.commit()
     conn.close()
     
+    # Only now, or a lookup in between could cache the old route again
+    phone_routes.invalidate()
+    
+    # Rebuild cached Twilio clients for the old and new accounts on next use
+    account_sids = {twilio_config.get('accountSid')}
+    if previous:
+        account_sids.add(json.loads(previous['twilio_config']).get('accountSid'))
+    for account_sid in account_sids:
+        if account_sid:
+            twilio_clients.forget(account_sid)
+    
     return jsonify({"success": True, "message": "Configuration saved successfully"})
 
 @app.route('/api/user/config/<user_id>', methods=['GET'])
@@ -236,8 +385,10 @@ def create_appointment():
         """,
         (user_id, customer_name, customer_phone, appointment_date, appointment_time, notes, datetime.now().isoformat())
     )
+    daily_stats.record_appointment(user_id, appointment_date, conn=conn)
     conn.commit()
     conn.close()
+    response_cache.invalidate('dashboard', user_id)
     
     # Send confirmation via Twilio (optional)
     
@@ -272,55 +423,124 @@ def handle_incoming_call():
     from_number = request.form.get('From')
     to_number = request.form.get('To')
     
-    # Get user configuration based on the Twilio number
-    conn = get_db_connection()
-    user = conn.execute(
-        'SELECT user_id FROM user_config WHERE json_extract(twilio_config, "$.phoneNumber") = ?', 
-        (to_number,)
-    ).fetchone()
+    # Find the tenant that owns the Twilio number that was called
+    user_id = phone_routes.lookup(to_number)
     
-    if not user:
+    if not user_id:
         # If no user is configured for this number, return generic message
         return twilio_service.generate_twiml_response("This phone number is not configured properly. Goodbye.", gather_speech=False)
     
-    user_id = user['user_id']
-    
     # Initialize call context using the LLM service
     llm_service.initialize_call_context(call_sid, user_id, from_number)
     
     # Start the conversation with the AI
     response = twilio_service.start_conversation(user_id, call_sid, from_number, to_number)
     
-    conn.close()
     return response
 
 @app.route('/api/webhook/call/status', methods=['POST'])
 def handle_call_status():
-    """Handle Twilio call status callbacks"""
+    """Acknowledge a Twilio call status callback and queue it for processing"""
     call_sid = request.form.get('CallSid')
     call_status = request.form.get('CallStatus')
     
+    if not call_sid or not call_status:
+        return jsonify({"error": "CallSid and CallStatus are required"}), 400
+    
     # Log the call status
     print(f"Call {call_sid} status: {call_status}")
     
-    # If call ended, clean up any resources
-    if call_status in ['completed', 'busy', 'failed', 'no-answer', 'canceled']:
-        # Clean up any session data
-        pass
+    # Abort any LLM work still running for an ended call right away,
+    # it only touches memory and shouldn't wait behind the queue
+    if call_status in TERMINAL_STATUSES:
+        call_interrupts.abort(call_sid)
+        speculator.discard(call_sid)
+    
+    try:
+        # Retried deliveries of the same status share a key and are dropped,
+        # and one call's statuses are applied in the order they arrived
+        webhook_inbox.enqueue(
+            'call-status', f"call-status:{call_sid}:{call_status}", request.form.to_dict(), ordering_key=call_sid
+        )
+    except Exception as e:
+        # Nothing was stored, let Twilio retry
+        logger.error(f"Error queueing call status: {str(e)}")
+        return '', 500
     
     return '', 204
 
+def process_call_status(form):
+    """Apply a queued call status callback"""
+    call_sid = form.get('CallSid')
+    call_status = form.get('CallStatus')
+    
+    # Keep the local call list mirror current between syncs
+    call_sync.apply_status_callback(form)
+    response_cache.invalidate('call-logs')
+    response_cache.invalidate('stats')
+    
+    # If call ended, clean up any resources
+    if call_status in TERMINAL_STATUSES:
+        # Campaign calls record their outcome so busy/no-answer numbers get retried
+        campaign_dialer.handle_status(call_sid, call_status)
+        
+        # Archive the conversation into call_logs and free the in-memory context
+        duration = form.get('CallDuration')
+        llm_service.finalize_call(
+            call_sid,
+            call_status=call_status,
+            duration=int(duration) if duration else None,
+            from_number=form.get('From'),
+            to_number=form.get('To')
+        )
+        response_cache.invalidate('dashboard')
+
+webhook_inbox.register('call-status', process_call_status)
+
 @app.route('/api/webhook/voice', methods=['POST'])
 def handle_voice_input():
     """Process voice input from a call in progress"""
     call_sid = request.form.get('CallSid')
     speech_result = request.form.get('SpeechResult')
     
-    # Process the speech with the LLM
-    response_text = llm_service.process_user_input(call_sid, speech_result)
+    # Every span timed while handling the webhook is keyed to this call's turn
+    with tracer.span('webhook.voice', call_sid=call_sid, root=True):
+        # Process the speech with the LLM
+        response_text = llm_service.process_user_input(call_sid, speech_result)
+        
+        # The caller barged in while we were thinking, just listen for what they are saying
+        if response_text is None:
+            return twilio_service.generate_twiml_response('')
+        
+        # Convert response to speech and return TwiML
+        return twilio_service.generate_twiml_response(response_text)
+
+@app.route('/api/webhook/voice/partial', methods=['POST'])
+def handle_partial_speech():
+    """Interim transcript from a Gather, used to start the reply before the caller finishes"""
+    call_sid = request.form.get('CallSid')
+    # Only the stable part, the unstable tail is still being revised by the recognizer
+    partial_text = request.form.get('StableSpeechResult')
     
-    # Convert response to speech and return TwiML
-    return twilio_service.generate_twiml_response(response_text)
+    if call_sid and partial_text:
+        llm_service.speculate(call_sid, partial_text)
+    
+    return '', 204
+
+def handle_media_stream(ws):
+    """Run server-side VAD over a Twilio media stream to detect barge-in"""
+    session = MediaStreamSession()
+    
+    while True:
+        message = ws.receive()
+        if message is None:
+            break
+        
+        if session.handle_message(json.loads(message)) == 'stop':
+            break
+
+if sock:
+    sock.route('/api/media-stream')(handle_media_stream)
 
 @app.route('/api/webhook/outbound-call', methods=['POST'])
 def handle_outbound_call():
@@ -333,25 +553,33 @@ def handle_outbound_call():
     # Debug log
     print(f"Outbound call webhook received: From={from_number}, To={to_number}, CallSid={call_sid}")
     
-    # Get the first available user configuration
-    conn = get_db_connection()
-    user = conn.execute('SELECT user_id FROM user_config LIMIT 1').fetchone()
-    conn.close()
+    # The tenant that owns the calling number
+    user_id = phone_routes.lookup(from_number)
     
-    if not user:
+    if not user_id:
+        # Single-tenant setups may not have configured the number, fall back to the first user
+        conn = get_db_connection()
+        user = conn.execute('SELECT user_id FROM user_config LIMIT 1').fetchone()
+        conn.close()
+        user_id = user['user_id'] if user else None
+    
+    if not user_id:
         # If no user configuration exists at all
         return twilio_service.generate_twiml_response(
             "No configuration found. Please set up the system first. Goodbye.",
             gather_speech=False
         )
     
-    user_id = user['user_id']
     print(f"Using configuration for user {user_id}")
     
     # Initialize call context
     llm_service.initialize_call_context(call_sid, user_id, to_number)
     
-    # Use a default greeting for all outbound calls
+    # Use a default greeting for all outbound calls, the document never changes
+    return twiml_templates.render(('outbound-greeting', speculator.partial_callback), build_outbound_greeting_twiml)
+
+def build_outbound_greeting_twiml(text=None):
+    """TwiML greeting the callee of an outbound call"""
     response = VoiceResponse()
     
     # Gather speech input
@@ -360,7 +588,8 @@ def handle_outbound_call():
         action='/api/webhook/voice',
         method='POST',
         speechTimeout='auto',
-        speechModel='phone_call'
+        speechModel='phone_call',
+        partialResultCallback=speculator.partial_callback
     )
     
     # Initial greeting inside the gather
@@ -411,6 +640,70 @@ def make_outbound_call():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Outbound Campaigns
+@app.route('/api/campaigns', methods=['POST'])
+def create_campaign():
+    """Create a dialing campaign from a JSON number list or an uploaded CSV (first column)"""
+    if request.files:
+        data = request.form
+        file = request.files.get('file')
+        if not file or file.filename == '':
+            return jsonify({"error": "No selected file"}), 400
+        rows = csv.reader(io.StringIO(file.read().decode('utf-8-sig')))
+        phone_numbers = [row[0] for row in rows if row]
+    else:
+        data = request.json or {}
+        phone_numbers = data.get('phoneNumbers', [])
+    
+    user_id = data.get('userId')
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    
+    try:
+        campaign_id = campaign_dialer.create_campaign(
+            user_id,
+            data.get('name', 'Campaign'),
+            phone_numbers,
+            callback_base=os.getenv('PUBLIC_BASE_URL') or f"https://{request.headers.get('Host')}",
+            max_concurrent=int(data.get('maxConcurrent', 5)),
+            calls_per_second=float(data.get('callsPerSecond', 1)),
+            max_attempts=int(data.get('maxAttempts', 3)),
+            retry_delay=int(data.get('retryDelay', 300))
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Start dialing right away unless asked not to
+    if str(data.get('start', 'true')).lower() != 'false':
+        campaign_dialer.set_status(campaign_id, 'running')
+    
+    return jsonify(campaign_dialer.progress(campaign_id)), 201
+
+@app.route('/api/campaigns/user/<user_id>', methods=['GET'])
+def list_campaigns(user_id):
+    """All of a user's campaigns with their progress"""
+    return jsonify(campaign_dialer.list_campaigns(user_id))
+
+@app.route('/api/campaigns/<int:campaign_id>', methods=['GET'])
+def get_campaign_progress(campaign_id):
+    """Progress of one campaign"""
+    progress = campaign_dialer.progress(campaign_id)
+    if not progress:
+        return jsonify({"error": "Campaign not found"}), 404
+    return jsonify(progress)
+
+@app.route('/api/campaigns/<int:campaign_id>/<action>', methods=['POST'])
+def control_campaign(campaign_id, action):
+    """Start, pause or cancel a campaign"""
+    statuses = {'start': 'running', 'pause': 'paused', 'cancel': 'canceled'}
+    if action not in statuses:
+        return jsonify({"error": f"Unknown action: {action}"}), 400
+    
+    if not campaign_dialer.set_status(campaign_id, statuses[action]):
+        return jsonify({"error": "Campaign not found or already finished"}), 404
+    
+    return jsonify(campaign_dialer.progress(campaign_id))
+
 @app.route('/api/webhook/speech', methods=['POST'])
 def handle_speech():
     # Get speech input
@@ -419,21 +712,125 @@ def handle_speech():
     
     print(f"Speech received: {speech_result}")
     
-    # Process with LLM service
-    llm_response = llm_service.process_user_input(call_sid, speech_result)
+    with tracer.span('webhook.speech', call_sid=call_sid, root=True):
+        # Process with LLM service
+        llm_response = llm_service.process_user_input(call_sid, speech_result)
+        
+        # Have AI respond, unless the caller interrupted the turn
+        return twiml_templates.render(('speech', speculator.partial_callback), build_speech_twiml, llm_response)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Latency percentiles and histograms per pipeline stage, or one call's spans with ?call_sid="""
+    call_sid = request.args.get('call_sid')
+    if call_sid:
+        return jsonify({'callSid': call_sid, 'spans': tracer.spans_for(call_sid)})
+    
+    return jsonify({
+        'tracing': tracer.enabled,
+        'bufferSize': tracer.capacity,
+        'spans': tracer.summary(),
+        'llm': llm_router.stats(),
+        'breakers': circuit_breakers.snapshot(),
+        'speculation': speculator.stats(),
+        'slots': slot_filler.stats()
+    })
+
+@app.before_request
+def start_profiling():
+    """Profile the request if it asks to with the admin token, or if it belongs to a flagged call"""
+    if not profiler.enabled:
+        return
+    
+    mode = request.headers.get('X-Profile')
+    if mode and profiler.authorized(request.headers.get('X-Profile-Token')):
+        label = f"request-{request.endpoint}"
+    elif profiler.has_flagged_calls():
+        # Only look into the form once some call is actually being profiled
+        call_sid = request.values.get('CallSid')
+        mode = profiler.mode_for_call(call_sid)
+        label = f"{call_sid}-{request.endpoint}"
+    else:
+        return
+    
+    if mode in PROFILE_MODES:
+        g.profile_session = profiler.start(mode, label)
+
+@app.after_request
+def finish_profiling(response):
+    session = g.pop('profile_session', None)
+    if session:
+        response.headers['X-Profile-Name'] = profiler.finish(session)
+    return response
+
+@app.teardown_request
+def abandon_profiling(exc):
+    # Safety net for requests that ended before after_request could run
+    session = g.pop('profile_session', None)
+    if session:
+        profiler.finish(session)
+
+def require_profiling_admin():
+    """Error response unless profiling is configured and the request carries its admin token"""
+    if not profiler.enabled:
+        return jsonify({"error": "Profiling is not enabled"}), 404
+    if not profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    return None
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    denied = require_profiling_admin()
+    if denied:
+        return denied
+    
+    return jsonify({'profiles': profiler.list_profiles(), 'flaggedCalls': profiler.flagged_calls()})
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+def download_profile(name):
+    denied = require_profiling_admin()
+    if denied:
+        return denied
+    
+    path = profiler.path_for(name)
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/api/admin/profiles/calls/<call_sid>', methods=['POST', 'DELETE'])
+def flag_call_for_profiling(call_sid):
+    """POST {"mode": "sampling"|"cprofile", "ttl": seconds} profiles every turn of the call, DELETE stops it"""
+    denied = require_profiling_admin()
+    if denied:
+        return denied
+    
+    if request.method == 'DELETE':
+        if not profiler.unflag_call(call_sid):
+            return jsonify({"error": "Call is not being profiled"}), 404
+        return jsonify({"success": True})
     
-    # Create TwiML response
+    data = request.get_json(silent=True) or {}
+    try:
+        profiler.flag_call(call_sid, mode=data.get('mode', 'sampling'), ttl=int(data.get('ttl', 3600)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({"success": True, "callSid": call_sid})
+
+def build_speech_twiml(text):
+    """TwiML saying the AI's reply while listening for the caller's next turn"""
     response = VoiceResponse()
     gather = response.gather(
         input='speech',
         action='/api/webhook/speech',
         method='POST',
         speechTimeout='auto',
-        speechModel='phone_call'
+        speechModel='phone_call',
+        partialResultCallback=speculator.partial_callback
     )
     
-    # Have AI respond
-    gather.say(llm_response, voice='Polly.Joanna')
+    if text:
+        gather.say(text, voice='Polly.Joanna')
     
     return str(response)
 
@@ -446,6 +843,7 @@ def process_with_llm(user_input):
 # Add these routes to app.py
 
 @app.route('/api/dashboard/summary/<user_id>', methods=['GET', 'OPTIONS'])
+@response_cache.cached('dashboard')
 def get_dashboard_summary(user_id):
     """Get dashboard summary data for a user"""
     # Handle CORS preflight request
@@ -496,41 +894,8 @@ def get_dashboard_summary(user_id):
         today = datetime.now().strftime('%Y-%m-%d')
         month_start = datetime.now().strftime('%Y-%m-01')
         
-        calls_today = conn.execute(
-            """
-            SELECT COUNT(*) as count FROM active_calls 
-            WHERE user_id = ? AND DATE(started_at) = ?
-            """,
-            (user_id, today)
-        ).fetchone()['count']
-        
-        calls_this_month = conn.execute(
-            """
-            SELECT COUNT(*) as count FROM active_calls 
-            WHERE user_id = ? AND DATE(started_at) >= ?
-            """,
-            (user_id, month_start)
-        ).fetchone()['count']
-        
-        # Get appointment statistics
-        appointments_today = conn.execute(
-            """
-            SELECT COUNT(*) as count FROM appointments 
-            WHERE user_id = ? AND appointment_date = ?
-            """,
-            (user_id, today)
-        ).fetchone()['count']
-        
-        upcoming_appointments = conn.execute(
-            """
-            SELECT COUNT(*) as count FROM appointments 
-            WHERE user_id = ? AND (
-                appointment_date > ? OR 
-                (appointment_date = ? AND appointment_time > ?)
-            )
-            """,
-            (user_id, today, today, datetime.now().strftime('%H:%M'))
-        ).fetchone()['count']
+        # Counters come from the daily rollup, one indexed range over this month's rows
+        stats = daily_stats.summary(user_id, today, month_start)
         
         # Get recent calls
         recent_calls = conn.execute(
@@ -538,14 +903,25 @@ def get_dashboard_summary(user_id):
             SELECT 
                 call_sid as id, 
                 started_at as startedAt, 
-                completed_at, 
+                ended_at as completed_at, 
                 status as outcome, 
-                context
+                duration,
+                from_number as fromNumber
+            FROM call_logs 
+            WHERE user_id = ?
+            UNION ALL
+            SELECT 
+                call_sid as id, 
+                started_at as startedAt, 
+                NULL as completed_at, 
+                'in-progress' as outcome, 
+                NULL as duration,
+                customer_number as fromNumber
             FROM active_calls 
             WHERE user_id = ? 
-            ORDER BY started_at DESC LIMIT 5
+            ORDER BY startedAt DESC LIMIT 5
             """,
-            (user_id,)
+            (user_id, user_id)
         ).fetchall()
         
         # Format recent calls
@@ -553,12 +929,9 @@ def get_dashboard_summary(user_id):
         for call in recent_calls:
             call_dict = dict(call)
             
-            # Parse the context to get more information
-            context_data = json.loads(call_dict['context'])
-            
-            # Calculate duration if call is completed
-            duration = None
-            if call_dict['completed_at']:
+            # Calculate duration if Twilio didn't report one
+            duration = call_dict['duration']
+            if duration is None and call_dict['completed_at'] and call_dict['startedAt']:
                 start_time = datetime.fromisoformat(call_dict['startedAt'])
                 end_time = datetime.fromisoformat(call_dict['completed_at'])
                 duration = (end_time - start_time).total_seconds()
@@ -568,7 +941,7 @@ def get_dashboard_summary(user_id):
                 'startedAt': call_dict['startedAt'],
                 'duration': duration or 0,
                 'outcome': call_dict['outcome'],
-                'fromNumber': context_data.get('customer_number', 'Unknown')
+                'fromNumber': call_dict['fromNumber'] or 'Unknown'
             })
         
         # Get recent appointments
@@ -599,10 +972,13 @@ def get_dashboard_summary(user_id):
             'twilioConfigured': twilioConfigured,
             'llmConfigured': llmConfigured,
             'deepgramConfigured': deepgramConfigured,
-            'callsToday': calls_today,
-            'callsThisMonth': calls_this_month,
-            'appointmentsToday': appointments_today,
-            'upcomingAppointments': upcoming_appointments,
+            'callsToday': stats['calls_today'],
+            'callsThisMonth': stats['calls_this_month'],
+            'completedCallsThisMonth': stats['completed_this_month'],
+            'failedCallsThisMonth': stats['failed_this_month'],
+            'talkTimeThisMonth': stats['duration_this_month'],
+            'appointmentsToday': stats['appointments_today'],
+            'upcomingAppointments': stats['upcoming_appointments'],
             'knowledgeBaseCount': kb_count,
             'scriptCount': script_count,
             'recentCalls': formatted_calls,
@@ -621,162 +997,6 @@ def get_dashboard_summary(user_id):
         return jsonify({"error": f"Database error: {str(e)}"}), 500
 
 
-
-# Enhanced Twilio Call Logs with Transcriptions and Recordings
-
-from twilio.rest import Client
-import os
-from datetime import datetime, timedelta
-import json
-
-@app.route('/api/call-logs/<username>', methods=['GET'])
-def get_call_logs(username):
-    try:
-        # Get Twilio credentials from environment variables
-        account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-        auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-        
-        if not account_sid or not auth_token:
-            logging.error("Twilio credentials not set in environment variables")
-            return jsonify({"error": "Twilio credentials not configured"}), 500
-        
-        # Initialize Twilio client
-        client = Client(account_sid, auth_token)
-        
-        # Get calls from the past 30 days (adjust as needed)
-        date_filter = datetime.now() - timedelta(days=30)
-        date_str = date_filter.strftime('%Y-%m-%d')
-        
-        # Query Twilio API for calls
-        calls_data = client.calls.list(start_time_after=date_str)
-        
-        # Transform Twilio call data to match your frontend expectations
-        calls = []
-        for call in calls_data:
-            # Extract phone number with proper formatting
-            phone_number = call.to if call.direction == 'outbound-api' else call.from_
-            
-            # Calculate duration in seconds
-            duration = int(call.duration) if call.duration else 0
-            
-            # Map Twilio call status to your app's status format
-            status_map = {
-                'queued': 'queued',
-                'ringing': 'ringing',
-                'in-progress': 'in-progress',
-                'completed': 'completed',
-                'busy': 'failed',
-                'failed': 'failed',
-                'no-answer': 'failed',
-                'canceled': 'failed'
-            }
-            status = status_map.get(call.status, call.status)
-            
-            # Format created timestamp
-            created_at = call.date_created.strftime('%Y-%m-%dT%H:%M:%S') if call.date_created else ''
-            
-            # Build call record
-            call_record = {
-                'id': call.sid,
-                'phone_number': phone_number,
-                'created_at': created_at,
-                'status': status,
-                'duration': str(duration),
-                'recording_url': '',
-                'transcript': '',
-                'notes': ''
-            }
-            
-            # Try to get recording and transcription if available
-            try:
-                # Get recordings for this call
-                recordings = client.recordings.list(call_sid=call.sid)
-                
-                if recordings:
-                    # Get the latest recording
-                    recording = recordings[0]
-                    
-                    # Set the recording URL
-                    # Using the .mp3 format for broader compatibility
-                    call_record['recording_url'] = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Recordings/{recording.sid}.mp3"
-                    
-                    # Get transcriptions for this recording
-                    transcriptions = client.transcriptions.list(recording_sid=recording.sid)
-                    
-                    if transcriptions:
-                        # Get the latest transcription
-                        transcription = transcriptions[0]
-                        
-                        # Fetch the transcription text
-                        transcription_text = client.transcriptions(transcription.sid).fetch().transcription_text
-                        
-                        # Set the transcript
-                        call_record['transcript'] = transcription_text
-            except Exception as e:
-                logging.error(f"Error getting recording/transcription for call {call.sid}: {str(e)}")
-            
-            # Get any notes from your database if you store them
-            try:
-                conn = sqlite3.connect('voice_ai.db')
-                cursor = conn.cursor()
-                
-                # Check if notes table exists
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='call_notes'")
-                if cursor.fetchone():
-                    cursor.execute("SELECT notes FROM call_notes WHERE call_sid = ?", (call.sid,))
-                    note_row = cursor.fetchone()
-                    
-                    if note_row:
-                        call_record['notes'] = note_row[0]
-                
-                conn.close()
-            except Exception as e:
-                logging.error(f"Error fetching notes for call {call.sid}: {str(e)}")
-            
-            calls.append(call_record)
-        
-        logging.info(f"Retrieved {len(calls)} calls with recordings and transcriptions from Twilio for user {username}")
-        return jsonify(calls)
-        
-    except Exception as e:
-        logging.error(f"Error getting Twilio call logs: {str(e)}")
-        
-        # For development/testing, return sample data if Twilio API fails
-        sample_calls = [
-            {
-                'id': 'CA123456789012345678901234567890ab',
-                'phone_number': '+1234567890',
-                'created_at': '2025-04-17T10:30:00',
-                'status': 'completed',
-                'duration': '120',
-                'recording_url': 'https://example.com/recording1.mp3',
-                'transcript': 'Hello, this is a sample transcription of the first call. I\'m interested in learning more about your services.',
-                'notes': 'Follow up next week'
-            },
-            {
-                'id': 'CA098765432109876543210987654321ba',
-                'phone_number': '+0987654321',
-                'created_at': '2025-04-16T14:45:00',
-                'status': 'completed',
-                'duration': '180',
-                'recording_url': 'https://example.com/recording2.mp3',
-                'transcript': 'Yes, I would like to schedule a demo of your premium plan. What times are available next week?',
-                'notes': 'Client interested in premium plan'
-            },
-            {
-                'id': 'CA567890123456789012345678901234cd',
-                'phone_number': '+1122334455',
-                'created_at': '2025-04-15T09:15:00',
-                'status': 'failed',
-                'duration': '0',
-                'recording_url': '',
-                'transcript': '',
-                'notes': 'Call failed to connect'
-            }
-        ]
-        logging.info("Error communicating with Twilio. Returning sample call data as fallback")
-        return jsonify(sample_calls)
-
 # Endpoint to save notes for a call
 @app.route('/api/call-notes', methods=['POST'])
 def save_call_notes():
@@ -820,101 +1040,45 @@ def save_call_notes():
 
 # Add these Flask endpoints to handle recording and transcription webhooks
 
-@app.route('/api/webhook/recording-status', methods=['POST'])
-def recording_status_webhook():
-    """Handle recording status callback from Twilio"""
-    try:
-        # Extract data from the request
-        call_sid = request.form.get('CallSid')
-        recording_sid = request.form.get('RecordingSid')
-        recording_url = request.form.get('RecordingUrl')
-        recording_status = request.form.get('RecordingStatus')
-        
-        logging.info(f"Recording status update: {recording_status} for call {call_sid}")
-        
-        # Store recording information in the database
-        if recording_status == 'completed':
-            conn = sqlite3.connect('voiceai.db')
-            cursor = conn.cursor()
-            
-            # Create recordings table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS recordings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    call_sid TEXT NOT NULL,
-                    recording_sid TEXT NOT NULL,
-                    recording_url TEXT,
-                    duration INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insert the recording info
-            cursor.execute('''
-                INSERT INTO recordings (call_sid, recording_sid, recording_url)
-                VALUES (?, ?, ?)
-            ''', (call_sid, recording_sid, recording_url))
-            
-            conn.commit()
-            conn.close()
-            
-            logging.info(f"Stored recording information for call {call_sid}")
-        
-        # Always return a success response to Twilio
-        return '', 204
-        
-    except Exception as e:
-        logging.error(f"Error handling recording status: {str(e)}")
-        return '', 500
-
 @app.route('/api/webhook/transcription', methods=['POST'])
 def transcription_webhook():
-    """Handle transcription callback from Twilio"""
+    """Acknowledge a transcription callback from Twilio and queue it for processing"""
+    transcription_sid = request.form.get('TranscriptionSid')
+    
+    if not transcription_sid or not request.form.get('CallSid') or not request.form.get('RecordingSid'):
+        return jsonify({"error": "CallSid, RecordingSid and TranscriptionSid are required"}), 400
+    
+    logging.info(f"Transcription status: {request.form.get('TranscriptionStatus')} for call {request.form.get('CallSid')}")
+    
     try:
-        # Extract data from the request
-        call_sid = request.form.get('CallSid')
-        recording_sid = request.form.get('RecordingSid')
-        transcription_sid = request.form.get('TranscriptionSid')
-        transcription_text = request.form.get('TranscriptionText')
-        transcription_status = request.form.get('TranscriptionStatus')
-        
-        logging.info(f"Transcription status: {transcription_status} for call {call_sid}")
-        
-        # Store transcription information in the database if complete
-        if transcription_status == 'completed' and transcription_text:
-            conn = sqlite3.connect('voiceai.db')
-            cursor = conn.cursor()
-            
-            # Create transcriptions table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transcriptions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    call_sid TEXT NOT NULL,
-                    recording_sid TEXT NOT NULL,
-                    transcription_sid TEXT NOT NULL,
-                    transcription_text TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insert the transcription info
-            cursor.execute('''
-                INSERT INTO transcriptions 
-                (call_sid, recording_sid, transcription_sid, transcription_text)
-                VALUES (?, ?, ?, ?)
-            ''', (call_sid, recording_sid, transcription_sid, transcription_text))
-            
-            conn.commit()
-            conn.close()
-            
-            logging.info(f"Stored transcription for call {call_sid}")
-        
-        # Always return a success response to Twilio
-        return '', 204
-        
+        # Retried deliveries of the same transcription share a key and are dropped
+        webhook_inbox.enqueue('transcription', f"transcription:{transcription_sid}", request.form.to_dict())
     except Exception as e:
-        logging.error(f"Error handling transcription: {str(e)}")
+        # Nothing was stored, let Twilio retry
+        logging.error(f"Error queueing transcription: {str(e)}")
         return '', 500
+    
+    return '', 204
+
+def process_transcription(form):
+    """Apply a queued transcription callback"""
+    call_sid = form.get('CallSid')
+    transcription_text = form.get('TranscriptionText')
+    
+    # Store transcription information in the database if complete
+    if form.get('TranscriptionStatus') == 'completed' and transcription_text:
+        recording_index.record_transcription(
+            call_sid,
+            form.get('RecordingSid'),
+            form.get('TranscriptionSid'),
+            transcription_text
+        )
+        
+        logging.info(f"Stored transcription for call {call_sid}")
+        recording_resolver.invalidate(form.get('AccountSid'))
+        response_cache.invalidate('call-logs')
+
+webhook_inbox.register('transcription', process_transcription)
 
     
 # Knowledge Base Endpoints
@@ -1014,8 +1178,10 @@ def delete_appointment(appointment_id):
             
         # Delete from database
         conn.execute('DELETE FROM appointments WHERE id = ?', (appointment_id,))
+        daily_stats.record_appointment(appointment['user_id'], appointment['appointment_date'], delta=-1, conn=conn)
         conn.commit()
         conn.close()
+        response_cache.invalidate('dashboard', appointment['user_id'])
         
         return jsonify({"success": True, "message": "Appointment deleted successfully"})
     except Exception as e:
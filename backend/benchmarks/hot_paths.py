@@ -0,0 +1,295 @@
+"""
+Micro-benchmarks for the code that runs on every turn or request, against a
+seeded SQLite database, compared with stored baselines.
+
+Run from the backend directory:
+    python benchmarks/hot_paths.py [--size small|medium|large] [--filter name]
+    python benchmarks/hot_paths.py --save     # record the current numbers as the baseline
+    python benchmarks/hot_paths.py --check    # exit non-zero on a regression
+
+Baselines live in benchmarks/baselines.json, one set per fixture size. They are
+machine specific, so re-record them with --save before comparing on new hardware.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import logging
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import contextlib
+import timeit
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+USER_ID = 'bench-user'
+
+# Rows seeded per fixture size, and the conversation lengths update_call_context is timed at
+SIZES = {
+    'small': {'chunks': 200, 'calls': 500, 'document_kb': 20, 'histories': (0, 10, 40)},
+    'medium': {'chunks': 2000, 'calls': 5000, 'document_kb': 200, 'histories': (0, 20, 80)},
+    'large': {'chunks': 20000, 'calls': 50000, 'document_kb': 2000, 'histories': (0, 40, 200)},
+}
+
+WORDS = (
+    "appointment booking schedule thursday afternoon morning grooming haircut price "
+    "hours open closed weekend holiday cancel reschedule confirm address parking payment "
+    "card cash deposit refund policy staff available service minutes consultation follow"
+).split()
+
+STATUSES = ['completed', 'completed', 'completed', 'busy', 'no-answer', 'failed']
+
+
+def words(rng, count):
+    return ' '.join(rng.choice(WORDS) for _ in range(count))
+
+
+def seed(conn, size, rng):
+    """Fill the tables the hot paths read with `size` worth of synthetic rows"""
+    now = datetime.now()
+    conn.execute(
+        'INSERT INTO user_config (user_id, twilio_config, llm_config, deepgram_config) VALUES (?, ?, ?, ?)',
+        (USER_ID,
+         json.dumps({'accountSid': 'AC' + '0' * 32, 'authToken': 'bench', 'phoneNumber': '+18005550000'}),
+         json.dumps({'provider': 'groq', 'model': 'llama3-8b-8192', 'apiKey': 'bench'}),
+         json.dumps({'apiKey': 'bench'}))
+    )
+
+    for kb in range(3):
+        conn.execute(
+            'INSERT INTO knowledge_base (user_id, kb_name, file_path, original_filename, created_at) VALUES (?, ?, ?, ?, ?)',
+            (USER_ID, f"kb-{kb}", f"uploads/kb-{kb}.txt", f"kb-{kb}.txt", now.isoformat())
+        )
+    conn.executemany(
+        'INSERT INTO knowledge_chunks (user_id, kb_name, chunk_index, chunk_text, file_path, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(USER_ID, f"kb-{i % 3}", i, words(rng, 150), f"uploads/kb-{i % 3}.txt", now.isoformat())
+         for i in range(size['chunks'])]
+    )
+
+    conn.execute(
+        'INSERT INTO scripts (user_id, script_name, script_content, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+        (USER_ID, 'default', json.dumps({'greeting': 'Hello, thanks for calling.'}), now.isoformat(), now.isoformat())
+    )
+
+    call_logs, twilio_calls, recordings, appointments = [], [], [], []
+    for i in range(size['calls']):
+        call_sid = 'CA' + uuid.UUID(int=rng.getrandbits(128)).hex
+        started = now - timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        duration = rng.randint(5, 600)
+        status = rng.choice(STATUSES)
+        history = [{'role': role, 'content': words(rng, 12), 'timestamp': started.isoformat()}
+                   for role in ('user', 'assistant') * 3]
+        from_number = f"+1555{rng.randint(0, 9999999):07d}"
+
+        call_logs.append((call_sid, USER_ID, from_number, '+18005550000', duration, json.dumps(history), status,
+                          started.isoformat(), (started + timedelta(seconds=duration)).isoformat()))
+        twilio_calls.append((call_sid, 'AC' + '0' * 32, from_number, '+18005550000', from_number, '(800) 555-0000',
+                             'inbound', status, duration, started.isoformat(),
+                             (started + timedelta(seconds=duration)).isoformat(), started.isoformat(), now.isoformat()))
+        if i % 3 == 0:
+            recordings.append((call_sid, 'RE' + uuid.UUID(int=rng.getrandbits(128)).hex, duration, started.isoformat()))
+        if i % 10 == 0:
+            day = now + timedelta(days=rng.randint(-30, 30))
+            appointments.append((USER_ID, words(rng, 2).title(), from_number, day.strftime('%Y-%m-%d'), '10:00', now.isoformat()))
+
+    conn.executemany(
+        """
+        INSERT INTO call_logs (call_sid, user_id, from_number, to_number, duration, conversation_history, status, started_at, ended_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        call_logs
+    )
+    conn.executemany(
+        """
+        INSERT INTO twilio_calls (call_sid, account_sid, from_number, to_number, from_formatted, to_formatted,
+                                  direction, status, duration, start_time, end_time, date_created, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        twilio_calls
+    )
+    conn.executemany(
+        'INSERT INTO recordings (call_sid, recording_sid, duration, date_created) VALUES (?, ?, ?, ?)',
+        recordings
+    )
+    conn.executemany(
+        'INSERT INTO appointments (user_id, customer_name, customer_phone, appointment_date, appointment_time, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        appointments
+    )
+
+
+def measure(func, setup=None, repeat=5, min_time=0.2):
+    """
+    Median microseconds per call. Without setup, calls are batched with timeit;
+    with setup, each call is timed on its own after setup() restores the fixture.
+    """
+    if setup is None:
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        number = max(1, int(number * min_time / 0.2))
+        return statistics.median(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+    samples = []
+    deadline = time.perf_counter() + min_time * repeat
+    while len(samples) < 10 or (time.perf_counter() < deadline and len(samples) < 10000):
+        setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1e6
+
+
+def build_benchmarks(backend, size, rng):
+    """(name, func, setup) for every hot path"""
+    from services.knowledge_service import KnowledgeService
+    from services.call_sync import call_sync
+    from services.recording_index import recording_index
+    from services.twilio_routes import format_call_logs
+
+    knowledge = KnowledgeService()
+    document = words(rng, size['document_kb'] * 1024 // 8)
+    reply = "Sure, I can book that for you. What time works best on Thursday?"
+
+    benchmarks = [
+        (f"knowledge._create_chunks[{size['document_kb']}KB]", lambda: knowledge._create_chunks(document), None),
+        ('knowledge.search_knowledge', lambda: knowledge.search_knowledge(USER_ID, 'Can I book a haircut on Thursday afternoon?'), None),
+    ]
+
+    for history in size['histories']:
+        call_sid = f"CA-bench-{history}"
+        state = {
+            'user_id': USER_ID,
+            'customer_number': '+15550000000',
+            'conversation_history': [
+                {'role': role, 'content': words(rng, 12), 'timestamp': datetime.now().isoformat()}
+                for role in ('user', 'assistant') * (history // 2)
+            ],
+            'context': {'has_appointment': False, 'appointment_details': {}, 'customer_name': None,
+                        'customer_needs': [], 'call_start_time': datetime.now().isoformat()}
+        }
+
+        def reset(call_sid=call_sid, state=state):
+            # Every sample starts from the same history length
+            backend.llm_service.call_states.delete(call_sid)
+            backend.llm_service.call_states.create(call_sid, state)
+
+        benchmarks.append((
+            f"llm.update_call_context[history={history}]",
+            lambda call_sid=call_sid: backend.llm_service.update_call_context(call_sid, 'Thursday at three please', reply),
+            reset
+        ))
+
+    benchmarks.append(('twilio.generate_twiml_response', lambda: backend.twilio_service.generate_twiml_response(reply), None))
+
+    def dashboard_summary():
+        # Straight to the view, past the response cache
+        with backend.app.test_request_context(f"/api/dashboard/summary/{USER_ID}"):
+            return backend.get_dashboard_summary.__wrapped__(USER_ID)
+    benchmarks.append(('app.dashboard_summary', dashboard_summary, None))
+
+    calls, _ = call_sync.page_calls(limit=50)
+    counts = recording_index.counts_for_calls([call['call_sid'] for call in calls])
+
+    def call_log_page():
+        page, _ = call_sync.page_calls(limit=50, status='completed')
+        return recording_index.counts_for_calls([call['call_sid'] for call in page])
+    benchmarks.append(('call_logs.page_calls[50]', call_log_page, None))
+    benchmarks.append(('call_logs.format_call_logs[50]', lambda: format_call_logs(calls, counts), None))
+
+    return benchmarks
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='medium', help="fixture size")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="slowdown over baseline counted as a regression")
+    parser.add_argument('--save', action='store_true', help="store these results as the baseline for --size")
+    parser.add_argument('--check', action='store_true', help="exit non-zero when a benchmark regressed")
+    parser.add_argument('--seed', type=int, default=1234)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    size = SIZES[args.size]
+    rng = random.Random(args.seed)
+
+    # The backend keeps its database and schema relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='voiceai-bench-')
+    shutil.copy(os.path.join(BACKEND_DIR, 'schema.sql'), workdir)
+    os.chdir(workdir)
+
+    logging.disable(logging.WARNING)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        import app as backend
+        for task in (backend.call_list_sync, backend.call_sweeper, backend.webhook_consumer,
+                     backend.webhook_purger, backend.campaign_scheduler):
+            task.stop()
+        # Measure the code paths, not the tracer
+        backend.tracer.enabled = False
+
+        conn = sqlite3.connect('voiceai.db')
+        conn.row_factory = sqlite3.Row
+        with conn:
+            seed(conn, size, rng)
+            backend.daily_stats.rebuild(conn)
+        conn.close()
+
+    baselines = load_baselines()
+    baseline = baselines.get(args.size, {})
+    results = {}
+    regressions = []
+
+    print(f"Fixture: {args.size} ({size['chunks']} knowledge chunks, {size['calls']} calls)\n")
+    print(f"{'benchmark':<44}{'us/op':>12}{'baseline':>12}{'change':>10}")
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            for name, func, setup in build_benchmarks(backend, size, rng):
+                if args.filter and args.filter not in name:
+                    continue
+                us = measure(func, setup, repeat=args.repeat)
+                results[name] = round(us, 2)
+
+                line = f"{name:<44}{us:>12.2f}"
+                if name in baseline:
+                    change = us / baseline[name] - 1
+                    line += f"{baseline[name]:>12.2f}{change:>+10.1%}"
+                    if change > args.tolerance:
+                        line += "  REGRESSED"
+                        regressions.append(name)
+                print(line, file=sys.__stdout__)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.save:
+        baselines[args.size] = dict(baseline, **results)
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nSaved {len(results)} baselines for size {args.size} to {BASELINES_PATH}")
+
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than baseline", file=sys.stderr)
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+"""
+Synthetic load test: N concurrent callers replaying Twilio webhook conversations.
+
+Each caller posts /api/webhook/call, then --turns x /api/webhook/voice, then a
+completed /api/webhook/call/status, over and over. Groq, Deepgram and the Twilio
+REST API are replaced by local stub servers with configurable latency, each in
+its own process so they don't compete with the backend for the GIL. The backend
+runs in-process against a throwaway database.
+
+Run from the backend directory:
+    python benchmarks/load_test.py --callers 20 --calls-per-caller 5 --turns 4
+
+With --speculate the callers also post interim transcripts word by word, the way
+Gather's partialResultCallback does, then wait out the end-of-speech silence
+before the final transcript, so the speculative replies can be measured; with
+--revise-rate some finals differ from what was heard so far and are misses.
+
+Exits non-zero when --max-error-rate or --max-turn-p95-ms is exceeded, so it can
+guard concurrent call capacity in CI.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import requests
+from werkzeug.serving import make_server
+
+from services.tracing import percentile
+
+STUB_REPLY = "Sure, I can help you book that appointment. What day works best for you?"
+
+UTTERANCES = [
+    "Hi, I'd like to book an appointment",
+    "Do you have anything on Thursday afternoon?",
+    "Three o'clock would be great",
+    "My name is Alex Morgan",
+    "Yes, that's correct, thank you",
+    "Can you also tell me your opening hours?",
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base for the upstream stubs: sleeps for the configured latency, then answers"""
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self._count()
+        self.handle_stub('GET', b'')
+
+    def do_POST(self):
+        body = self._read_body()
+        time.sleep(self.latency)
+        self._count()
+        self.handle_stub('POST', body)
+
+    def _count(self):
+        with self.server.requests.get_lock():
+            self.server.requests.value += 1
+
+
+class GroqStub(StubHandler):
+    """OpenAI-compatible streaming chat completions; latency is the time to first token"""
+    token_delay = 0.0
+
+    def handle_stub(self, method, body):
+        request = json.loads(body or b'{}')
+        if request.get('tools'):
+            # Appointment slot extraction, answered in one go
+            function = request['tools'][0]['function']['name']
+            call = {'type': 'function', 'function': {'name': function, 'arguments': json.dumps({'time': '10:00'})}}
+            message = {'role': 'assistant', 'content': None, 'tool_calls': [call]}
+            self._send(200, json.dumps({'choices': [{'message': message}]}).encode('utf-8'))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            for i, word in enumerate(STUB_REPLY.split(' ')):
+                if i:
+                    time.sleep(self.token_delay)
+                chunk = {'choices': [{'delta': {'content': word if i == 0 else ' ' + word}}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client hung up mid-stream, e.g. a cancelled turn or a hedge that lost
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class DeepgramStub(StubHandler):
+    """/v1/speak returns silence, /v1/listen a canned transcript"""
+    def handle_stub(self, method, body):
+        if self.path.startswith('/speak'):
+            self._send(200, b'\x00' * 8000, 'audio/mpeg')
+        else:
+            transcript = {'results': {'channels': [{'alternatives': [{'transcript': UTTERANCES[0]}]}]}}
+            self._send(200, json.dumps(transcript).encode('utf-8'))
+
+
+class TwilioStub(StubHandler):
+    """Empty list pages for GETs and a fresh resource for POSTs"""
+    def handle_stub(self, method, body):
+        path = self.path.split('?')[0]
+        if method == 'GET' and path.endswith('.json'):
+            # List resources are named after the last path segment, e.g. Calls.json -> calls
+            key = path.rsplit('/', 1)[-1][:-len('.json')].lower()
+            page = {
+                key: [], 'page': 0, 'page_size': 50, 'start': 0, 'end': 0,
+                'uri': path, 'first_page_uri': path, 'next_page_uri': None, 'previous_page_uri': None
+            }
+            self._send(200, json.dumps(page).encode('utf-8'))
+        else:
+            self._send(201, json.dumps({'sid': 'CA' + uuid.uuid4().hex, 'status': 'queued'}).encode('utf-8'))
+
+
+def serve_stub(handler, attributes, requests_served, ports):
+    handler = type(handler.__name__, (handler,), attributes)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.requests = requests_served
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_stub(handler, latency_ms, **attributes):
+    """Serve a stub from a child process on a free local port, returns (request counter, base_url)"""
+    requests_served = multiprocessing.Value('i', 0)
+    ports = multiprocessing.Queue()
+    attributes['latency'] = latency_ms / 1000.0
+    multiprocessing.Process(
+        target=serve_stub, args=(handler, attributes, requests_served, ports), daemon=True
+    ).start()
+    return requests_served, f"http://127.0.0.1:{ports.get(timeout=10)}"
+
+
+class Results:
+    """Latencies (ms) per webhook and error counts, shared by all callers"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}  # webhook -> [ms]
+        self.errors = {}  # webhook -> count
+        self.error_samples = []
+
+    def add(self, webhook, latency_ms, error=None):
+        with self._lock:
+            self.latencies.setdefault(webhook, []).append(latency_ms)
+            if error:
+                self.errors[webhook] = self.errors.get(webhook, 0) + 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f"{webhook}: {error}")
+
+
+def post(session, results, webhook, url, form, expect=None):
+    started = time.perf_counter()
+    error = None
+    try:
+        response = session.post(url, data=form, timeout=60)
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+        elif expect and expect not in response.text:
+            # e.g. the LLM call failed and the caller got the apology instead
+            error = f"unexpected response {response.text[:120]!r}"
+    except requests.RequestException as e:
+        error = str(e)
+    results.add(webhook, (time.perf_counter() - started) * 1000, error)
+    return error is None
+
+
+def run_caller(base_url, tenant_numbers, args, results, caller_index):
+    session = requests.Session()
+    to_number = tenant_numbers[caller_index % len(tenant_numbers)]
+    from_number = f"+1555{caller_index:07d}"
+
+    for _ in range(args.calls_per_caller):
+        call_sid = 'CA' + uuid.uuid4().hex
+        call_started = time.time()
+        form = {'CallSid': call_sid, 'From': from_number, 'To': to_number, 'CallStatus': 'in-progress'}
+
+        if not post(session, results, 'call', f"{base_url}/api/webhook/call", form, expect='<Say'):
+            continue
+
+        for turn in range(args.turns):
+            if args.think_ms:
+                time.sleep(random.uniform(0.5, 1.5) * args.think_ms / 1000.0)
+            utterance = UTTERANCES[turn % len(UTTERANCES)]
+            if args.speculate:
+                utterance = speak(session, results, base_url, form, utterance, args)
+            speech = dict(form, SpeechResult=utterance, Confidence='0.93')
+            post(session, results, 'voice', f"{base_url}/api/webhook/voice", speech, expect=STUB_REPLY[:20])
+
+        status = dict(form, CallStatus='completed', CallDuration=str(max(1, int(time.time() - call_started))))
+        post(session, results, 'status', f"{base_url}/api/webhook/call/status", status)
+
+
+def speak(session, results, base_url, form, utterance, args):
+    """Post the growing interim transcript of an utterance, returns the final transcript"""
+    words = utterance.split(' ')
+    for count in range(1, len(words) + 1):
+        time.sleep(args.word_ms / 1000.0)
+        partial = dict(form, StableSpeechResult=' '.join(words[:count]), SequenceNumber=str(count))
+        post(session, results, 'partial', f"{base_url}/api/webhook/voice/partial", partial)
+
+    # Twilio ends the turn after this much silence
+    time.sleep(args.silence_ms / 1000.0)
+    if random.random() < args.revise_rate:
+        # The recognizer changed its mind about the ending
+        return f"{' '.join(words[:-1])} or maybe next week instead"
+    return utterance
+
+
+def wait_for_inbox(webhook_inbox, timeout):
+    """Seconds until the status callbacks were applied, or None if they weren't in time"""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        conn = webhook_inbox._connect()
+        pending = conn.execute(
+            "SELECT COUNT(*) AS count FROM webhook_inbox WHERE status IN ('pending', 'processing')"
+        ).fetchone()['count']
+        conn.close()
+        if not pending:
+            return time.monotonic() - started
+        time.sleep(0.1)
+    return None
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 1),
+        'p95': round(percentile(values, 95), 1),
+        'p99': round(percentile(values, 99), 1),
+        'max': round(values[-1], 1) if values else 0.0
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--callers', type=int, default=10, help="concurrent callers")
+    parser.add_argument('--calls-per-caller', type=int, default=3)
+    parser.add_argument('--turns', type=int, default=4, help="voice webhooks per call")
+    parser.add_argument('--tenants', type=int, default=1, help="tenants the callers are spread over")
+    parser.add_argument('--think-ms', type=float, default=0, help="mean caller pause between turns")
+    parser.add_argument('--llm-ttft-ms', type=float, default=150, help="stub Groq time to first token")
+    parser.add_argument('--llm-token-ms', type=float, default=5, help="stub Groq delay between tokens")
+    parser.add_argument('--tts-ms', type=float, default=100, help="stub Deepgram latency")
+    parser.add_argument('--twilio-ms', type=float, default=50, help="stub Twilio REST latency")
+    parser.add_argument('--speculate', action='store_true', help="post interim transcripts and enable speculative replies")
+    parser.add_argument('--word-ms', type=float, default=150, help="caller speaking pace with --speculate")
+    parser.add_argument('--silence-ms', type=float, default=600, help="end-of-speech silence before the final transcript")
+    parser.add_argument('--revise-rate', type=float, default=0.1, help="fraction of finals that differ from the interim text")
+    parser.add_argument('--max-error-rate', type=float, help="fail when more than this fraction of requests fail")
+    parser.add_argument('--max-turn-p95-ms', type=float, help="fail when the voice webhook p95 exceeds this")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="keep the backend's own output")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    groq, groq_url = start_stub(GroqStub, args.llm_ttft_ms, token_delay=args.llm_token_ms / 1000.0)
+    deepgram, deepgram_url = start_stub(DeepgramStub, args.tts_ms)
+    twilio, twilio_url = start_stub(TwilioStub, args.twilio_ms)
+
+    # The backend keeps its database and schema relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='voiceai-load-')
+    shutil.copy(os.path.join(BACKEND_DIR, 'schema.sql'), workdir)
+    os.chdir(workdir)
+
+    os.environ.update({
+        'GROQ_API_URL': f"{groq_url}/openai/v1/chat/completions",
+        'DEEPGRAM_API_URL': f"{deepgram_url}/v1",
+        'TWILIO_API_BASE': twilio_url,
+        'GROQ_API_KEY': 'stub',
+        'SPECULATION_ENABLED': '1' if args.speculate else '0',
+    })
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        if not args.verbose:
+            logging.disable(logging.WARNING)
+        import app as backend
+        from services.webhook_inbox import webhook_inbox
+
+        server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        # Configure the tenants through the real endpoint so routing is set up as in production
+        tenant_numbers = []
+        for index in range(args.tenants):
+            phone_number = f"+1800555{index:04d}"
+            requests.post(f"{base_url}/api/user/config", json={
+                'userId': f"loadtest-{index}",
+                'twilioConfig': {'accountSid': f"AC{index:032d}", 'authToken': 'stub', 'phoneNumber': phone_number},
+                'llmConfig': {'apiKey': 'stub'},
+                'deepgramConfig': {'apiKey': 'stub'}
+            }).raise_for_status()
+            tenant_numbers.append(phone_number)
+
+        results = Results()
+        callers = [
+            threading.Thread(target=run_caller, args=(base_url, tenant_numbers, args, results, index))
+            for index in range(args.callers)
+        ]
+        started = time.perf_counter()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        elapsed = time.perf_counter() - started
+
+        inbox_lag = wait_for_inbox(webhook_inbox, timeout=30)
+        conn = webhook_inbox._connect()
+        finalized = conn.execute('SELECT COUNT(*) AS count FROM call_logs').fetchone()['count']
+        appointments = conn.execute('SELECT COUNT(*) AS count FROM appointments').fetchone()['count']
+        conn.close()
+        metrics = requests.get(f"{base_url}/api/metrics").json()
+        pipeline = metrics.get('spans', {})
+        server.shutdown()
+    logging.disable(logging.NOTSET)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    total_requests = sum(len(values) for values in results.latencies.values())
+    total_errors = sum(results.errors.values())
+    calls = args.callers * args.calls_per_caller
+    error_rate = total_errors / total_requests if total_requests else 0.0
+    report = {
+        'callers': args.callers,
+        'calls': calls,
+        'turns': len(results.latencies.get('voice', [])),
+        'elapsedSeconds': round(elapsed, 2),
+        'callsPerSecond': round(calls / elapsed, 2),
+        'turnsPerSecond': round(len(results.latencies.get('voice', [])) / elapsed, 2),
+        'requests': total_requests,
+        'errors': total_errors,
+        'errorRate': round(error_rate, 4),
+        'errorSamples': results.error_samples,
+        'callsFinalized': finalized,
+        'appointmentsBooked': appointments,
+        'inboxDrainSeconds': round(inbox_lag, 2) if inbox_lag is not None else None,
+        'webhooksMs': {webhook: summarize(values) for webhook, values in results.latencies.items()},
+        'pipelineMs': {name: {key: stats[key] for key in ('count', 'p50', 'p95', 'p99')} for name, stats in pipeline.items()},
+        'upstreamRequests': {'groq': groq.value, 'deepgram': deepgram.value, 'twilio': twilio.value},
+        'speculation': metrics.get('speculation') if args.speculate else None
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failures = []
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        failures.append(f"error rate {error_rate:.2%} > {args.max_error_rate:.2%}")
+    turn_p95 = report['webhooksMs'].get('voice', {}).get('p95', 0.0)
+    if args.max_turn_p95_ms is not None and turn_p95 > args.max_turn_p95_ms:
+        failures.append(f"turn p95 {turn_p95}ms > {args.max_turn_p95_ms}ms")
+    if finalized != calls:
+        failures.append(f"{finalized} of {calls} calls were finalized")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+def print_report(report):
+    print(f"{report['callers']} callers, {report['calls']} calls, {report['turns']} turns in {report['elapsedSeconds']}s")
+    print(f"Throughput: {report['callsPerSecond']} calls/s, {report['turnsPerSecond']} turns/s")
+    print(f"Errors:     {report['errors']} of {report['requests']} requests ({report['errorRate']:.2%})")
+    for sample in report['errorSamples']:
+        print(f"            {sample}")
+    print(f"Finalized:  {report['callsFinalized']} calls, {report['appointmentsBooked']} appointments booked, "
+          f"inbox drained in {report['inboxDrainSeconds']}s")
+
+    print(f"\n{'webhook':<20}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for webhook, stats in report['webhooksMs'].items():
+        print(f"{webhook:<20}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}")
+
+    if report['pipelineMs']:
+        print(f"\n{'pipeline span':<20}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, stats in sorted(report['pipelineMs'].items()):
+            print(f"{name:<20}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}")
+
+    upstream = report['upstreamRequests']
+    print(f"\nUpstream requests: groq {upstream['groq']}, deepgram {upstream['deepgram']}, twilio {upstream['twilio']}")
+
+    speculation = report['speculation']
+    if speculation:
+        print(f"Speculation: {speculation['started']} started, {speculation['hits']} hits, {speculation['misses']} misses "
+              f"(hit rate {speculation['hitRate']}), {speculation['abandoned']} abandoned, "
+              f"{speculation['wastedTokens']} wasted tokens, {speculation['avgHeadStartMs']}ms average head start")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Per-turn TwiML rendering cost: VoiceResponse object tree vs precompiled templates.
+
+Run from the backend directory:
+    python benchmarks/twiml_render.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.twilio_service import TwilioService
+from services.twiml_templates import TwimlTemplates
+
+MESSAGES = [
+    "Sure, I can book that for you. What time works best on Thursday?",
+    "Tom & Jerry's <Grooming> \"special\" is $40 > $30 'today'",
+    "Très bien, à demain ! 日本語のテキスト",
+    "Line one\nline two\twith a tab\r\n",
+    "",
+]
+
+VARIANTS = [
+    {'gather_speech': True, 'speech_timeout': 'auto', 'stream_url': None},
+    {'gather_speech': True, 'speech_timeout': '2', 'stream_url': 'wss://example.com/api/media-stream?a=1&b=2'},
+    {'gather_speech': False, 'speech_timeout': 'auto', 'stream_url': None},
+]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    service = TwilioService()
+    templates = TwimlTemplates()
+
+    def render(message, variant):
+        return templates.render(
+            ('reply', variant['gather_speech'], variant['speech_timeout'], variant['stream_url']),
+            lambda text: service.build_twiml_response(text, **variant),
+            message
+        )
+
+    # Templates must be a drop-in replacement
+    for variant in VARIANTS:
+        for message in MESSAGES:
+            expected = service.build_twiml_response(message, **variant)
+            actual = render(message, variant)
+            if actual != expected:
+                print(f"MISMATCH for {variant} / {message!r}:\n  {expected}\n  {actual}")
+                sys.exit(1)
+    print(f"Byte-identical across {len(VARIANTS)} variants x {len(MESSAGES)} messages")
+
+    message = MESSAGES[0]
+    variant = VARIANTS[0]
+    tree = timeit.timeit(lambda: service.build_twiml_response(message, **variant), number=iterations)
+    template = timeit.timeit(lambda: render(message, variant), number=iterations)
+
+    print(f"VoiceResponse: {tree / iterations * 1e6:8.2f} us/turn")
+    print(f"Template:      {template / iterations * 1e6:8.2f} us/turn")
+    print(f"Speedup:       {tree / template:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
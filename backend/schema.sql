@@ -59,10 +59,12 @@ CREATE TABLE IF NOT EXISTS appointments (
 CREATE TABLE IF NOT EXISTS active_calls (
     call_sid TEXT PRIMARY KEY,
     user_id TEXT,
+    customer_number TEXT,
     conversation_history TEXT,
     context TEXT,
     started_at TEXT,
     updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    version INTEGER DEFAULT 1,
     FOREIGN KEY (user_id) REFERENCES user_config(user_id)
 );
 
@@ -75,7 +77,165 @@ CREATE TABLE IF NOT EXISTS call_logs (
     to_number TEXT,
     duration INTEGER,
     conversation_history TEXT,
+    status TEXT,
     started_at TEXT,
     ended_at TEXT,
     FOREIGN KEY (user_id) REFERENCES user_config(user_id)
-);
\ No newline at end of file
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_call_logs_call_sid ON call_logs(call_sid);
+CREATE INDEX IF NOT EXISTS idx_call_logs_user_started ON call_logs(user_id, started_at);
+CREATE INDEX IF NOT EXISTS idx_active_calls_updated ON active_calls(updated_at);
+-- Local mirror of the Twilio call list
+CREATE TABLE IF NOT EXISTS twilio_calls (
+    call_sid TEXT PRIMARY KEY,
+    account_sid TEXT,
+    from_number TEXT,
+    to_number TEXT,
+    from_formatted TEXT,
+    to_formatted TEXT,
+    direction TEXT,
+    status TEXT,
+    duration INTEGER,
+    price TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    date_created TEXT,
+    updated_at TEXT
+);
+
+-- Call-log pages are keyed on (date_created, call_sid)
+CREATE INDEX IF NOT EXISTS idx_twilio_calls_created_sid ON twilio_calls(date_created, call_sid);
+CREATE INDEX IF NOT EXISTS idx_twilio_calls_status_created ON twilio_calls(status, date_created, call_sid);
+CREATE INDEX IF NOT EXISTS idx_twilio_calls_direction_created ON twilio_calls(direction, date_created, call_sid);
+CREATE INDEX IF NOT EXISTS idx_twilio_calls_from_number ON twilio_calls(from_number);
+CREATE INDEX IF NOT EXISTS idx_twilio_calls_to_number ON twilio_calls(to_number);
+
+-- Cursors for incremental syncs
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at TEXT
+);
+
+-- Recordings reported by the recording status webhook
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_sid TEXT NOT NULL,
+    recording_sid TEXT NOT NULL,
+    recording_url TEXT,
+    duration INTEGER,
+    channels INTEGER,
+    date_created TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recordings_recording_sid ON recordings(recording_sid);
+CREATE INDEX IF NOT EXISTS idx_recordings_call_sid ON recordings(call_sid, date_created);
+
+-- Transcriptions reported by the transcription webhook
+CREATE TABLE IF NOT EXISTS transcriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_sid TEXT NOT NULL,
+    recording_sid TEXT NOT NULL,
+    transcription_sid TEXT NOT NULL,
+    transcription_text TEXT,
+    date_created TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transcriptions_transcription_sid ON transcriptions(transcription_sid);
+CREATE INDEX IF NOT EXISTS idx_transcriptions_call_sid ON transcriptions(call_sid, date_created);
+CREATE INDEX IF NOT EXISTS idx_transcriptions_recording_sid ON transcriptions(recording_sid, date_created);
+
+-- Per-user daily rollup that the dashboards read instead of counting calls
+CREATE TABLE IF NOT EXISTS daily_stats (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER DEFAULT 0,
+    completed_calls INTEGER DEFAULT 0,
+    failed_calls INTEGER DEFAULT 0,
+    total_duration INTEGER DEFAULT 0,
+    appointments INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+-- Which tenant owns each Twilio number, kept in step with user_config
+CREATE TABLE IF NOT EXISTS phone_routes (
+    phone_number TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_phone_routes_user ON phone_routes(user_id);
+
+-- Outbound dialing campaigns and their number lists
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    name TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    callback_base TEXT NOT NULL,
+    max_concurrent INTEGER DEFAULT 5,
+    calls_per_second REAL DEFAULT 1,
+    max_attempts INTEGER DEFAULT 3,
+    retry_delay INTEGER DEFAULT 300,
+    created_at TEXT,
+    updated_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_campaigns_status ON campaigns(status);
+CREATE INDEX IF NOT EXISTS idx_campaigns_user ON campaigns(user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS campaign_numbers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id INTEGER NOT NULL,
+    phone_number TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TEXT,
+    call_sid TEXT,
+    last_result TEXT,
+    updated_at TEXT,
+    FOREIGN KEY (campaign_id) REFERENCES campaigns (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_campaign_numbers_due ON campaign_numbers(campaign_id, status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_campaign_numbers_call_sid ON campaign_numbers(call_sid);
+CREATE INDEX IF NOT EXISTS idx_campaign_numbers_status ON campaign_numbers(status, updated_at);
+
+-- When each tenant's next campaign call may be placed, shared by every dialer process
+CREATE TABLE IF NOT EXISTS campaign_pacing (
+    user_id TEXT PRIMARY KEY,
+    next_dial_at REAL NOT NULL
+);
+
+-- Twilio webhooks waiting to be applied, keyed so retried deliveries are dropped
+CREATE TABLE IF NOT EXISTS webhook_inbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    ordering_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    claim TEXT,
+    claimed_at TEXT,
+    next_attempt_at TEXT,
+    last_error TEXT,
+    received_at TEXT,
+    processed_at TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_inbox_key ON webhook_inbox(idempotency_key);
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_status ON webhook_inbox(status, id);
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_claim ON webhook_inbox(claim);
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_ordering ON webhook_inbox(ordering_key, id);
+
+-- Calls whose webhooks are profiled on every turn until the flag expires
+CREATE TABLE IF NOT EXISTS profile_flags (
+    call_sid TEXT PRIMARY KEY,
+    mode TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    created_at TEXT
+);
@@ -0,0 +1,106 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CancelToken:
+    """Cooperative cancellation flag shared between a worker and whoever may interrupt it"""
+    def __init__(self, call_sid=None):
+        self.call_sid = call_sid
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason='cancelled'):
+        """Signal the holder of this token to stop as soon as it can"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the token is cancelled or the timeout expires"""
+        return self._event.wait(timeout)
+
+
+class CallInterrupts:
+    """Tracks the cancel tokens of in-flight LLM work for each call"""
+    def __init__(self, ended_ttl=300):
+        self._lock = threading.Lock()
+        self._tokens = {}  # call_sid -> set of CancelToken
+        self._ended = {}  # call_sid -> time the call ended
+        self.ended_ttl = ended_ttl
+
+    def acquire(self, call_sid, preempt=False):
+        """
+        Create and register a token for a unit of work on a call.
+        With preempt=True any older work still running for the call is cancelled first.
+        """
+        token = CancelToken(call_sid)
+        with self._lock:
+            if call_sid in self._ended:
+                # The call is already over, don't start anything new for it
+                token.cancel('call-ended')
+                return token
+
+            previous = self._tokens.setdefault(call_sid, set())
+            stale = list(previous) if preempt else []
+            previous.add(token)
+
+        for old in stale:
+            old.cancel('preempted')
+        if stale:
+            logger.info(f"Preempted {len(stale)} in-flight task(s) for call {call_sid}")
+        return token
+
+    def release(self, call_sid, token):
+        """Unregister a token once its work has finished"""
+        with self._lock:
+            tokens = self._tokens.get(call_sid)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[call_sid]
+
+    def interrupt(self, call_sid, reason='barge-in'):
+        """Cancel every in-flight unit of work for a call, returns how many were cancelled"""
+        with self._lock:
+            tokens = list(self._tokens.get(call_sid, ()))
+
+        for token in tokens:
+            token.cancel(reason)
+
+        if tokens:
+            logger.info(f"Interrupted {len(tokens)} in-flight task(s) for call {call_sid}: {reason}")
+        return len(tokens)
+
+    def abort(self, call_sid, reason='call-ended'):
+        """Cancel all work for a call that has ended and refuse any new work for it"""
+        now = time.monotonic()
+        with self._lock:
+            tokens = list(self._tokens.pop(call_sid, ()))
+            self._ended[call_sid] = now
+
+            # Forget calls that ended long ago so the set stays small
+            expired = [sid for sid, ended_at in self._ended.items() if now - ended_at > self.ended_ttl]
+            for sid in expired:
+                del self._ended[sid]
+
+        for token in tokens:
+            token.cancel(reason)
+
+        if tokens:
+            logger.info(f"Aborted {len(tokens)} in-flight task(s) for call {call_sid}: {reason}")
+        return len(tokens)
+
+    def in_flight(self, call_sid):
+        """Number of registered tokens for a call"""
+        with self._lock:
+            return len(self._tokens.get(call_sid, ()))
+
+
+# Shared registry used by the services and the webhook handlers
+call_interrupts = CallInterrupts()
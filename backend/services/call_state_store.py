@@ -0,0 +1,268 @@
+import os
+import copy
+import json
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class VersionConflict(Exception):
+    """Raised when a call state was changed by someone else since it was loaded"""
+    pass
+
+
+class CallStateStore:
+    """
+    Interface for call-state backends.
+    A state is a dict with user_id, customer_number, conversation_history and context.
+    Every successful write bumps the version so concurrent workers can't overwrite each other.
+    """
+    def load(self, call_sid):
+        """Return (state, version) or None if the call is unknown"""
+        raise NotImplementedError
+
+    def version(self, call_sid):
+        """Return the current version of a call, or None if it is unknown"""
+        raise NotImplementedError
+
+    def create(self, call_sid, state):
+        """Store the initial state of a call, returns its version"""
+        raise NotImplementedError
+
+    def save(self, call_sid, state, expected_version):
+        """Replace the state if it is still at expected_version, returns the new version"""
+        raise NotImplementedError
+
+    def delete(self, call_sid, conn=None):
+        """Remove a call, optionally inside the caller's SQLite transaction; True if it was still there"""
+        raise NotImplementedError
+
+    def stale_calls(self, cutoff):
+        """Call SIDs not updated since the ISO timestamp cutoff"""
+        raise NotImplementedError
+
+
+class InMemoryCallStateStore(CallStateStore):
+    """Process-local backend, for single-worker deployments and tests"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # call_sid -> (state, version, updated_at)
+
+    def load(self, call_sid):
+        with self._lock:
+            entry = self._calls.get(call_sid)
+            if not entry:
+                return None
+            return copy.deepcopy(entry[0]), entry[1]
+
+    def version(self, call_sid):
+        with self._lock:
+            entry = self._calls.get(call_sid)
+            return entry[1] if entry else None
+
+    def create(self, call_sid, state):
+        with self._lock:
+            self._calls[call_sid] = (copy.deepcopy(state), 1, datetime.now().isoformat())
+        return 1
+
+    def save(self, call_sid, state, expected_version):
+        with self._lock:
+            entry = self._calls.get(call_sid)
+            if not entry or entry[1] != expected_version:
+                raise VersionConflict(call_sid)
+            new_version = expected_version + 1
+            self._calls[call_sid] = (copy.deepcopy(state), new_version, datetime.now().isoformat())
+        return new_version
+
+    def delete(self, call_sid, conn=None):
+        with self._lock:
+            return self._calls.pop(call_sid, None) is not None
+
+    def stale_calls(self, cutoff):
+        with self._lock:
+            return [sid for sid, (_, _, updated_at) in self._calls.items() if updated_at < cutoff]
+
+
+class SQLiteCallStateStore(CallStateStore):
+    """Backend on the active_calls table, shared by every worker on the host"""
+    def __init__(self, db_path='voiceai.db'):
+        self.db_path = db_path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def load(self, call_sid):
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM active_calls WHERE call_sid = ?', (call_sid,)).fetchone()
+        conn.close()
+
+        if not row:
+            return None
+
+        state = {
+            'user_id': row['user_id'],
+            'customer_number': row['customer_number'],
+            'conversation_history': json.loads(row['conversation_history']),
+            'context': json.loads(row['context'])
+        }
+        return state, row['version'] or 1
+
+    def version(self, call_sid):
+        conn = self._connect()
+        row = conn.execute('SELECT version FROM active_calls WHERE call_sid = ?', (call_sid,)).fetchone()
+        conn.close()
+        return (row['version'] or 1) if row else None
+
+    def create(self, call_sid, state):
+        started_at = state['context'].get('call_start_time') or datetime.now().isoformat()
+        conn = self._connect()
+        conn.execute(
+            """
+            INSERT INTO active_calls
+            (call_sid, user_id, customer_number, conversation_history, context, started_at, updated_at, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            """,
+            (
+                call_sid,
+                state['user_id'],
+                state.get('customer_number'),
+                json.dumps(state['conversation_history']),
+                json.dumps(state['context']),
+                started_at,
+                started_at
+            )
+        )
+        conn.commit()
+        conn.close()
+        return 1
+
+    def save(self, call_sid, state, expected_version):
+        conn = self._connect()
+        cursor = conn.execute(
+            """
+            UPDATE active_calls
+            SET conversation_history = ?, context = ?, updated_at = ?, version = ?
+            WHERE call_sid = ? AND COALESCE(version, 1) = ?
+            """,
+            (
+                json.dumps(state['conversation_history']),
+                json.dumps(state['context']),
+                datetime.now().isoformat(),
+                expected_version + 1,
+                call_sid,
+                expected_version
+            )
+        )
+        conn.commit()
+        conn.close()
+
+        if cursor.rowcount == 0:
+            raise VersionConflict(call_sid)
+        return expected_version + 1
+
+    def delete(self, call_sid, conn=None):
+        if conn is not None:
+            return conn.execute('DELETE FROM active_calls WHERE call_sid = ?', (call_sid,)).rowcount > 0
+
+        conn = self._connect()
+        removed = conn.execute('DELETE FROM active_calls WHERE call_sid = ?', (call_sid,)).rowcount > 0
+        conn.commit()
+        conn.close()
+        return removed
+
+    def stale_calls(self, cutoff):
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT call_sid FROM active_calls WHERE COALESCE(updated_at, started_at) < ?',
+            (cutoff,)
+        ).fetchall()
+        conn.close()
+        return [row['call_sid'] for row in rows]
+
+
+class CachedCallStateStore(CallStateStore):
+    """
+    Small per-process read-through cache in front of a shared backend.
+    Hits are revalidated with a cheap version check, so a turn handled by another
+    worker is never served stale.
+    """
+    def __init__(self, backend, max_entries=256):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # call_sid -> (state, version)
+
+    def _remember(self, call_sid, state, version):
+        with self._lock:
+            self._entries[call_sid] = (copy.deepcopy(state), version)
+            self._entries.move_to_end(call_sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, call_sid):
+        with self._lock:
+            self._entries.pop(call_sid, None)
+
+    def load(self, call_sid):
+        with self._lock:
+            entry = self._entries.get(call_sid)
+
+        if entry:
+            current = self.backend.version(call_sid)
+            if current == entry[1]:
+                return copy.deepcopy(entry[0]), entry[1]
+            if current is None:
+                self._forget(call_sid)
+                return None
+
+        loaded = self.backend.load(call_sid)
+        if loaded is None:
+            self._forget(call_sid)
+            return None
+
+        self._remember(call_sid, *loaded)
+        return loaded
+
+    def version(self, call_sid):
+        return self.backend.version(call_sid)
+
+    def create(self, call_sid, state):
+        version = self.backend.create(call_sid, state)
+        self._remember(call_sid, state, version)
+        return version
+
+    def save(self, call_sid, state, expected_version):
+        try:
+            version = self.backend.save(call_sid, state, expected_version)
+        except VersionConflict:
+            self._forget(call_sid)
+            raise
+        self._remember(call_sid, state, version)
+        return version
+
+    def delete(self, call_sid, conn=None):
+        removed = self.backend.delete(call_sid, conn=conn)
+        self._forget(call_sid)
+        return removed
+
+    def stale_calls(self, cutoff):
+        return self.backend.stale_calls(cutoff)
+
+
+def create_call_state_store(backend=None):
+    """Build the configured store (CALL_STATE_BACKEND=sqlite|memory) behind the read-through cache"""
+    backend = backend or os.getenv('CALL_STATE_BACKEND', 'sqlite')
+
+    if backend == 'memory':
+        store = InMemoryCallStateStore()
+    elif backend == 'sqlite':
+        store = SQLiteCallStateStore()
+    else:
+        raise ValueError(f"Unknown call state backend: {backend}")
+
+    return CachedCallStateStore(store, max_entries=int(os.getenv('CALL_STATE_CACHE_SIZE', '256')))
@@ -0,0 +1,262 @@
+import sqlite3
+import base64
+import logging
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which Twilio won't change a call any more
+TERMINAL_STATUSES = ('completed', 'busy', 'failed', 'no-answer', 'canceled')
+
+# How far along a call is for each status, a callback never moves a call back
+STATUS_PROGRESS = {'queued': 0, 'initiated': 1, 'ringing': 2, 'in-progress': 3}
+STATUS_PROGRESS.update({status: 4 for status in TERMINAL_STATUSES})
+
+def status_progress_sql(column):
+    """SQL expression ranking a status column by STATUS_PROGRESS, unknown statuses rank lowest"""
+    cases = ' '.join(f"WHEN '{status}' THEN {rank}" for status, rank in STATUS_PROGRESS.items())
+    return f'(CASE {column} {cases} ELSE -1 END)'
+
+# Largest page the call-log APIs will return
+MAX_PAGE_SIZE = 200
+
+def to_utc_iso(value):
+    """
+    ISO string in UTC for a datetime, so stored and queried timestamps compare as strings.
+    Naive datetimes are taken as server local time, e.g. datetime.now() or a parsed date filter.
+    """
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).isoformat(timespec='seconds')
+
+def encode_cursor(call):
+    """Opaque cursor pointing just past a call in (date_created, call_sid) order"""
+    position = f"{call['date_created']}|{call['call_sid']}"
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """(date_created, call_sid) from a cursor, raises ValueError if it is malformed"""
+    try:
+        date_created, call_sid = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return date_created, call_sid
+
+def normalize_number_prefix(number):
+    """E.164 prefix from user input such as '+1 (555) 12', or None if it has no digits"""
+    digits = ''.join(ch for ch in number if ch.isdigit())
+    return '+' + digits if digits else None
+
+class TwilioCallSync:
+    """Keeps the local twilio_calls table in step with the account's call list"""
+    def __init__(self, db_path='voiceai.db', backfill_days=30, overlap_minutes=5):
+        self.db_path = db_path
+        self.backfill_days = backfill_days
+        # Re-read a little before the cursor so calls created out of order aren't missed
+        self.overlap_minutes = overlap_minutes
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get_cursor(self):
+        """Latest date_created we have mirrored, or None before the first sync"""
+        conn = self._connect()
+        row = conn.execute("SELECT value FROM sync_state WHERE name = 'twilio_calls'").fetchone()
+        conn.close()
+        return row['value'] if row else None
+
+    def sync(self, client):
+        """Fetch calls created since the cursor and upsert them, returns how many were written"""
+        cursor = self.get_cursor()
+        if cursor:
+            since = datetime.fromisoformat(cursor) - timedelta(minutes=self.overlap_minutes)
+        else:
+            since = datetime.now(timezone.utc) - timedelta(days=self.backfill_days)
+
+        calls = client.calls.list(start_time_after=since)
+        if not calls:
+            return 0
+
+        conn = self._connect()
+        with conn:
+            for call in calls:
+                self._upsert_call(conn, call)
+
+            newest = max((to_utc_iso(call.date_created) for call in calls if call.date_created), default=None)
+            if newest and (not cursor or newest > cursor):
+                conn.execute(
+                    """
+                    INSERT INTO sync_state (name, value, updated_at) VALUES ('twilio_calls', ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+                    """,
+                    (newest, datetime.now().isoformat())
+                )
+        conn.close()
+
+        logger.info(f"Mirrored {len(calls)} Twilio calls")
+        return len(calls)
+
+    def ensure_synced(self, client):
+        """Run a first sync inline if the mirror has never been filled"""
+        if client and self.get_cursor() is None:
+            self.sync(client)
+
+    def _upsert_call(self, conn, call):
+        conn.execute(
+            """
+            INSERT INTO twilio_calls
+            (call_sid, account_sid, from_number, to_number, from_formatted, to_formatted, direction,
+             status, duration, price, start_time, end_time, date_created, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(call_sid) DO UPDATE SET
+                status = excluded.status,
+                duration = excluded.duration,
+                price = excluded.price,
+                start_time = excluded.start_time,
+                end_time = excluded.end_time,
+                date_created = COALESCE(excluded.date_created, twilio_calls.date_created),
+                from_formatted = excluded.from_formatted,
+                to_formatted = excluded.to_formatted,
+                updated_at = excluded.updated_at
+            """,
+            (
+                call.sid,
+                call.account_sid,
+                call.from_,
+                call.to,
+                getattr(call, 'from_formatted', None),
+                getattr(call, 'to_formatted', None),
+                call.direction,
+                call.status,
+                int(call.duration) if call.duration else 0,
+                call.price,
+                to_utc_iso(call.start_time),
+                to_utc_iso(call.end_time),
+                to_utc_iso(call.date_created),
+                datetime.now().isoformat()
+            )
+        )
+
+    def apply_status_callback(self, form):
+        """
+        Apply a call status webhook to the mirror so it is current between syncs.
+        A late or retried callback for an earlier status (in-progress after completed)
+        doesn't overwrite the later one.
+        """
+        call_sid = form.get('CallSid')
+        if not call_sid:
+            return
+
+        timestamp = form.get('Timestamp')
+        try:
+            event_time = to_utc_iso(parsedate_to_datetime(timestamp)) if timestamp else None
+        except (TypeError, ValueError):
+            event_time = None
+        # Only a placeholder until the next sync brings Twilio's own date_created
+        event_time = event_time or to_utc_iso(datetime.now(timezone.utc))
+
+        status = form.get('CallStatus')
+        duration = form.get('CallDuration')
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                f"""
+                INSERT INTO twilio_calls
+                (call_sid, account_sid, from_number, to_number, from_formatted, to_formatted, direction,
+                 status, duration, start_time, end_time, date_created, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(call_sid) DO UPDATE SET
+                    status = CASE
+                        WHEN {status_progress_sql('excluded.status')} >= {status_progress_sql('twilio_calls.status')} THEN excluded.status
+                        ELSE twilio_calls.status
+                    END,
+                    duration = COALESCE(excluded.duration, twilio_calls.duration),
+                    end_time = COALESCE(excluded.end_time, twilio_calls.end_time),
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    call_sid,
+                    form.get('AccountSid'),
+                    form.get('From'),
+                    form.get('To'),
+                    form.get('From'),
+                    form.get('To'),
+                    form.get('Direction'),
+                    status,
+                    int(duration) if duration else None,
+                    event_time,
+                    event_time if status in TERMINAL_STATUSES else None,
+                    event_time,
+                    datetime.now().isoformat()
+                )
+            )
+        conn.close()
+
+    def count_calls(self, *since_dates):
+        """How many mirrored calls were created since each of the given datetimes, in one query"""
+        columns = ', '.join(
+            f'COALESCE(SUM(CASE WHEN date_created >= :since{i} THEN 1 END), 0)' for i in range(len(since_dates))
+        )
+        params = {f'since{i}': to_utc_iso(since) for i, since in enumerate(since_dates)}
+        params['earliest'] = min(params.values())
+
+        conn = self._connect()
+        row = conn.execute(f'SELECT {columns} FROM twilio_calls WHERE date_created >= :earliest', params).fetchone()
+        conn.close()
+        return tuple(row)
+
+    def page_calls(self, limit=50, cursor=None, status=None, direction=None, number_prefix=None,
+                   start_date=None, end_date=None):
+        """
+        One page of mirrored calls, newest first, ordered by (date_created, call_sid) so pages
+        stay stable while new calls arrive. Returns (calls, next_cursor); next_cursor is None on
+        the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        query = 'SELECT * FROM twilio_calls WHERE date_created IS NOT NULL'
+        params = []
+
+        if cursor:
+            query += ' AND (date_created, call_sid) < (?, ?)'
+            params.extend(decode_cursor(cursor))
+        if status:
+            query += ' AND status = ?'
+            params.append(status.lower())
+        if direction:
+            # 'outbound' covers both outbound-api and outbound-dial
+            query += " AND (direction = ? OR direction LIKE ? || '-%')"
+            params.extend([direction.lower(), direction.lower()])
+        if number_prefix:
+            # Range scans rather than LIKE so the number indexes can be used
+            prefix = normalize_number_prefix(number_prefix)
+            if prefix:
+                upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+                query += ' AND ((from_number >= ? AND from_number < ?) OR (to_number >= ? AND to_number < ?))'
+                params.extend([prefix, upper, prefix, upper])
+        if start_date:
+            query += ' AND date_created >= ?'
+            params.append(to_utc_iso(start_date))
+        if end_date:
+            query += ' AND date_created < ?'
+            params.append(to_utc_iso(end_date))
+
+        # One extra row tells us whether another page exists
+        query += ' ORDER BY date_created DESC, call_sid DESC LIMIT ?'
+        params.append(limit + 1)
+
+        conn = self._connect()
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        conn.close()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1])
+        return rows, None
+
+
+# Shared instance used by the routes, the webhook handlers and the background job
+call_sync = TwilioCallSync()
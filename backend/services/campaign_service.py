@@ -0,0 +1,367 @@
+import os
+import json
+import sqlite3
+import time
+import logging
+from datetime import datetime, timedelta
+from services.phone_routes import normalize_number
+from services.twilio_clients import twilio_clients
+
+logger = logging.getLogger(__name__)
+
+# Numbers still waiting for (another) attempt
+WAITING_STATUSES = ('pending', 'retry')
+# Outcomes worth trying again later
+RETRY_OUTCOMES = ('busy', 'no-answer')
+
+def default_client_factory(twilio_config):
+    return twilio_clients.get(twilio_config.get('accountSid'), twilio_config.get('authToken'))
+
+
+class CampaignDialer:
+    """
+    Dials campaign number lists in the background.
+    Each tick keeps at most max_concurrent calls in flight per tenant, paces new calls
+    with a per-tenant calls-per-second budget and schedules busy/no-answer numbers for
+    another attempt with exponential backoff. Call outcomes arrive through the normal
+    call status webhook via handle_status().
+    Both budgets are checked in the database as each number is claimed, so every
+    worker can run the scheduler without the tenant getting N times the limits.
+    """
+    def __init__(self, db_path='voiceai.db', client_factory=None, stale_seconds=3600):
+        self.db_path = db_path
+        # Builds a Twilio client from a tenant's twilio_config, swap it for a stub in tests
+        self.client_factory = client_factory or default_client_factory
+        # Calls whose status callback never arrived are given up on after this long
+        self.stale_seconds = stale_seconds
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_campaign(self, user_id, name, phone_numbers, callback_base, max_concurrent=5,
+                        calls_per_second=1.0, max_attempts=3, retry_delay=300):
+        """Store a campaign and its de-duplicated number list, returns the campaign id"""
+        numbers = []
+        seen = set()
+        for phone_number in phone_numbers:
+            number = normalize_number(phone_number)
+            if number and number not in seen:
+                seen.add(number)
+                numbers.append(number)
+
+        if not numbers:
+            raise ValueError("The campaign has no valid phone numbers")
+        if max_concurrent < 1:
+            raise ValueError("maxConcurrent must be at least 1")
+        if calls_per_second <= 0:
+            raise ValueError("callsPerSecond must be greater than 0")
+        if max_attempts < 1:
+            raise ValueError("maxAttempts must be at least 1")
+        if retry_delay < 0:
+            raise ValueError("retryDelay can't be negative")
+
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        with conn:
+            campaign_id = conn.execute(
+                """
+                INSERT INTO campaigns
+                (user_id, name, status, callback_base, max_concurrent, calls_per_second, max_attempts, retry_delay, created_at, updated_at)
+                VALUES (?, ?, 'pending', ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (user_id, name, callback_base.rstrip('/'), max_concurrent, calls_per_second,
+                 max_attempts, retry_delay, now, now)
+            ).lastrowid
+            conn.executemany(
+                """
+                INSERT INTO campaign_numbers (campaign_id, phone_number, status, attempts, next_attempt_at, updated_at)
+                VALUES (?, ?, 'pending', 0, ?, ?)
+                """,
+                [(campaign_id, number, now, now) for number in numbers]
+            )
+        conn.close()
+
+        logger.info(f"Created campaign {campaign_id} for user {user_id} with {len(numbers)} numbers")
+        return campaign_id
+
+    def set_status(self, campaign_id, status):
+        """Start ('running'), pause or cancel a campaign, returns False if it doesn't exist or is finished"""
+        conn = self._connect()
+        with conn:
+            updated = conn.execute(
+                "UPDATE campaigns SET status = ?, updated_at = ? WHERE id = ? AND status NOT IN ('completed', 'canceled')",
+                (status, datetime.now().isoformat(), campaign_id)
+            ).rowcount
+            if updated and status == 'canceled':
+                # Numbers not yet dialed will never be
+                conn.execute(
+                    f"""
+                    UPDATE campaign_numbers SET status = 'canceled', updated_at = ?
+                    WHERE campaign_id = ? AND status IN ({', '.join('?' for _ in WAITING_STATUSES)})
+                    """,
+                    (datetime.now().isoformat(), campaign_id, *WAITING_STATUSES)
+                )
+        conn.close()
+        return bool(updated)
+
+    def progress(self, campaign_id):
+        """The campaign with a count of its numbers per status, or None"""
+        conn = self._connect()
+        campaign = conn.execute('SELECT * FROM campaigns WHERE id = ?', (campaign_id,)).fetchone()
+        if not campaign:
+            conn.close()
+            return None
+
+        counts = {
+            row['status']: row['count']
+            for row in conn.execute(
+                'SELECT status, COUNT(*) AS count FROM campaign_numbers WHERE campaign_id = ? GROUP BY status',
+                (campaign_id,)
+            )
+        }
+        conn.close()
+
+        total = sum(counts.values())
+        done = sum(counts.get(status, 0) for status in ('completed', 'failed', 'canceled'))
+        return {
+            'id': campaign['id'],
+            'userId': campaign['user_id'],
+            'name': campaign['name'],
+            'status': campaign['status'],
+            'total': total,
+            'counts': counts,
+            'percentComplete': round(100.0 * done / total, 1) if total else 100.0,
+            'createdAt': campaign['created_at'],
+            'updatedAt': campaign['updated_at']
+        }
+
+    def list_campaigns(self, user_id):
+        conn = self._connect()
+        ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM campaigns WHERE user_id = ? ORDER BY created_at DESC', (user_id,)
+        )]
+        conn.close()
+        return [self.progress(campaign_id) for campaign_id in ids]
+
+    def tick(self):
+        """Place as many calls as the running campaigns' budgets allow, returns how many were placed"""
+        self._expire_stale_calls()
+
+        conn = self._connect()
+        campaigns = conn.execute("SELECT * FROM campaigns WHERE status = 'running' ORDER BY id").fetchall()
+        conn.close()
+
+        placed = 0
+        for campaign in campaigns:
+            try:
+                placed += self._dial_campaign(campaign)
+            except Exception as e:
+                logger.error(f"Error dialing campaign {campaign['id']}: {str(e)}")
+        return placed
+
+    def _dial_campaign(self, campaign):
+        now = datetime.now()
+        conn = self._connect()
+
+        # Concurrency is per tenant, across all of their campaigns
+        in_flight = conn.execute(
+            """
+            SELECT COUNT(*) AS count FROM campaign_numbers n JOIN campaigns c ON c.id = n.campaign_id
+            WHERE c.user_id = ? AND n.status = 'dialing'
+            """,
+            (campaign['user_id'],)
+        ).fetchone()['count']
+        capacity = campaign['max_concurrent'] - in_flight
+
+        due = []
+        if capacity > 0:
+            due = conn.execute(
+                f"""
+                SELECT id, phone_number, attempts FROM campaign_numbers
+                WHERE campaign_id = ? AND status IN ({', '.join('?' for _ in WAITING_STATUSES)}) AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?
+                """,
+                (campaign['id'], *WAITING_STATUSES, now.isoformat(), capacity)
+            ).fetchall()
+
+        if not due and in_flight == 0:
+            remaining = conn.execute(
+                f"SELECT 1 FROM campaign_numbers WHERE campaign_id = ? AND status IN ({', '.join('?' for _ in WAITING_STATUSES)}, 'dialing') LIMIT 1",
+                (campaign['id'], *WAITING_STATUSES)
+            ).fetchone()
+            if not remaining:
+                with conn:
+                    conn.execute(
+                        "UPDATE campaigns SET status = 'completed', updated_at = ? WHERE id = ? AND status = 'running'",
+                        (now.isoformat(), campaign['id'])
+                    )
+                logger.info(f"Campaign {campaign['id']} completed")
+
+        config = conn.execute('SELECT twilio_config FROM user_config WHERE user_id = ?', (campaign['user_id'],)).fetchone()
+        conn.close()
+
+        if not due:
+            return 0
+        if not config:
+            logger.error(f"Campaign {campaign['id']} has no Twilio configuration for user {campaign['user_id']}")
+            return 0
+
+        twilio_config = json.loads(config['twilio_config'])
+        client = self.client_factory(twilio_config)
+
+        placed = 0
+        for number in due:
+            claimed = self._claim(campaign, number['id'])
+            if claimed is None:
+                # Out of budget for this tick, the rest wait for the next one
+                break
+            if not claimed:
+                continue
+            self._place_call(client, twilio_config, campaign, number)
+            placed += 1
+        return placed
+
+    def _claim(self, campaign, number_id):
+        """
+        Mark a number as dialing if the tenant has budget for another call. Returns
+        True when claimed, False when another worker already took the number and
+        None when the tenant is at max_concurrent or out of calls-per-second budget.
+        """
+        if campaign['calls_per_second'] <= 0:
+            return None
+        interval = 1.0 / campaign['calls_per_second']
+        # A tick may use up to one second's worth of budget at once
+        tolerance = (max(1, int(campaign['calls_per_second'])) - 1) * interval
+
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            # Take the write lock before reading, so the checks and the claim are one step for all workers
+            conn.execute('BEGIN IMMEDIATE')
+            in_flight = conn.execute(
+                """
+                SELECT COUNT(*) AS count FROM campaign_numbers n JOIN campaigns c ON c.id = n.campaign_id
+                WHERE c.user_id = ? AND n.status = 'dialing'
+                """,
+                (campaign['user_id'],)
+            ).fetchone()['count']
+            if in_flight >= campaign['max_concurrent']:
+                conn.execute('ROLLBACK')
+                return None
+
+            # Pace with the time the next call is due: each call pushes it one interval later
+            now = time.time()
+            row = conn.execute('SELECT next_dial_at FROM campaign_pacing WHERE user_id = ?', (campaign['user_id'],)).fetchone()
+            next_dial_at = max(row['next_dial_at'], now) if row else now
+            if next_dial_at - now > tolerance:
+                conn.execute('ROLLBACK')
+                return None
+
+            claimed = conn.execute(
+                f"""
+                UPDATE campaign_numbers SET status = 'dialing', attempts = attempts + 1, updated_at = ?
+                WHERE id = ? AND status IN ({', '.join('?' for _ in WAITING_STATUSES)})
+                """,
+                (datetime.now().isoformat(), number_id, *WAITING_STATUSES)
+            ).rowcount
+            if claimed == 1:
+                conn.execute(
+                    """
+                    INSERT INTO campaign_pacing (user_id, next_dial_at) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET next_dial_at = excluded.next_dial_at
+                    """,
+                    (campaign['user_id'], next_dial_at + interval)
+                )
+            conn.execute('COMMIT')
+            return claimed == 1
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _place_call(self, client, twilio_config, campaign, number):
+        callback_base = campaign['callback_base']
+        try:
+            call = client.calls.create(
+                url=f"{callback_base}/api/webhook/outbound-call",
+                to=number['phone_number'],
+                from_=twilio_config.get('phoneNumber'),
+                status_callback=f"{callback_base}/api/webhook/call/status",
+                record=True
+            )
+        except Exception as e:
+            logger.error(f"Error dialing {number['phone_number']} for campaign {campaign['id']}: {str(e)}")
+            self._record_outcome(number['id'], 'failed', str(e))
+            return
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE campaign_numbers SET call_sid = ?, updated_at = ? WHERE id = ?',
+                (call.sid, datetime.now().isoformat(), number['id'])
+            )
+        conn.close()
+
+    def handle_status(self, call_sid, call_status):
+        """Apply a terminal call status to the campaign number it belongs to, returns False for other calls"""
+        conn = self._connect()
+        number = conn.execute(
+            "SELECT id FROM campaign_numbers WHERE call_sid = ? AND status = 'dialing'", (call_sid,)
+        ).fetchone()
+        conn.close()
+
+        if not number:
+            return False
+        self._record_outcome(number['id'], call_status, call_status)
+        return True
+
+    def _record_outcome(self, number_id, call_status, result):
+        now = datetime.now()
+        conn = self._connect()
+        with conn:
+            row = conn.execute(
+                """
+                SELECT n.attempts, c.max_attempts, c.retry_delay FROM campaign_numbers n
+                JOIN campaigns c ON c.id = n.campaign_id WHERE n.id = ?
+                """,
+                (number_id,)
+            ).fetchone()
+
+            if call_status == 'completed':
+                status, next_attempt = 'completed', None
+            elif call_status in RETRY_OUTCOMES and row['attempts'] < row['max_attempts']:
+                # Back off exponentially: retry_delay, then twice that, and so on
+                delay = row['retry_delay'] * (2 ** (row['attempts'] - 1))
+                status, next_attempt = 'retry', (now + timedelta(seconds=delay)).isoformat()
+            else:
+                status, next_attempt = 'failed', None
+
+            conn.execute(
+                """
+                UPDATE campaign_numbers
+                SET status = ?, last_result = ?, next_attempt_at = COALESCE(?, next_attempt_at), updated_at = ?
+                WHERE id = ?
+                """,
+                (status, result, next_attempt, now.isoformat(), number_id)
+            )
+        conn.close()
+
+    def _expire_stale_calls(self):
+        # Treat calls we never heard back about as unanswered so they get retried or fail
+        cutoff = (datetime.now() - timedelta(seconds=self.stale_seconds)).isoformat()
+        conn = self._connect()
+        stale = conn.execute(
+            "SELECT id FROM campaign_numbers WHERE status = 'dialing' AND updated_at < ?", (cutoff,)
+        ).fetchall()
+        conn.close()
+
+        for number in stale:
+            self._record_outcome(number['id'], 'no-answer', 'no status callback')
+
+
+# Shared instance driven by the campaign background task
+campaign_dialer = CampaignDialer(stale_seconds=int(os.getenv('CAMPAIGN_STALE_CALL_SECONDS', '3600')))
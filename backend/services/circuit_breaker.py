@@ -0,0 +1,174 @@
+import os
+import math
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+def counts_as_failure(status_code):
+    """Server errors, timeouts and throttling count against a service; other client errors don't"""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class CircuitOpenError(Exception):
+    """The breaker for a service is open, fail fast instead of waiting on it"""
+    def __init__(self, name):
+        super().__init__(f"Circuit for {name} is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Tracks an external service over a rolling time window.
+    Opens once enough calls failed or ran slower than slow_call_ms, rejects calls while
+    open, then lets a single probe through after open_seconds: success closes it,
+    failure opens it again. timeout() adapts the request timeout to the observed p99.
+    """
+    def __init__(self, name, window_seconds=60, min_calls=10, failure_rate=0.5, open_seconds=30,
+                 slow_call_ms=None, min_timeout=2.0, max_timeout=30.0, timeout_multiplier=2.0, min_samples=20):
+        self.name = name
+        self.window_seconds = window_seconds
+        # Don't judge a service on a handful of calls
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.slow_call_ms = slow_call_ms
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (monotonic time, ok, latency_ms or None)
+        self.state = CLOSED
+        self.opened_at = None
+        self._probe_started = None
+        self.rejected = 0
+
+    def _trim(self, now):
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def allow(self):
+        """True if a call may go ahead; while half-open only one probe at a time is let through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_started = None
+
+            # A probe that never reported back (e.g. a cancelled turn) stops blocking after max_timeout
+            if self.state == HALF_OPEN and (self._probe_started is None or now - self._probe_started > self.max_timeout):
+                self._probe_started = now
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency_ms):
+        slow = self.slow_call_ms is not None and latency_ms > self.slow_call_ms
+        self._record(not slow, latency_ms)
+
+    def record_failure(self, latency_ms=None):
+        self._record(False, latency_ms)
+
+    def _record(self, ok, latency_ms):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_started = None
+                if ok:
+                    # The probe made it, start over with a clean window
+                    self.state = CLOSED
+                    self._calls.clear()
+                    logger.info(f"Circuit for {self.name} closed")
+                else:
+                    self._open(now)
+                    return
+
+            self._calls.append((now, ok, latency_ms))
+            self._trim(now)
+
+            if self.state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._open(now)
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        logger.warning(f"Circuit for {self.name} opened")
+
+    def _latencies(self):
+        self._trim(time.monotonic())
+        return sorted(latency for _, ok, latency in self._calls if ok and latency is not None)
+
+    def timeout(self):
+        """Seconds to wait on the service: the window's p99 times the multiplier, within bounds"""
+        with self._lock:
+            latencies = self._latencies()
+        if len(latencies) < self.min_samples:
+            return self.max_timeout
+
+        p99 = latencies[max(0, math.ceil(0.99 * len(latencies)) - 1)] / 1000.0
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def snapshot(self):
+        with self._lock:
+            latencies = self._latencies()
+            calls = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            state = self.state
+            rejected = self.rejected
+
+        return {
+            'state': state,
+            'calls': calls,
+            'failures': failures,
+            'failureRate': round(failures / calls, 3) if calls else 0.0,
+            'p99Ms': round(latencies[max(0, math.ceil(0.99 * len(latencies)) - 1)], 1) if latencies else None,
+            'timeoutSeconds': round(self.timeout(), 3),
+            'rejected': rejected
+        }
+
+
+class CircuitBreakers:
+    """One breaker per external service, created on first use with the shared settings"""
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, name, **overrides):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **dict(self.defaults, **overrides))
+            return breaker
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+# Shared registry for the LLM providers and Deepgram
+circuit_breakers = CircuitBreakers(
+    window_seconds=float(os.getenv('BREAKER_WINDOW_SECONDS', '60')),
+    min_calls=int(os.getenv('BREAKER_MIN_CALLS', '10')),
+    failure_rate=float(os.getenv('BREAKER_FAILURE_RATE', '0.5')),
+    open_seconds=float(os.getenv('BREAKER_OPEN_SECONDS', '30')),
+    slow_call_ms=float(os.getenv('BREAKER_SLOW_CALL_MS')) if os.getenv('BREAKER_SLOW_CALL_MS') else None,
+    min_timeout=float(os.getenv('BREAKER_MIN_TIMEOUT', '2')),
+    timeout_multiplier=float(os.getenv('BREAKER_TIMEOUT_MULTIPLIER', '2'))
+)
@@ -0,0 +1,125 @@
+import sqlite3
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class DailyStats:
+    """
+    Per-user, per-day rollup of calls, outcomes, talk time and appointments.
+    Updated incrementally as calls start and end and as appointments change, so the
+    dashboards read a handful of rows instead of counting the call lists.
+    """
+    def __init__(self, db_path='voiceai.db'):
+        self.db_path = db_path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _bump(self, user_id, day, conn=None, **counts):
+        own_conn = conn is None
+        conn = conn or self._connect()
+        conn.execute(
+            """
+            INSERT INTO daily_stats (user_id, day, calls, completed_calls, failed_calls, total_duration, appointments)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, day) DO UPDATE SET
+                calls = calls + excluded.calls,
+                completed_calls = completed_calls + excluded.completed_calls,
+                failed_calls = failed_calls + excluded.failed_calls,
+                total_duration = total_duration + excluded.total_duration,
+                appointments = appointments + excluded.appointments
+            """,
+            (
+                user_id,
+                day,
+                counts.get('calls', 0),
+                counts.get('completed_calls', 0),
+                counts.get('failed_calls', 0),
+                counts.get('total_duration', 0),
+                counts.get('appointments', 0)
+            )
+        )
+        if own_conn:
+            conn.commit()
+            conn.close()
+
+    def record_call_started(self, user_id, started_at, conn=None):
+        """Count a call on the day it started, as soon as it is answered"""
+        if not user_id:
+            return
+        self._bump(user_id, (started_at or datetime.now().isoformat())[:10], conn=conn, calls=1)
+
+    def record_call_finished(self, user_id, started_at, call_status, duration=None, conn=None):
+        """Add a finished call's outcome and talk time to the day it started"""
+        if not user_id:
+            return
+        completed = call_status == 'completed'
+        self._bump(
+            user_id, (started_at or datetime.now().isoformat())[:10], conn=conn,
+            completed_calls=1 if completed else 0,
+            failed_calls=0 if completed else 1,
+            total_duration=int(duration or 0)
+        )
+
+    def record_appointment(self, user_id, appointment_date, delta=1, conn=None):
+        """Count an appointment on the day it is booked for, delta=-1 when one is removed"""
+        if not user_id or not appointment_date:
+            return
+        self._bump(user_id, appointment_date[:10], conn=conn, appointments=delta)
+
+    def summary(self, user_id, today, month_start):
+        """Month-to-date totals plus today's and upcoming appointments in one indexed query"""
+        conn = self._connect()
+        row = conn.execute(
+            """
+            SELECT
+                COALESCE(SUM(CASE WHEN day = :today THEN calls END), 0) AS calls_today,
+                COALESCE(SUM(CASE WHEN day <= :today THEN calls END), 0) AS calls_this_month,
+                COALESCE(SUM(CASE WHEN day <= :today THEN completed_calls END), 0) AS completed_this_month,
+                COALESCE(SUM(CASE WHEN day <= :today THEN failed_calls END), 0) AS failed_this_month,
+                COALESCE(SUM(CASE WHEN day <= :today THEN total_duration END), 0) AS duration_this_month,
+                COALESCE(SUM(CASE WHEN day = :today THEN appointments END), 0) AS appointments_today,
+                COALESCE(SUM(CASE WHEN day > :today THEN appointments END), 0) AS upcoming_appointments
+            FROM daily_stats
+            WHERE user_id = :user_id AND day >= :month_start
+            """,
+            {'user_id': user_id, 'today': today, 'month_start': month_start}
+        ).fetchone()
+        conn.close()
+        return dict(row)
+
+    def rebuild(self, conn):
+        """Recompute the rollup from the call tables and appointments, e.g. after upgrading an old database"""
+        conn.execute('DELETE FROM daily_stats')
+        conn.execute(
+            """
+            INSERT INTO daily_stats (user_id, day, calls, completed_calls, failed_calls, total_duration, appointments)
+            SELECT user_id, day, SUM(calls), SUM(completed_calls), SUM(failed_calls), SUM(total_duration), SUM(appointments)
+            FROM (
+                SELECT user_id, substr(started_at, 1, 10) AS day, 1 AS calls,
+                    CASE WHEN status = 'completed' THEN 1 ELSE 0 END AS completed_calls,
+                    CASE WHEN status = 'completed' THEN 0 ELSE 1 END AS failed_calls,
+                    COALESCE(duration, 0) AS total_duration,
+                    0 AS appointments
+                FROM call_logs
+                WHERE user_id IS NOT NULL AND started_at IS NOT NULL
+                UNION ALL
+                SELECT user_id, substr(started_at, 1, 10), 1, 0, 0, 0, 0
+                FROM active_calls
+                WHERE user_id IS NOT NULL AND started_at IS NOT NULL
+                UNION ALL
+                SELECT user_id, substr(appointment_date, 1, 10), 0, 0, 0, 0, 1
+                FROM appointments
+                WHERE user_id IS NOT NULL AND appointment_date IS NOT NULL
+            )
+            GROUP BY user_id, day
+            """
+        )
+        logger.info("Rebuilt the daily_stats rollup")
+
+
+# Shared instance used by the webhooks, appointment endpoints and dashboards
+daily_stats = DailyStats()
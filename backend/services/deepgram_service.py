@@ -1,11 +1,24 @@
 import os
 import json
+import time
 import requests
 import sqlite3
+from services.tracing import tracer
+from services.circuit_breaker import circuit_breakers, counts_as_failure
 
 class DeepgramService:
     def __init__(self):
-        pass
+        # Overridable so load tests can point at a local stub
+        self.api_url = os.getenv('DEEPGRAM_API_URL', 'https://api.deepgram.com/v1').rstrip('/')
+        # Fails fast while Deepgram is down and bounds every request by its observed p99
+        self.breaker = circuit_breakers.get('deepgram', max_timeout=float(os.getenv('DEEPGRAM_TIMEOUT', '15')))
+    
+    def _record_response(self, status_code, started):
+        latency_ms = (time.perf_counter() - started) * 1000
+        if counts_as_failure(status_code):
+            self.breaker.record_failure(latency_ms)
+        else:
+            self.breaker.record_success(latency_ms)
     
     def get_user_deepgram_config(self, user_id):
         """Get Deepgram configuration for a user"""
@@ -31,7 +44,7 @@ class DeepgramService:
             "Content-Type": "audio/wav"  # Adjust based on actual audio format
         }
         
-        url = "https://api.deepgram.com/v1/listen"
+        url = f"{self.api_url}/listen"
         params = {
             "model": config.get('model', 'nova'),
             "language": config.get('language', 'en-US'),
@@ -39,13 +52,21 @@ class DeepgramService:
             "diarize": "false"
         }
         
+        if not self.breaker.allow():
+            return "Error: speech recognition is temporarily unavailable"
+        
+        started = time.perf_counter()
         try:
-            response = requests.post(url, headers=headers, params=params, data=audio_data)
+            response = requests.post(url, headers=headers, params=params, data=audio_data, timeout=self.breaker.timeout())
+            self._record_response(response.status_code, started)
             if response.status_code == 200:
                 result = response.json()
                 return result['results']['channels'][0]['alternatives'][0]['transcript']
             else:
                 return f"Error: {response.status_code} - {response.text}"
+        except requests.RequestException as e:
+            self.breaker.record_failure((time.perf_counter() - started) * 1000)
+            return f"Exception during transcription: {str(e)}"
         except Exception as e:
             return f"Exception during transcription: {str(e)}"
     
@@ -61,20 +82,32 @@ class DeepgramService:
             "Content-Type": "application/json"
         }
         
-        url = "https://api.deepgram.com/v1/speak"
+        url = f"{self.api_url}/speak"
         data = {
             "text": text,
             "voice": config.get('voice', 'aura'),
             "language": config.get('language', 'en-US')
         }
         
-        try:
-            response = requests.post(url, headers=headers, json=data)
-            if response.status_code == 200:
-                return response.content  # Return audio bytes
-            else:
-                print(f"TTS Error: {response.status_code} - {response.text}")
-                return None
-        except Exception as e:
-            print(f"TTS Exception: {str(e)}")
+        # Callers fall back to Twilio's own voice when there's no audio
+        if not self.breaker.allow():
+            print("TTS skipped: the Deepgram circuit is open")
             return None
+        
+        with tracer.span('tts'):
+            started = time.perf_counter()
+            try:
+                response = requests.post(url, headers=headers, json=data, timeout=self.breaker.timeout())
+                self._record_response(response.status_code, started)
+                if response.status_code == 200:
+                    return response.content  # Return audio bytes
+                else:
+                    print(f"TTS Error: {response.status_code} - {response.text}")
+                    return None
+            except requests.RequestException as e:
+                self.breaker.record_failure((time.perf_counter() - started) * 1000)
+                print(f"TTS Exception: {str(e)}")
+                return None
+            except Exception as e:
+                print(f"TTS Exception: {str(e)}")
+                return None
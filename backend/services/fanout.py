@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket shared by every fan-out so bursts stay within the provider's rate limit"""
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """Take a token, waiting until one is free or the monotonic deadline passes"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+
+                wait_for = (1 - self._tokens) / self.rate
+
+            if deadline is not None and now + wait_for > deadline:
+                return False
+            time.sleep(wait_for)
+
+
+class FanOutTimeout(Exception):
+    """A fanned-out task didn't finish before the request deadline"""
+    pass
+
+
+# One bounded pool per process so concurrent requests can't spawn unbounded threads
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('TWILIO_FANOUT_WORKERS', '8')),
+    thread_name_prefix='twilio-fanout'
+)
+
+twilio_rate_limiter = RateLimiter(
+    rate=float(os.getenv('TWILIO_MAX_RPS', '20')),
+    burst=int(os.getenv('TWILIO_RATE_BURST', '10'))
+)
+
+
+def _run_limited(func, rate_limiter, deadline):
+    if rate_limiter is not None and not rate_limiter.acquire(deadline):
+        raise FanOutTimeout('rate limit wait exceeded the deadline')
+    return func()
+
+
+def fan_out(tasks, timeout=5.0, rate_limiter=twilio_rate_limiter):
+    """
+    Run independent callables in parallel on the shared pool.
+    tasks maps a name to a zero-argument callable. Returns (results, errors) keyed by name;
+    anything not finished by the deadline is reported as a FanOutTimeout so callers can
+    build a partial response.
+    """
+    deadline = time.monotonic() + timeout
+    futures = {
+        _executor.submit(_run_limited, func, rate_limiter, deadline): name
+        for name, func in tasks.items()
+    }
+
+    done, not_done = wait(futures, timeout=timeout)
+
+    results = {}
+    errors = {}
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            errors[name] = e
+
+    for future in not_done:
+        name = futures[future]
+        future.cancel()
+        errors[name] = FanOutTimeout(f"{name} did not finish within {timeout}s")
+
+    for name, error in errors.items():
+        logger.error(f"Fan-out task {name} failed: {str(error)}")
+
+    return results, errors
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import threading
+import logging
+import httpx
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from services.circuit_breaker import circuit_breakers, counts_as_failure, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Built-in OpenAI-compatible chat completion endpoints; a tenant's baseUrl overrides the URL
+PROVIDERS = {
+    'groq': {
+        'url': os.getenv('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions'),
+        'api_key_env': 'GROQ_API_KEY',
+        'model': 'llama3-8b-8192'
+    },
+    'openai': {
+        'url': os.getenv('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions'),
+        'api_key_env': 'OPENAI_API_KEY',
+        'model': 'gpt-4o-mini'
+    },
+    'sutra': {
+        'url': os.getenv('SUTRA_API_URL', 'https://api.two.ai/v2/chat/completions'),
+        'api_key_env': 'SUTRA_API_KEY',
+        'model': 'sutra-v2'
+    },
+    # Any other endpoint speaking the OpenAI protocol, baseUrl and model come from the tenant
+    'openai-compatible': {'url': None, 'api_key_env': None, 'model': None},
+}
+
+def migrate_legacy_config(llm_config):
+    """
+    Every call used Groq (llama3-8b-8192) with the tenant's apiKey before providers became
+    per tenant, while the config form defaulted to OpenAI. Returns the config moved back
+    onto Groq for such an 'openai' entry without a baseUrl, or None if it needs no change.
+    """
+    if llm_config.get('provider') != 'openai' or llm_config.get('baseUrl'):
+        return None
+    return dict(llm_config, provider='groq', model=PROVIDERS['groq']['model'])
+
+
+class ProviderError(Exception):
+    """A provider failed to produce a completion"""
+    def __init__(self, provider, message, status_code=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+
+class ChatProvider:
+    """
+    Streams chat completions from an OpenAI-compatible endpoint, guarded by the
+    circuit breaker of its host. The timeout (connect, and wait per streamed chunk)
+    follows the breaker's observed time-to-first-token p99.
+    """
+    def __init__(self, name, url, api_key=None, max_timeout=30.0):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.breaker = circuit_breakers.get(f"llm:{urlsplit(url or '').netloc or name}", max_timeout=max_timeout)
+
+    def stream(self, model, messages, should_stop, on_first_token=None, max_tokens=150, temperature=0.7):
+        """
+        Collect a streamed completion. Returns None if should_stop() turns true part way or
+        on_first_token() returns False, raises ProviderError if the request fails and
+        CircuitOpenError without calling out while the provider's breaker is open.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True  # Stream so a cancelled turn stops generating right away
+        }
+
+        started = time.perf_counter()
+        first_token = []
+
+        def on_token():
+            # Time to first token is what callers wait on, so that's the latency the breaker tracks
+            first_token.append((time.perf_counter() - started) * 1000)
+            return on_first_token is None or on_first_token()
+
+        try:
+            with httpx.Client(timeout=self.breaker.timeout()) as client:
+                with client.stream("POST", self.url, headers=headers, json=payload) as response:
+                    if response.status_code != 200:
+                        response.read()
+                        latency_ms = (time.perf_counter() - started) * 1000
+                        if counts_as_failure(response.status_code):
+                            self.breaker.record_failure(latency_ms)
+                        else:
+                            # e.g. a tenant's bad API key, the provider itself is fine
+                            self.breaker.record_success(latency_ms)
+                        raise ProviderError(self.name, f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+                    text = self._read_stream(response, should_stop, on_token)
+        except (httpx.HTTPError, ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure((time.perf_counter() - started) * 1000)
+            raise ProviderError(self.name, str(e) or e.__class__.__name__)
+
+        if first_token:
+            self.breaker.record_success(first_token[0])
+        elif text is not None:
+            # Finished without a single token
+            self.breaker.record_success((time.perf_counter() - started) * 1000)
+        return text
+
+    def call_function(self, model, messages, function, temperature=0.0):
+        """
+        Have the model call `function` (a JSON schema function definition) and return the
+        arguments it passed as a dict. Raises ProviderError or CircuitOpenError like stream().
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.name)
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "tools": [{"type": "function", "function": function}],
+            "tool_choice": {"type": "function", "function": {"name": function['name']}}
+        }
+
+        started = time.perf_counter()
+        try:
+            with httpx.Client(timeout=self.breaker.timeout()) as client:
+                response = client.post(self.url, headers=headers, json=payload)
+            latency_ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                if counts_as_failure(response.status_code):
+                    self.breaker.record_failure(latency_ms)
+                else:
+                    self.breaker.record_success(latency_ms)
+                raise ProviderError(self.name, f"HTTP {response.status_code}: {response.text[:200]}", response.status_code)
+            self.breaker.record_success(latency_ms)
+
+            tool_calls = response.json()['choices'][0]['message'].get('tool_calls') or []
+        except (httpx.HTTPError, ValueError, KeyError, IndexError) as e:
+            self.breaker.record_failure((time.perf_counter() - started) * 1000)
+            raise ProviderError(self.name, str(e) or e.__class__.__name__)
+
+        for tool_call in tool_calls:
+            if tool_call.get('function', {}).get('name') == function['name']:
+                try:
+                    return json.loads(tool_call['function'].get('arguments') or '{}')
+                except ValueError:
+                    raise ProviderError(self.name, 'malformed function arguments')
+        raise ProviderError(self.name, f"model did not call {function['name']}")
+
+    def _read_stream(self, response, should_stop, on_first_token):
+        parts = []
+        for line in response.iter_lines():
+            # Leaving the stream early closes the connection and stops the generation
+            if should_stop():
+                return None
+
+            if not line.startswith('data:'):
+                continue
+
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+
+            chunk = json.loads(data)
+            if not chunk.get('choices'):
+                continue
+            delta = chunk['choices'][0].get('delta', {}).get('content')
+            if delta:
+                if not parts and not on_first_token():
+                    return None
+                parts.append(delta)
+
+        return ''.join(parts)
+
+
+class _Attempt:
+    def __init__(self, provider, model):
+        self.provider = provider
+        self.model = model
+        self.first_token_at = None
+        self.text = None
+        self.error = None
+        self.done = False
+
+
+class _Race:
+    """The first attempt to stream a token wins, the others stop at their next chunk"""
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.winner = None
+
+    def claim(self, attempt):
+        with self.cond:
+            if self.winner is None:
+                self.winner = attempt
+                self.cond.notify_all()
+            return self.winner is attempt
+
+    def lost(self, attempt):
+        return self.winner is not None and self.winner is not attempt
+
+    def finish(self, attempt):
+        with self.cond:
+            attempt.done = True
+            self.cond.notify_all()
+
+
+class LLMRouter:
+    """
+    Picks the provider and model for a tenant from their llm_config:
+
+        {"provider": "groq" | "openai" | "sutra" | "openai-compatible",
+         "model": "...", "apiKey": "...", "baseUrl": "...",
+         "hedge": {"provider": "...", "model": "...", "apiKey": "...", "baseUrl": "...", "afterMs": 400}}
+
+    With a hedge configured (per tenant, or process wide through LLM_HEDGE_PROVIDER), a
+    backup request goes to the second provider when the first hasn't streamed a token
+    within afterMs, or as soon as it fails. Whichever streams first is used.
+    """
+    def __init__(self, default_provider='groq', hedge_provider=None, hedge_model=None, hedge_after_ms=400,
+                 timeout=30.0, max_workers=32):
+        self.default_provider = default_provider
+        self.hedge_provider = hedge_provider
+        self.hedge_model = hedge_model
+        self.hedge_after_ms = hedge_after_ms
+        self.timeout = timeout
+        # Hedged attempts run here so a burst of slow turns can't spawn unbounded threads
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-hedge')
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'hedged': 0, 'backupWins': 0, 'failures': 0, 'functionCalls': 0}
+
+    def resolve(self, config):
+        """(ChatProvider, model) for a provider config, unknown providers fall back to the default"""
+        name = config.get('provider') or self.default_provider
+        if name not in PROVIDERS:
+            logger.warning(f"Unsupported LLM provider {name}, using {self.default_provider}")
+            # The tenant's key still applies, it is what they used before providers were per tenant
+            name, config = self.default_provider, {'apiKey': config.get('apiKey')}
+
+        defaults = PROVIDERS[name]
+        url = defaults['url']
+        base_url = config.get('baseUrl')
+        if base_url:
+            base_url = base_url.rstrip('/')
+            url = base_url if base_url.endswith('/chat/completions') else f"{base_url}/chat/completions"
+
+        api_key = config.get('apiKey') or (os.getenv(defaults['api_key_env']) if defaults['api_key_env'] else None)
+        provider = ChatProvider(name, url, api_key, max_timeout=self.timeout)
+        return provider, config.get('model') or defaults['model']
+
+    def route(self, llm_config):
+        """(primary, backup or None, hedge delay in seconds) where each is (ChatProvider, model)"""
+        primary = self.resolve(llm_config)
+
+        hedge = llm_config.get('hedge')
+        if not hedge and self.hedge_provider:
+            hedge = {'provider': self.hedge_provider, 'model': self.hedge_model}
+        if not hedge:
+            return primary, None, None
+
+        backup = self.resolve(hedge)
+        after_ms = hedge.get('afterMs', self.hedge_after_ms)
+        return primary, backup, float(after_ms) / 1000.0
+
+    def is_configured(self, llm_config):
+        provider, model = self.resolve(llm_config)
+        return bool(provider.url and provider.api_key and model)
+
+    def complete(self, llm_config, messages, cancel_token, max_tokens=150, temperature=0.7):
+        """
+        Stream a reply for a tenant. Returns (text, provider name, seconds to the first token),
+        text is None if cancel_token was cancelled part way. Raises ProviderError when no
+        provider produced an answer, or CircuitOpenError when every provider's breaker is open.
+        """
+        primary, backup, hedge_after = self.route(llm_config)
+        self._count('requests')
+        started = time.perf_counter()
+
+        if backup is None:
+            attempt = _Attempt(*primary)
+            self._run(attempt, None, messages, cancel_token, max_tokens, temperature)
+            winner = attempt
+        else:
+            winner = self._race(primary, backup, hedge_after, messages, cancel_token, max_tokens, temperature)
+
+        if cancel_token.cancelled:
+            return None, None, None
+        if winner is None or winner.error is not None:
+            self._count('failures')
+            if winner is not None:
+                raise winner.error
+            raise ProviderError('router', 'no provider produced a completion')
+
+        ttft = winner.first_token_at - started if winner.first_token_at else None
+        return winner.text, winner.provider.name, ttft
+
+    def call_function(self, llm_config, messages, function):
+        """Function call arguments from the tenant's primary provider, not hedged since nobody waits on it"""
+        provider, model = self.resolve(llm_config)
+        self._count('functionCalls')
+        return provider.call_function(model, messages, function)
+
+    def _race(self, primary, backup, hedge_after, messages, cancel_token, max_tokens, temperature):
+        race = _Race()
+        attempts = [_Attempt(*primary)]
+        self._executor.submit(self._run, attempts[0], race, messages, cancel_token, max_tokens, temperature)
+        hedge_at = time.monotonic() + hedge_after
+
+        with race.cond:
+            while not cancel_token.cancelled:
+                winner = race.winner
+                if winner is not None and winner.done:
+                    break
+
+                # Send the backup once the primary is slow to start or has failed outright
+                if len(attempts) == 1 and winner is None and (attempts[0].done or time.monotonic() >= hedge_at):
+                    attempts.append(_Attempt(*backup))
+                    self._executor.submit(self._run, attempts[1], race, messages, cancel_token, max_tokens, temperature)
+                    self._count('hedged')
+                    logger.info(f"Hedging LLM request to {backup[0].name} after {primary[0].name}")
+                    continue
+
+                if winner is None and len(attempts) == 2 and all(attempt.done for attempt in attempts):
+                    break
+
+                # Wake up periodically to notice a cancelled turn
+                race.cond.wait(timeout=max(0.001, min(0.05, hedge_at - time.monotonic())) if len(attempts) == 1 else 0.05)
+
+        winner = race.winner
+        if winner is None:
+            # Nobody streamed a token, surface the primary's error
+            failed = [attempt for attempt in attempts if attempt.error is not None]
+            # Report a real failure over a breaker that merely refused the call
+            failed.sort(key=lambda attempt: isinstance(attempt.error, CircuitOpenError))
+            return failed[0] if failed else None
+        if winner is not attempts[0]:
+            self._count('backupWins')
+        return winner
+
+    def _run(self, attempt, race, messages, cancel_token, max_tokens, temperature):
+        def on_first_token():
+            attempt.first_token_at = time.perf_counter()
+            return race is None or race.claim(attempt)
+
+        def should_stop():
+            return cancel_token.cancelled or (race is not None and race.lost(attempt))
+
+        try:
+            attempt.text = attempt.provider.stream(
+                attempt.model, messages, should_stop, on_first_token, max_tokens=max_tokens, temperature=temperature
+            )
+            if attempt.text == '' and race is not None:
+                raise ProviderError(attempt.provider.name, 'empty completion')
+        except (ProviderError, CircuitOpenError) as e:
+            attempt.error = e
+        except Exception as e:
+            attempt.error = ProviderError(attempt.provider.name, str(e))
+        finally:
+            if race is not None:
+                race.finish(attempt)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+# Shared router used by the LLM service
+llm_router = LLMRouter(
+    default_provider=os.getenv('LLM_DEFAULT_PROVIDER', 'groq'),
+    hedge_provider=os.getenv('LLM_HEDGE_PROVIDER'),
+    hedge_model=os.getenv('LLM_HEDGE_MODEL'),
+    hedge_after_ms=float(os.getenv('LLM_HEDGE_AFTER_MS', '400')),
+    timeout=float(os.getenv('LLM_TIMEOUT', '30'))
+)
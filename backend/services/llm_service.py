@@ -1,20 +1,56 @@
 import os
+import re
 import json
+import time
 import sqlite3
-import httpx
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from services.call_control import call_interrupts
+from services.call_state_store import create_call_state_store, VersionConflict
+from services.daily_stats import daily_stats
+from services.tracing import tracer
+from services.llm_providers import llm_router, ProviderError
+from services.circuit_breaker import CircuitOpenError
+from services.speculation import speculator
+from services.slot_filling import slot_filler, merge_extracted, BOOKING_PATTERN, SLOTS
 
 # Load environment variables
 load_dotenv()
 
+# Said when every LLM provider's circuit is open and nothing was cached for the question
+CANNED_REPLY = "I'm sorry, I'm having a little trouble right now. Could you say that again in a moment?"
+
 class LLMService:
-    def __init__(self):
-        self.active_calls = {}  # Store active call contexts
+    def __init__(self, call_states=None):
+        # Call contexts live in a shared store so any worker can serve any turn
+        self.call_states = call_states or create_call_state_store()
         # Use environment variable for Groq API key
         self.groq_api_key = os.getenv("GROQ_API_KEY")
         if not self.groq_api_key:
             print("Warning: GROQ_API_KEY not found in environment variables")
+        
+        # Recent answers per tenant and question, replayed while the LLM circuit is open
+        self._reply_lock = threading.Lock()
+        self._recent_replies = OrderedDict()  # (user_id, normalized question) -> reply
+        self.max_cached_replies = int(os.getenv('LLM_FALLBACK_CACHE_SIZE', '1000'))
+    
+    def _reply_key(self, user_id, user_input):
+        return (user_id, ' '.join(re.findall(r'\w+', (user_input or '').lower())))
+    
+    def _remember_reply(self, user_id, user_input, reply):
+        key = self._reply_key(user_id, user_input)
+        with self._reply_lock:
+            self._recent_replies[key] = reply
+            self._recent_replies.move_to_end(key)
+            while len(self._recent_replies) > self.max_cached_replies:
+                self._recent_replies.popitem(last=False)
+    
+    def _fallback_reply(self, user_id, user_input):
+        """An earlier answer to the same question from this tenant, or the canned apology"""
+        with self._reply_lock:
+            return self._recent_replies.get(self._reply_key(user_id, user_input), CANNED_REPLY)
     
     def get_user_llm_config(self, user_id):
         """Get LLM configuration for a user"""
@@ -30,24 +66,12 @@ class LLMService:
     
     def get_call_context(self, call_sid):
         """Get the context for an active call"""
-        if call_sid not in self.active_calls:
-            # Retrieve call data from database if available
-            conn = sqlite3.connect('voiceai.db')
-            conn.row_factory = sqlite3.Row
-            call_data = conn.execute('SELECT * FROM active_calls WHERE call_sid = ?', (call_sid,)).fetchone()
-            conn.close()
-            
-            if call_data:
-                self.active_calls[call_sid] = {
-                    'user_id': call_data['user_id'],
-                    'conversation_history': json.loads(call_data['conversation_history']),
-                    'context': json.loads(call_data['context'])
-                }
-            else:
-                # If not found, return None
-                return None
-                
-        return self.active_calls.get(call_sid)
+        loaded = self.call_states.load(call_sid)
+        if not loaded:
+            # If not found, return None
+            return None
+        
+        return loaded[0]
     
     def initialize_call_context(self, call_sid, user_id, customer_number):
         """Initialize context for a new call"""
@@ -64,84 +88,164 @@ class LLMService:
             }
         }
         
-        self.active_calls[call_sid] = context
-        
-        # Save to database
-        conn = sqlite3.connect('voiceai.db')
-        conn.execute(
-            """
-            INSERT INTO active_calls
-            (call_sid, user_id, conversation_history, context, started_at)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (call_sid, user_id, json.dumps([]), json.dumps(context['context']), context['context']['call_start_time'])
-        )
-        conn.commit()
-        conn.close()
+        self.call_states.create(call_sid, context)
+        daily_stats.record_call_started(user_id, context['context']['call_start_time'])
         
         return context
     
-    def update_call_context(self, call_sid, user_input, ai_response):
+    def _apply_to_call(self, call_sid, mutate, retries=5):
+        """Apply a change to a call's state with optimistic versioning, retrying on conflicts"""
+        for _ in range(retries):
+            loaded = self.call_states.load(call_sid)
+            if not loaded:
+                return None
+            
+            state, version = loaded
+            mutate(state)
+            try:
+                self.call_states.save(call_sid, state, version)
+                return state
+            except VersionConflict:
+                # Another worker wrote a turn first, replay ours on top of it
+                continue
+        
+        raise VersionConflict(call_sid)
+    
+    def update_call_context(self, call_sid, user_input, ai_response, context_updates=None):
         """Update the conversation history for a call"""
-        context = self.get_call_context(call_sid)
-        if not context:
-            return
+        def add_turn(state):
+            # Add to conversation history
+            state['conversation_history'].append({
+                'role': 'user',
+                'content': user_input,
+                'timestamp': datetime.now().isoformat()
+            })
             
-        # Add to conversation history
-        context['conversation_history'].append({
-            'role': 'user',
-            'content': user_input,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        context['conversation_history'].append({
-            'role': 'assistant',
-            'content': ai_response,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Update database
-        conn = sqlite3.connect('voiceai.db')
-        conn.execute(
-            """
-            UPDATE active_calls
-            SET conversation_history = ?, context = ?, updated_at = ?
-            WHERE call_sid = ?
-            """,
-            (
-                json.dumps(context['conversation_history']),
-                json.dumps(context['context']),
-                datetime.now().isoformat(),
-                call_sid
-            )
-        )
-        conn.commit()
-        conn.close()
+            state['conversation_history'].append({
+                'role': 'assistant',
+                'content': ai_response,
+                'timestamp': datetime.now().isoformat()
+            })
+            
+            if context_updates:
+                # Appointment slots are merged so details filled in meanwhile aren't lost
+                state['context'].update({key: value for key, value in context_updates.items() if key != 'appointment_details'})
+                if context_updates.get('appointment_details'):
+                    state['context'].setdefault('appointment_details', {}).update(context_updates['appointment_details'])
+        
+        return self._apply_to_call(call_sid, add_turn)
+    
+    def _fill_appointment_slots(self, call_sid, context, user_input):
+        """Context updates for the appointment details the caller gave this turn"""
+        call_context = context['context']
+        details = call_context.get('appointment_details') or {}
+        history = context['conversation_history']
+        last_prompt = history[-1]['content'] if history and history[-1]['role'] == 'assistant' else None
+        booking = call_context.get('has_appointment', False) or bool(BOOKING_PATTERN.search(user_input or ''))
+        
+        slots, needs_llm = slot_filler.fill(details, user_input, last_prompt, booking)
+        
+        if needs_llm:
+            def apply(extracted):
+                def fill_missing(state):
+                    # Anything the parser found in a later turn is fresher, only fill the gaps
+                    # (and replace a name that was only guessed)
+                    current = merge_extracted(state['context'].setdefault('appointment_details', {}), extracted)
+                    if current.get('customer_name'):
+                        state['context']['customer_name'] = current['customer_name']
+                
+                self._apply_to_call(call_sid, fill_missing)
+            
+            slot_filler.fill_with_llm_later(self.get_user_llm_config(context['user_id']), user_input, last_prompt, apply)
+        
+        context_updates = {}
+        if slots:
+            context_updates['appointment_details'] = slots
+            if slots.get('customer_name'):
+                context_updates['customer_name'] = slots['customer_name']
+        
+        # A date and time on their own also mean the caller is booking
+        merged = dict(details, **slots)
+        if booking or (merged.get('date') and merged.get('time')):
+            context_updates['has_appointment'] = True
+        
+        return context_updates
     
     def process_user_input(self, call_sid, user_input):
-        """Process user voice input with LLM"""
+        """Process user voice input with LLM, returns None if the turn was preempted or the call ended"""
+        load_started = time.perf_counter()
         context = self.get_call_context(call_sid)
         if not context:
             return "I'm sorry, there seems to be an issue with this call. Please try again later."
-            
+        
+        # Key this turn's spans by its position in the conversation, the load included
+        tracer.set_turn(len(context['conversation_history']) // 2 + 1)
+        tracer.record('context.load', (time.perf_counter() - load_started) * 1000)
+        
+        # A newer utterance on the same call preempts any generation still running
+        cancel_token = call_interrupts.acquire(call_sid, preempt=True)
+        try:
+            # A reply already generated from the interim transcript saves the LLM round trip
+            ai_response = speculator.take(call_sid, user_input, cancel_token)
+            if ai_response is None:
+                ai_response = self._generate_response(context, user_input, cancel_token)
+        finally:
+            call_interrupts.release(call_sid, cancel_token)
+        
+        # The caller spoke again or hung up while we were waiting, drop this answer
+        if cancel_token.cancelled:
+            print(f"Discarding response for call {call_sid}: {cancel_token.reason}")
+            return None
+        
+        # Collect the name, date and time for an appointment as the caller gives them
+        with tracer.span('slots.fill'):
+            context_updates = self._fill_appointment_slots(call_sid, context, user_input)
+        
+        # Update the call context with this interaction
+        with tracer.span('context.save'):
+            try:
+                self.update_call_context(call_sid, user_input, ai_response, context_updates)
+            except VersionConflict:
+                # Other turns kept winning the race, still answer the caller rather than fail the webhook
+                print(f"Could not save turn for call {call_sid} after repeated version conflicts")
+        
+        return ai_response
+    
+    def speculate(self, call_sid, partial_text):
+        """Start generating a reply from an interim transcript while the caller is still talking"""
+        speculator.propose(call_sid, partial_text, self._speculate)
+    
+    def _speculate(self, call_sid, partial_text, cancel_token):
+        context = self.get_call_context(call_sid)
+        if not context:
+            return None
+        
+        tracer.set_turn(len(context['conversation_history']) // 2 + 1)
+        return self._generate_response(context, partial_text, cancel_token, speculative=True)
+    
+    def _generate_response(self, context, user_input, cancel_token, speculative=False):
+        """
+        Build the prompt for a turn and stream the answer from the tenant's LLM provider.
+        A speculative run returns None instead of an apology when the provider fails, so
+        the real turn generates (or apologizes) itself.
+        """
         user_id = context['user_id']
         llm_config = self.get_user_llm_config(user_id)
         
-        # Force Groq as the provider with llama3-8b-8192 model
-        llm_config['provider'] = 'groq'
-        llm_config['model'] = 'llama3-8b-8192'
-        
         # Get relevant knowledge base content
-        conn = sqlite3.connect('voiceai.db')
-        conn.row_factory = sqlite3.Row
-        knowledge_bases = conn.execute('SELECT * FROM knowledge_base WHERE user_id = ?', (user_id,)).fetchall()
-        conn.close()
+        with tracer.span('knowledge.retrieve'):
+            conn = sqlite3.connect('voiceai.db')
+            conn.row_factory = sqlite3.Row
+            knowledge_bases = conn.execute('SELECT * FROM knowledge_base WHERE user_id = ?', (user_id,)).fetchall()
+            conn.close()
+            
+            knowledge_context = ""
+            for kb in knowledge_bases:
+                # In a real implementation, you would do vector search or similar
+                # For simplicity, we're just appending knowledge base names
+                knowledge_context += f"Knowledge from: {kb['kb_name']}\n"
         
-        knowledge_context = ""
-        for kb in knowledge_bases:
-            # In a real implementation, you would do vector search or similar
-            # For simplicity, we're just appending knowledge base names
-            knowledge_context += f"Knowledge from: {kb['kb_name']}\n"
+        prompt_started = time.perf_counter()
         
         # Get the script for this user
         conn = sqlite3.connect('voiceai.db')
@@ -171,6 +275,14 @@ class LLMService:
         Keep your responses brief and conversational, as this is for a phone call.
         """
         
+        # Don't ask again for appointment details the caller already gave
+        appointment_details = context['context'].get('appointment_details') or {}
+        collected = [f"{slot.replace('_', ' ')}: {appointment_details[slot]}" for slot in SLOTS if appointment_details.get(slot)]
+        if appointment_details.get('customer_name_source') == 'guessed':
+            collected[0] += ' (unconfirmed, confirm it with the caller)'
+        if collected:
+            system_prompt += f"\nAppointment details collected so far: {', '.join(collected)}. Only ask for what is missing.\n"
+        
         # Convert conversation history to the format expected by the LLM
         messages = [{"role": "system", "content": system_prompt}]
         
@@ -182,100 +294,125 @@ class LLMService:
         
         # Add the current user input
         messages.append({"role": "user", "content": user_input})
+        tracer.record('prompt.build', (time.perf_counter() - prompt_started) * 1000)
         
-        # Use Groq API for all requests
-        groq_api_key = llm_config.get('apiKey') or self.groq_api_key
-        
-        if not groq_api_key:
-            print("No Groq API key found in configuration or environment")
-            return "I'm sorry, the AI service is not properly configured. Please check your GROQ_API_KEY in the .env file."
-            
-        headers = {
-            "Authorization": f"Bearer {groq_api_key}",
-            "Content-Type": "application/json"
-        }
+        # The tenant's provider and model, with an optional hedge to a second provider
+        if not llm_router.is_configured(llm_config):
+            print(f"No LLM API key found in configuration or environment for user {user_id}")
+            if speculative:
+                return None
+            return "I'm sorry, the AI service is not properly configured. Please check your LLM API key."
         
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": messages,
-            "max_tokens": 150,  # Keep responses concise for voice
-            "temperature": 0.7
-        }
+        # Don't spend tokens on a turn that was already preempted
+        if cancel_token.cancelled:
+            return None
         
+        llm_started = time.perf_counter()
         try:
-            with httpx.Client(timeout=30.0) as client:
-                response = client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                
-                if response.status_code == 200:
-                    response_data = response.json()
-                    ai_response = response_data['choices'][0]['message']['content']
-                else:
-                    print(f"Error from Groq API: {response.status_code}, {response.text}")
-                    ai_response = "I'm sorry, I couldn't process your request at this time."
-        except Exception as e:
-            print(f"Exception when calling Groq API: {str(e)}")
-            ai_response = "I'm sorry, I encountered an error while processing your request."
-        
-        # Check for appointment scheduling intent
-        if "appointment" in user_input.lower() or "schedule" in user_input.lower():
-            # Update context to indicate appointment scheduling is in progress
-            context['context']['has_appointment'] = True
-        
-        # Update the call context with this interaction
-        self.update_call_context(call_sid, user_input, ai_response)
+            ai_response, _, ttft = llm_router.complete(llm_config, messages, cancel_token, max_tokens=150, temperature=0.7)
+            if ttft is not None:
+                tracer.record('llm.ttft', ttft * 1000)
+            if ai_response:
+                self._remember_reply(user_id, user_input, ai_response)
+        except CircuitOpenError as e:
+            # Don't make the caller wait on a provider that is known to be down
+            print(f"LLM fallback reply: {e}")
+            ai_response = None if speculative else self._fallback_reply(user_id, user_input)
+        except ProviderError as e:
+            print(f"Error from LLM provider {e}")
+            ai_response = None if speculative else "I'm sorry, I couldn't process your request at this time."
         
+        tracer.record('llm.total', (time.perf_counter() - llm_started) * 1000)
         return ai_response
     
-    def finalize_call(self, call_sid):
-        """Clean up after a call has ended"""
-        if call_sid in self.active_calls:
-            # Extract any important information from the call
-            context = self.active_calls[call_sid]
-            
-            # Check if an appointment was scheduled
-            if context.get('context', {}).get('has_appointment', False):
-                appointment_details = context.get('context', {}).get('appointment_details', {})
+    def finalize_call(self, call_sid, call_status='completed', duration=None, from_number=None, to_number=None):
+        """
+        Clean up after a call has ended.
+        Saves any appointment, moves the call from active_calls into call_logs in one
+        transaction and evicts it from memory. Safe to call more than once, and from
+        several workers at the same time: only the one that deletes the live state
+        archives the call.
+        """
+        context = self.get_call_context(call_sid)
+        if not context:
+            # Already finalized (or never started)
+            return False
+        
+        call_context = context.get('context', {})
+        started_at = call_context.get('call_start_time')
+        ended_at = datetime.now().isoformat()
+        
+        # Twilio reports the duration, otherwise work it out from our own timestamps
+        if duration is None and started_at:
+            duration = int((datetime.now() - datetime.fromisoformat(started_at)).total_seconds())
+        
+        conn = sqlite3.connect('voiceai.db')
+        try:
+            with conn:
+                # Claim the call first: the delete takes the write lock, so a concurrent
+                # finalizer (sweeper, status callback, another worker) finds nothing left
+                if not self.call_states.delete(call_sid, conn=conn):
+                    return False
                 
-                # Save the appointment to the database if information is complete
-                if appointment_details.get('customer_name') and appointment_details.get('date') and appointment_details.get('time'):
-                    conn = sqlite3.connect('voiceai.db')
-                    conn.execute(
-                        """
-                        INSERT INTO appointments
-                        (user_id, customer_name, customer_phone, appointment_date, appointment_time, notes, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """,
-                        (
-                            context.get('user_id'),
-                            appointment_details.get('customer_name'),
-                            context.get('customer_number'),
-                            appointment_details.get('date'),
-                            appointment_details.get('time'),
-                            appointment_details.get('notes', ''),
-                            datetime.now().isoformat()
+                # Check if an appointment was scheduled
+                if call_context.get('has_appointment', False):
+                    appointment_details = call_context.get('appointment_details', {})
+                    
+                    # Save the appointment to the database if information is complete
+                    if appointment_details.get('customer_name') and appointment_details.get('date') and appointment_details.get('time'):
+                        conn.execute(
+                            """
+                            INSERT INTO appointments
+                            (user_id, customer_name, customer_phone, appointment_date, appointment_time, notes, created_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            """,
+                            (
+                                context.get('user_id'),
+                                appointment_details.get('customer_name'),
+                                context.get('customer_number'),
+                                appointment_details.get('date'),
+                                appointment_details.get('time'),
+                                appointment_details.get('notes', ''),
+                                datetime.now().isoformat()
+                            )
                         )
+                        daily_stats.record_appointment(context.get('user_id'), appointment_details.get('date'), conn=conn)
+                
+                # Archive the final state of the conversation
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO call_logs
+                    (call_sid, user_id, from_number, to_number, duration, conversation_history, status, started_at, ended_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        call_sid,
+                        context.get('user_id'),
+                        from_number or context.get('customer_number'),
+                        to_number,
+                        duration,
+                        json.dumps(context.get('conversation_history', [])),
+                        call_status,
+                        started_at,
+                        ended_at
                     )
-                    conn.commit()
-                    conn.close()
-            
-            # Update call status in database
-            conn = sqlite3.connect('voiceai.db')
-            conn.execute(
-                """
-                UPDATE active_calls
-                SET status = 'completed', completed_at = ?
-                WHERE call_sid = ?
-                """,
-                (datetime.now().isoformat(), call_sid)
-            )
-            conn.commit()
+                )
+                
+                # Roll the outcome into the dashboard counters exactly once, with the archive
+                daily_stats.record_call_finished(context.get('user_id'), started_at, call_status, duration, conn=conn)
+        finally:
             conn.close()
-            
-            # Remove from active calls dictionary
-            del self.active_calls[call_sid]
-            
-        return True
\ No newline at end of file
+        
+        return True
+    
+    def reap_stale_calls(self, max_idle_seconds=1800):
+        """Finalize calls whose status callback never arrived, returns how many were reaped"""
+        cutoff = (datetime.now() - timedelta(seconds=max_idle_seconds)).isoformat()
+        stale = self.call_states.stale_calls(cutoff)
+        
+        for call_sid in stale:
+            print(f"Reaping stale call {call_sid}")
+            call_interrupts.abort(call_sid, reason='stale')
+            self.finalize_call(call_sid, call_status='abandoned')
+        
+        return len(stale)
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+def normalize_number(phone_number):
+    """Twilio sends E.164 numbers, but configs are typed by hand, so drop formatting"""
+    if not phone_number:
+        return None
+    digits = ''.join(ch for ch in phone_number if ch.isdigit())
+    return '+' + digits if digits else None
+
+
+class PhoneRouteTable:
+    """
+    Maps the account's phone numbers to the tenant that owns them.
+    Backed by the indexed phone_routes table, which is rewritten whenever a user's
+    config is saved, with an in-process cache in front so a ringing call costs a
+    dict lookup. Other workers pick up changes once their cached entry expires.
+    """
+    def __init__(self, db_path='voiceai.db', ttl=300):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = {}  # phone_number -> (expires_at, user_id or None)
+        # Bumped by invalidate(), so a lookup that read the table before a change can't cache it afterwards
+        self._generation = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def lookup(self, phone_number):
+        """user_id that owns the number, or None"""
+        number = normalize_number(phone_number)
+        if not number:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(number)
+            if entry and entry[0] > now:
+                return entry[1]
+            generation = self._generation
+
+        conn = self._connect()
+        row = conn.execute('SELECT user_id FROM phone_routes WHERE phone_number = ?', (number,)).fetchone()
+        conn.close()
+        user_id = row['user_id'] if row else None
+
+        # Unknown numbers are cached briefly too, so a misconfigured number can't hammer the
+        # database but a number just configured on another worker starts routing quickly
+        ttl = self.ttl if user_id else min(self.ttl, 10)
+        with self._lock:
+            if generation == self._generation:
+                self._cache[number] = (now + ttl, user_id)
+        return user_id
+
+    def set_user_numbers(self, user_id, phone_numbers, conn=None):
+        """
+        Replace the numbers routed to a user; a number taken from another user moves over.
+        With the caller's conn, call invalidate() once the transaction is committed.
+        """
+        numbers = {number for number in (normalize_number(n) for n in phone_numbers) if number}
+
+        own_conn = conn is None
+        conn = conn or self._connect()
+        conn.execute('DELETE FROM phone_routes WHERE user_id = ?', (user_id,))
+        for number in numbers:
+            conn.execute(
+                """
+                INSERT INTO phone_routes (phone_number, user_id, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(phone_number) DO UPDATE SET user_id = excluded.user_id, updated_at = excluded.updated_at
+                """,
+                (number, user_id, datetime.now().isoformat())
+            )
+        if own_conn:
+            conn.commit()
+            conn.close()
+            self.invalidate()
+
+    def rebuild(self, conn):
+        """Recreate every route from user_config in the caller's transaction, invalidate() after committing"""
+        conn.execute('DELETE FROM phone_routes')
+        for row in conn.execute('SELECT user_id, twilio_config FROM user_config').fetchall():
+            try:
+                phone_number = json.loads(row['twilio_config'] or '{}').get('phoneNumber')
+            except ValueError:
+                continue
+            number = normalize_number(phone_number)
+            if number:
+                conn.execute(
+                    'INSERT OR REPLACE INTO phone_routes (phone_number, user_id, updated_at) VALUES (?, ?, ?)',
+                    (number, row['user_id'], datetime.now().isoformat())
+                )
+        logger.info("Rebuilt phone routes from user_config")
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._generation += 1
+
+
+# Shared instance used by the call webhooks and the config endpoint
+phone_routes = PhoneRouteTable(ttl=int(os.getenv('PHONE_ROUTE_CACHE_TTL', '300')))
@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import hmac
+import time
+import sqlite3
+import cProfile
+import threading
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+MODES = ('sampling', 'cprofile')
+EXTENSIONS = {'sampling': 'folded', 'cprofile': 'pstats'}
+
+# Only names the profiler wrote itself are ever served back
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+\.(folded|pstats)$')
+
+class SamplingCollector:
+    """
+    Samples one thread's stack from a background thread every `interval` seconds.
+    The profiled code runs untouched, so the overhead is the sampler's own work.
+    Written as collapsed stacks ("outer;inner count"), the input of flamegraph tools.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, args=(target,), daemon=True)
+        self._thread.start()
+
+    def _run(self, target):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class CProfileCollector:
+    """Deterministic cProfile of the calling thread, written as pstats"""
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class ProfileSession:
+    def __init__(self, mode, label, collector):
+        self.mode = mode
+        self.label = label
+        self.collector = collector
+        self.started = time.perf_counter()
+
+
+class Profiler:
+    """
+    Opt-in profiling of single requests or of every turn of a flagged call.
+    Nothing is collected unless an admin token is configured, and then only for
+    requests carrying that token or for calls flagged through the admin API.
+    Flags live in SQLite so every worker sees them; each worker re-reads them at
+    most every `refresh_interval` seconds. Output goes to a directory capped at
+    `max_files`, oldest profiles are deleted first.
+    """
+    def __init__(self, db_path='voiceai.db', output_dir='profiles', max_files=50, admin_token=None,
+                 sample_interval=0.005, refresh_interval=5):
+        self.db_path = db_path
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.admin_token = admin_token
+        self.sample_interval = sample_interval
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._flags = {}  # call_sid -> (mode, expires_at iso)
+        self._flags_loaded_at = None
+
+    @property
+    def enabled(self):
+        return bool(self.admin_token)
+
+    def authorized(self, token):
+        return self.enabled and bool(token) and hmac.compare_digest(token, self.admin_token)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def flag_call(self, call_sid, mode='sampling', ttl=3600):
+        """Profile every turn of a call for the next `ttl` seconds"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+
+        now = datetime.now()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO profile_flags (call_sid, mode, expires_at, created_at) VALUES (?, ?, ?, ?)',
+                (call_sid, mode, (now + timedelta(seconds=ttl)).isoformat(), now.isoformat())
+            )
+        conn.close()
+        self._flags_loaded_at = None
+
+    def unflag_call(self, call_sid):
+        conn = self._connect()
+        with conn:
+            removed = conn.execute('DELETE FROM profile_flags WHERE call_sid = ?', (call_sid,)).rowcount
+        conn.close()
+        self._flags_loaded_at = None
+        return bool(removed)
+
+    def flagged_calls(self):
+        """Unexpired flags as {call_sid: {'mode', 'expiresAt'}}"""
+        return {
+            call_sid: {'mode': mode, 'expiresAt': expires_at}
+            for call_sid, (mode, expires_at) in self._current_flags().items()
+        }
+
+    def _current_flags(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._flags_loaded_at is not None and now - self._flags_loaded_at < self.refresh_interval:
+                return self._flags
+
+        conn = self._connect()
+        with conn:
+            # Expired flags are dropped on the way
+            conn.execute('DELETE FROM profile_flags WHERE expires_at < ?', (datetime.now().isoformat(),))
+            flags = {
+                row['call_sid']: (row['mode'], row['expires_at'])
+                for row in conn.execute('SELECT call_sid, mode, expires_at FROM profile_flags')
+            }
+        conn.close()
+
+        with self._lock:
+            self._flags = flags
+            self._flags_loaded_at = now
+        return flags
+
+    def has_flagged_calls(self):
+        return self.enabled and bool(self._current_flags())
+
+    def mode_for_call(self, call_sid):
+        """Profiling mode of a flagged call, or None"""
+        if not call_sid or not self.enabled:
+            return None
+        flag = self._current_flags().get(call_sid)
+        if not flag or flag[1] < datetime.now().isoformat():
+            return None
+        return flag[0]
+
+    def start(self, mode, label):
+        """Start collecting on the calling thread, returns the session for finish()"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+
+        collector = CProfileCollector() if mode == 'cprofile' else SamplingCollector(self.sample_interval)
+        try:
+            collector.start()
+        except ValueError:
+            # Another profiler already owns the interpreter (Python 3.12+ allows only one),
+            # sampling still works alongside it
+            mode, collector = 'sampling', SamplingCollector(self.sample_interval)
+            collector.start()
+        return ProfileSession(mode, label, collector)
+
+    def finish(self, session):
+        """Stop collecting and write the profile, returns its file name"""
+        session.collector.stop()
+        elapsed_ms = (time.perf_counter() - session.started) * 1000
+
+        label = re.sub(r'[^\w.-]', '_', session.label)[:100]
+        name = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{label}-{elapsed_ms:.0f}ms.{EXTENSIONS[session.mode]}"
+        os.makedirs(self.output_dir, exist_ok=True)
+        session.collector.write(os.path.join(self.output_dir, name))
+        self._prune()
+
+        logger.info(f"Wrote profile {name}")
+        return name
+
+    def _prune(self):
+        profiles = self.list_profiles()
+        for profile in profiles[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.output_dir, profile['name']))
+            except OSError:
+                pass
+
+    def list_profiles(self):
+        """Stored profiles, newest first"""
+        if not os.path.isdir(self.output_dir):
+            return []
+
+        profiles = []
+        for name in os.listdir(self.output_dir):
+            if not PROFILE_NAME_PATTERN.match(name):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.output_dir, name))
+            except OSError:
+                continue
+            profiles.append({
+                'name': name,
+                'size': stat.st_size,
+                'createdAt': datetime.fromtimestamp(stat.st_mtime).isoformat()
+            })
+        profiles.sort(key=lambda profile: profile['name'], reverse=True)
+        return profiles
+
+    def path_for(self, name):
+        """Absolute path of a stored profile, or None"""
+        if not PROFILE_NAME_PATTERN.match(name or ''):
+            return None
+        path = os.path.abspath(os.path.join(self.output_dir, name))
+        return path if os.path.isfile(path) else None
+
+
+# Shared instance, profiling stays off unless PROFILING_ADMIN_TOKEN is set
+profiler = Profiler(
+    output_dir=os.getenv('PROFILE_DIR', 'profiles'),
+    max_files=int(os.getenv('PROFILE_MAX_FILES', '50')),
+    admin_token=os.getenv('PROFILING_ADMIN_TOKEN'),
+    sample_interval=float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+)
@@ -0,0 +1,147 @@
+import os
+import re
+import uuid
+import threading
+import logging
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Twilio SIDs are two letters and 32 hex digits, anything else never touches the filesystem
+SID_PATTERN = re.compile(r'^RE[0-9a-fA-F]{32}$')
+
+class UpstreamError(Exception):
+    """Twilio refused or failed to hand over a recording"""
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Download:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class RecordingCache:
+    """
+    Local disk cache of recording audio, bounded by total size with LRU eviction.
+    Recordings never change once Twilio has them, so a cached file is served for as
+    long as it stays in the cache. Concurrent misses for the same recording share
+    one download from Twilio.
+    """
+    def __init__(self, directory='recording_cache', max_bytes=512 * 1024 * 1024, timeout=30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._downloads = {}  # recording_sid -> _Download in progress
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, recording_sid):
+        return os.path.join(self.directory, f"{recording_sid}.mp3")
+
+    def get(self, recording_sid, account_sid, auth_token):
+        """Path of the cached recording, downloading it first if needed"""
+        if not SID_PATTERN.match(recording_sid or ''):
+            raise ValueError(f"Invalid recording SID: {recording_sid}")
+
+        path = self.path_for(recording_sid)
+        if self._touch(path):
+            return path
+
+        with self._lock:
+            download = self._downloads.get(recording_sid)
+            leader = download is None
+            if leader:
+                download = self._downloads[recording_sid] = _Download()
+
+        if not leader:
+            # Someone else is already fetching it, wait for their result
+            download.done.wait(self.timeout * 2)
+            if download.error:
+                raise download.error
+            if not os.path.exists(path):
+                raise UpstreamError(f"Recording {recording_sid} is not available", 504)
+            return path
+
+        try:
+            self._download(recording_sid, account_sid, auth_token, path)
+            self._evict(keep=path)
+            return path
+        except Exception as e:
+            download.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._downloads[recording_sid]
+            download.done.set()
+
+    def _touch(self, path):
+        # Bump the modification time so eviction sees it as recently used
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _download(self, recording_sid, account_sid, auth_token, path):
+        recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}.mp3"
+        try:
+            response = requests.get(recording_url, auth=(account_sid, auth_token), stream=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(f"Error fetching recording: {str(e)}")
+
+        if not response.ok:
+            response.close()
+            raise UpstreamError(f"Error fetching recording: {response.status_code}", response.status_code)
+
+        # Write to a private temp file and move it into place so readers never see a partial file
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(partial, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+            os.replace(partial, path)
+        except requests.RequestException as e:
+            # The connection dropped part way through the download
+            raise UpstreamError(f"Error fetching recording: {str(e)}")
+        finally:
+            response.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+
+        logger.info(f"Cached recording {recording_sid} ({os.path.getsize(path)} bytes)")
+
+    def _evict(self, keep=None):
+        """Remove least recently used recordings until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.mp3'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+# Shared instance used by the recording proxy endpoints
+recording_cache = RecordingCache(
+    directory=os.getenv('RECORDING_CACHE_DIR', 'recording_cache'),
+    max_bytes=int(os.getenv('RECORDING_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+)
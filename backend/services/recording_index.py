@@ -0,0 +1,199 @@
+import time
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class RecordingIndex:
+    """
+    Local index of recordings and transcriptions, filled by the Twilio webhooks.
+    The Twilio API is only used as a bounded fallback for calls we have nothing for,
+    and whatever it returns is written back here.
+    """
+    def __init__(self, db_path='voiceai.db', fallback_limit=5, recheck_seconds=300):
+        self.db_path = db_path
+        # Most recordings looked up per call when falling back to Twilio
+        self.fallback_limit = fallback_limit
+        # Don't ask Twilio about the same empty call more often than this
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._checked = {}  # call_sid -> monotonic time of the last fallback
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record_recording(self, call_sid, recording_sid, recording_url=None, duration=None,
+                         channels=None, date_created=None, conn=None):
+        """Insert or update a recording"""
+        own_conn = conn is None
+        conn = conn or self._connect()
+        conn.execute(
+            """
+            INSERT INTO recordings (call_sid, recording_sid, recording_url, duration, channels, date_created)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(recording_sid) DO UPDATE SET
+                recording_url = COALESCE(excluded.recording_url, recordings.recording_url),
+                duration = COALESCE(excluded.duration, recordings.duration),
+                channels = COALESCE(excluded.channels, recordings.channels),
+                date_created = COALESCE(excluded.date_created, recordings.date_created)
+            """,
+            (call_sid, recording_sid, recording_url, duration, channels, date_created or datetime.now().isoformat())
+        )
+        if own_conn:
+            conn.commit()
+            conn.close()
+
+    def record_transcription(self, call_sid, recording_sid, transcription_sid, transcription_text,
+                             date_created=None, conn=None):
+        """Insert or update a transcription"""
+        own_conn = conn is None
+        conn = conn or self._connect()
+        conn.execute(
+            """
+            INSERT INTO transcriptions (call_sid, recording_sid, transcription_sid, transcription_text, date_created)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(transcription_sid) DO UPDATE SET
+                transcription_text = excluded.transcription_text
+            """,
+            (call_sid, recording_sid, transcription_sid, transcription_text, date_created or datetime.now().isoformat())
+        )
+        if own_conn:
+            conn.commit()
+            conn.close()
+
+    def record_many(self, recordings, transcriptions=()):
+        """Store batches of recording and transcription dicts in one transaction"""
+        conn = self._connect()
+        with conn:
+            for recording in recordings:
+                self.record_recording(
+                    recording['call_sid'],
+                    recording['sid'],
+                    duration=recording.get('duration'),
+                    channels=recording.get('channels'),
+                    date_created=recording.get('date_created'),
+                    conn=conn
+                )
+            for transcription in transcriptions:
+                self.record_transcription(
+                    transcription['call_sid'],
+                    transcription['recording_sid'],
+                    transcription['transcription_sid'],
+                    transcription['transcription_text'],
+                    date_created=transcription.get('date_created'),
+                    conn=conn
+                )
+        conn.close()
+
+    def recordings_for_call(self, call_sid):
+        """Recordings of a call, newest first, with their latest transcription"""
+        conn = self._connect()
+        rows = conn.execute(
+            """
+            SELECT r.recording_sid, r.call_sid, r.duration, r.channels, r.date_created,
+                (SELECT t.transcription_text FROM transcriptions t
+                 WHERE t.recording_sid = r.recording_sid
+                 ORDER BY t.date_created DESC LIMIT 1) AS transcription
+            FROM recordings r
+            WHERE r.call_sid = ?
+            ORDER BY r.date_created DESC
+            """,
+            (call_sid,)
+        ).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def counts_for_calls(self, call_sids):
+        """{call_sid: number of recordings} for a page of calls in one query"""
+        if not call_sids:
+            return {}
+        conn = self._connect()
+        rows = conn.execute(
+            f"""
+            SELECT call_sid, COUNT(*) AS count FROM recordings
+            WHERE call_sid IN ({', '.join('?' for _ in call_sids)})
+            GROUP BY call_sid
+            """,
+            list(call_sids)
+        ).fetchall()
+        conn.close()
+        return {row['call_sid']: row['count'] for row in rows}
+
+    def transcriptions_for_call(self, call_sid):
+        """Transcriptions of a call in the order they were made"""
+        conn = self._connect()
+        rows = conn.execute(
+            """
+            SELECT transcription_sid, recording_sid, transcription_text, date_created
+            FROM transcriptions
+            WHERE call_sid = ?
+            ORDER BY date_created ASC
+            """,
+            (call_sid,)
+        ).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def _should_fall_back(self, call_sid):
+        now = time.monotonic()
+        with self._lock:
+            last = self._checked.get(call_sid)
+            if last is not None and now - last < self.recheck_seconds:
+                return False
+            self._checked[call_sid] = now
+
+            # Keep the bookkeeping bounded
+            if len(self._checked) > 10000:
+                cutoff = now - self.recheck_seconds
+                for sid in [sid for sid, t in self._checked.items() if t < cutoff]:
+                    del self._checked[sid]
+        return True
+
+    def recordings_with_fallback(self, client, call_sid):
+        """Local recordings for a call, asking Twilio (bounded) only if we have none"""
+        recordings = self.recordings_for_call(call_sid)
+        if recordings or client is None or not self._should_fall_back(call_sid):
+            return recordings
+
+        self.fetch_from_twilio(client, call_sid)
+        return self.recordings_for_call(call_sid)
+
+    def fetch_from_twilio(self, client, call_sid):
+        """Pull a call's recordings and their transcriptions from Twilio and store them locally"""
+        recordings = client.recordings.list(call_sid=call_sid, limit=self.fallback_limit)
+
+        conn = self._connect()
+        with conn:
+            for recording in recordings:
+                self.record_recording(
+                    call_sid,
+                    recording.sid,
+                    duration=int(recording.duration) if recording.duration else None,
+                    channels=recording.channels,
+                    date_created=recording.date_created.isoformat() if recording.date_created else None,
+                    conn=conn
+                )
+
+                # Transcriptions scoped to the recording, never the whole account
+                for transcription in client.recordings(recording.sid).transcriptions.list(limit=1):
+                    if transcription.transcription_text:
+                        self.record_transcription(
+                            call_sid,
+                            recording.sid,
+                            transcription.sid,
+                            transcription.transcription_text,
+                            date_created=transcription.date_created.isoformat() if transcription.date_created else None,
+                            conn=conn
+                        )
+        conn.close()
+
+        logger.info(f"Fetched {len(recordings)} recordings for call {call_sid} from Twilio")
+        return len(recordings)
+
+
+# Shared instance used by the webhooks and the recording endpoints
+recording_index = RecordingIndex()
@@ -0,0 +1,98 @@
+import time
+import threading
+import logging
+from datetime import datetime, timezone
+from services.recording_index import recording_index
+
+logger = logging.getLogger(__name__)
+
+class RecordingResolver:
+    """
+    Resolves recordings and transcriptions for a whole page of calls at once.
+    Pages the account-level recordings list once for the date range, joins it to
+    calls by call_sid in memory and caches the result for a short while.
+    """
+    def __init__(self, ttl=60, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache = {}  # (account_sid, day) -> (expires_at, recordings_by_call)
+
+    def resolve(self, client, since):
+        """Return {call_sid: [recording, ...]} for recordings created since `since`, newest first"""
+        # Round down to the day so every page load in a day shares one cache entry
+        day = since.date() if isinstance(since, datetime) else since
+        key = (client.account_sid, day)
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        recordings_by_call = self._fetch(client, datetime(day.year, day.month, day.day, tzinfo=timezone.utc))
+
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                # Drop whatever expires first to make room
+                oldest = min(self._cache, key=lambda k: self._cache[k][0])
+                del self._cache[oldest]
+            self._cache[key] = (now + self.ttl, recordings_by_call)
+
+        return recordings_by_call
+
+    def _fetch(self, client, since):
+        # One paged query for every recording in the range
+        recordings = client.recordings.list(date_created_after=since)
+
+        # Transcriptions can't be filtered by date, so stream newest first and stop at the range start
+        transcripts = {}
+        if recordings:
+            for transcription in client.transcriptions.stream(page_size=1000):
+                if transcription.date_created and transcription.date_created < since:
+                    break
+                # Keep the most recent transcription per recording
+                transcripts.setdefault(transcription.recording_sid, transcription)
+
+        recordings_by_call = {}
+        transcription_rows = []
+        for recording in recordings:
+            transcription = transcripts.get(recording.sid)
+            recordings_by_call.setdefault(recording.call_sid, []).append({
+                'sid': recording.sid,
+                'call_sid': recording.call_sid,
+                'duration': int(recording.duration) if recording.duration else 0,
+                'channels': recording.channels,
+                'date_created': recording.date_created.isoformat() if recording.date_created else None,
+                'transcription': transcription.transcription_text if transcription else None
+            })
+            if transcription and transcription.transcription_text:
+                transcription_rows.append({
+                    'call_sid': recording.call_sid,
+                    'recording_sid': recording.sid,
+                    'transcription_sid': transcription.sid,
+                    'transcription_text': transcription.transcription_text,
+                    'date_created': transcription.date_created.isoformat() if transcription.date_created else None
+                })
+
+        # Keep the local index complete so per-call lookups don't have to ask Twilio
+        recording_index.record_many(
+            [recording for call_recordings in recordings_by_call.values() for recording in call_recordings],
+            transcription_rows
+        )
+
+        logger.info(f"Resolved {len(recordings)} recordings for {len(recordings_by_call)} calls")
+        return recordings_by_call
+
+    def invalidate(self, account_sid=None):
+        """Forget cached results, e.g. when a new recording or transcription arrives"""
+        with self._lock:
+            if account_sid is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == account_sid]:
+                    del self._cache[key]
+
+
+# Shared instance used by the call-log endpoints
+recording_resolver = RecordingResolver()
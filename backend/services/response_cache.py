@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from flask import current_app, request
+
+logger = logging.getLogger(__name__)
+
+# Headers the cache sets itself or that belong to a single response
+SKIPPED_HEADERS = {'content-length', 'date', 'x-cache'}
+
+class ResponseCache:
+    """
+    In-memory cache for JSON GET endpoints with stale-while-revalidate.
+    Fresh entries are served as-is, stale ones are served immediately while a
+    background refresh rebuilds them, and anything older is rebuilt inline.
+    Webhooks call invalidate() when the data behind an endpoint changes.
+    """
+    def __init__(self, ttl=30, stale_ttl=300, max_entries=512, refresh_workers=2):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (namespace, user_id, path, query) -> (created_at, ttl, stale_ttl, body, status, headers)
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='response-cache')
+
+    def cached(self, namespace, ttl=None, stale_ttl=None):
+        """Decorate a Flask view so its successful GET responses are cached per user and query string"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = self._key(namespace, kwargs)
+                fresh_for = self.ttl if ttl is None else ttl
+                stale_for = self.stale_ttl if stale_ttl is None else stale_ttl
+
+                entry = self._get(key)
+                if entry:
+                    age = time.monotonic() - entry[0]
+                    if age < entry[1]:
+                        return self._respond(entry, 'HIT')
+                    if age < entry[1] + entry[2]:
+                        self._refresh_later(key, view, args, kwargs, fresh_for, stale_for)
+                        return self._respond(entry, 'STALE')
+
+                response = current_app.make_response(view(*args, **kwargs))
+                self._store(key, response, fresh_for, stale_for)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    def _key(self, namespace, view_kwargs):
+        # The user comes from the URL when it has one, otherwise from the query string
+        user_id = view_kwargs.get('user_id') or view_kwargs.get('username') or request.args.get('user_id')
+        query = tuple(sorted(request.args.items(multi=True)))
+        return (namespace, user_id, request.path, query)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, response, ttl, stale_ttl):
+        # Only successful, fully buffered responses are worth replaying
+        if response.status_code != 200 or response.direct_passthrough:
+            return
+        headers = [(name, value) for name, value in response.headers if name.lower() not in SKIPPED_HEADERS]
+        entry = (time.monotonic(), ttl, stale_ttl, response.get_data(), response.status_code, headers)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _respond(self, entry, state):
+        response = current_app.response_class(entry[3], status=entry[4], headers=entry[5])
+        response.headers['X-Cache'] = state
+        return response
+
+    def _refresh_later(self, key, view, args, kwargs, ttl, stale_ttl):
+        # One refresh per entry at a time, however many requests see it stale
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+        path = request.path
+        query_string = request.query_string.decode('utf-8')
+
+        def refresh():
+            try:
+                with app.test_request_context(path, method='GET', query_string=query_string):
+                    response = app.make_response(view(*args, **kwargs))
+                    self._store(key, response, ttl, stale_ttl)
+            except Exception as e:
+                logger.error(f"Background refresh of {path} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def invalidate(self, namespace=None, user_id=None):
+        """Drop cached responses for a namespace, optionally only one user's, or everything"""
+        with self._lock:
+            for key in list(self._entries):
+                if namespace is not None and key[0] != namespace:
+                    continue
+                if user_id is not None and key[1] not in (None, str(user_id)):
+                    continue
+                del self._entries[key]
+
+
+# Shared instance used by the dashboard, call-log and stats endpoints and the webhooks
+response_cache = ResponseCache(
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', '30')),
+    stale_ttl=int(os.getenv('RESPONSE_CACHE_STALE_TTL', '300')),
+    max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '512'))
+)
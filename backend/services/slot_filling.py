@@ -0,0 +1,340 @@
+import os
+import re
+import threading
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from dateutil import parser as date_parser
+from services.llm_providers import llm_router, ProviderError
+from services.circuit_breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# What finalize_call needs before it saves an appointment
+SLOTS = ('customer_name', 'date', 'time')
+
+BOOKING_PATTERN = re.compile(r'\b(appointments?|schedul\w*|book(ing)?|reserv\w*|slot)\b', re.I)
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+MONTH = r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+DAY = r'\d{1,2}(?:st|nd|rd|th)?'
+RELATIVE_DATE_PATTERN = re.compile(r'\b(today|tonight|tomorrow|day after tomorrow)\b', re.I)
+WEEKDAY_PATTERN = re.compile(rf"\b({'|'.join(WEEKDAYS)})\b", re.I)
+EXPLICIT_DATE_PATTERN = re.compile(
+    rf'\b(?:\d{{4}}-\d{{2}}-\d{{2}}|\d{{1,2}}/\d{{1,2}}(?:/\d{{2,4}})?|{MONTH}\s+{DAY}(?:,?\s+\d{{4}})?|{DAY}\s+(?:of\s+)?{MONTH}(?:,?\s+\d{{4}})?)\b',
+    re.I
+)
+ORDINAL_DAY_PATTERN = re.compile(r'\bthe\s+(\d{1,2})(?:st|nd|rd|th)\b', re.I)
+
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9,
+    'ten': 10, 'eleven': 11, 'twelve': 12,
+}
+MINUTE_WORDS = {'oh five': 5, 'ten': 10, 'fifteen': 15, 'twenty': 20, 'thirty': 30, 'forty': 40, 'forty five': 45, 'fifty': 50}
+# Digits, relative days and times of day, never part of a name
+TIME_WORD_PATTERN = re.compile(
+    r"\d|\b(?:today|tonight|tomorrow|week|weekend|morning|afternoon|evening|noon|midday|o'?clock)\b", re.I
+)
+# Names too (April, June, May), so only held against a name we guessed
+CALENDAR_WORD_PATTERN = re.compile(rf"(?:{'|'.join(WEEKDAYS)}|{MONTH})", re.I)
+
+# "my name is ..." is trusted in any case, "this is ..." only when the transcript capitalized a name
+STRONG_NAME_PATTERN = re.compile(r"(?i:\b(?:my name is|my name's|name's|call me)\s+)([a-z][\w'-]*(?:\s+[a-z][\w'-]*){0,2})", re.I)
+WEAK_NAME_PATTERN = re.compile(r"(?i:\b(?:this is|i am|i'm|it's)\s+)([A-Z][\w'-]*(?:\s+[A-Z][\w'-]*){0,2})")
+NOT_NAME_WORDS = {
+    'a', 'about', 'actually', 'again', 'alright', 'an', 'and', 'at', 'available', 'but', 'calling', 'cool', 'fine',
+    'for', 'free', 'from', 'going', 'good', 'great', 'hello', 'here', 'hey', 'hi', 'hoping', 'i', 'interested', 'it',
+    'just', 'looking', 'maybe', 'new', 'next', 'no', 'not', 'ok', 'okay', 'on', 'perfect', 'please', 'right', 'so',
+    'sorry', 'sounds', 'speaking', 'sure', 'thank', 'thanks', 'that', 'the', 'this', 'to', 'trying', 'uh', 'um',
+    'well', 'wondering', 'with', 'works', 'yeah', 'yep', 'yes', 'half', 'past', 'quarter', 'oh',
+} | set(NUMBER_WORDS) | {word for words in MINUTE_WORDS for word in words.split()}
+NAME_PROMPT_PATTERN = re.compile(r'\bname\b', re.I)
+
+HOUR = rf"\d{{1,2}}|{'|'.join(NUMBER_WORDS)}"
+MINUTES = rf"\d{{2}}|{'|'.join(sorted((word.replace(' ', '[ -]') for word in MINUTE_WORDS), key=len, reverse=True))}"
+TIME_PATTERN = re.compile(
+    rf"\b(?:(at|around|about|by)\s+)?(?:(half past|quarter past|quarter to)\s+)?({HOUR})(?:\b|(?=[ap]\.?m\b))"
+    rf"(?:(:|\s)({MINUTES})\b)?\s*(o'?\s?clock\b|[ap]\.?\s?m\b\.?)?",
+    re.I
+)
+NOON_PATTERN = re.compile(r'\b(noon|midday)\b', re.I)
+MORNING_PATTERN = re.compile(r'\bmorning\b', re.I)
+AFTERNOON_PATTERN = re.compile(r'\b(afternoon|evening|tonight)\b', re.I)
+
+# Something in the utterance looks like a name, date or time that the patterns above missed
+SLOT_HINT_PATTERN = re.compile(
+    rf"\d|\b(name|{'|'.join(WEEKDAYS)}|{MONTH}|week|weekend|morning|afternoon|evening|noon|o'?clock|half|quarter)\b", re.I
+)
+SLOT_PROMPT_PATTERN = re.compile(r'\b(name|date|day|time|when)\b', re.I)
+
+EXTRACT_FUNCTION = {
+    'name': 'record_appointment_details',
+    'description': 'Record appointment details the caller gave in their last message.',
+    'parameters': {
+        'type': 'object',
+        'properties': {
+            'customer_name': {'type': 'string', 'description': "The caller's full name, if given"},
+            'date': {'type': 'string', 'description': 'Appointment date as YYYY-MM-DD, if given'},
+            'time': {'type': 'string', 'description': 'Appointment time as 24-hour HH:MM, if given'},
+        },
+    },
+}
+
+def parse_name(text, last_prompt=None):
+    """
+    The caller's name from an introduction, or from a short answer right after we asked for it.
+    Returns (name, source): 'stated' for "my name is ...", 'guessed' for "this is ..." and bare
+    answers, which a stated or LLM-extracted name may replace later. (None, None) if there is none.
+    """
+    match = STRONG_NAME_PATTERN.search(text)
+    source = 'stated'
+    if not match:
+        match = WEAK_NAME_PATTERN.search(text)
+        source = 'guessed'
+    if match:
+        candidate = match.group(1)
+        if source == 'guessed':
+            # "This is October 5th" introduces a date, not October
+            dates = [date.start() for date in EXPLICIT_DATE_PATTERN.finditer(text) if date.start() >= match.start(1)]
+            if dates:
+                candidate = text[match.start(1):min(dates[0], match.end(1))]
+    elif last_prompt and NAME_PROMPT_PATTERN.search(last_prompt):
+        candidate = text.strip().rstrip('.!')
+        # "Tuesday works", "tomorrow at 3", "half past ten" answer a different question
+        if parse_date(candidate) or parse_time(candidate) or TIME_WORD_PATTERN.search(candidate):
+            return None, None
+        if not re.fullmatch(r"[A-Za-z][\w'-]*(?:\s+[A-Za-z][\w'-]*){0,2}", candidate):
+            return None, None
+    else:
+        return None, None
+
+    words = []
+    for word in candidate.split():
+        if word.lower() in NOT_NAME_WORDS or TIME_WORD_PATTERN.search(word):
+            break
+        # After "my name is" a June or an April is a name, in a guess it is more likely the date
+        if source == 'guessed' and WEEKDAY_PATTERN.fullmatch(word):
+            break
+        words.append(word)
+    if source == 'guessed' and len(words) == 1 and CALENDAR_WORD_PATTERN.fullmatch(words[0]):
+        return None, None
+    name = ' '.join(word[0].upper() + word[1:] for word in words)
+    return (name, source) if name else (None, None)
+
+
+def merge_extracted(details, extracted):
+    """Fill the gaps in details with slots the LLM extracted, a guessed name gives way to the LLM's"""
+    for slot, value in extracted.items():
+        replaceable = slot == 'customer_name' and details.get('customer_name_source') == 'guessed'
+        if replaceable or not details.get(slot):
+            details[slot] = value
+            if slot == 'customer_name':
+                details['customer_name_source'] = 'extracted'
+    return details
+
+
+def parse_date(text, today=None):
+    """ISO date mentioned in the utterance, past dates without a year roll over to next year"""
+    today = today or datetime.now().date()
+
+    match = RELATIVE_DATE_PATTERN.search(text)
+    if match:
+        offsets = {'today': 0, 'tonight': 0, 'tomorrow': 1, 'day after tomorrow': 2}
+        return (today + timedelta(days=offsets[match.group(1).lower()])).isoformat()
+
+    match = EXPLICIT_DATE_PATTERN.search(text)
+    if match:
+        candidate = match.group(0)
+        try:
+            parsed = date_parser.parse(candidate, default=datetime.combine(today, datetime.min.time())).date()
+        except (ValueError, OverflowError):
+            parsed = None
+        if parsed:
+            if parsed < today and not re.search(r'\d{4}|/\d{2,4}$', candidate):
+                parsed = parsed.replace(year=parsed.year + 1)
+            # An appointment can't be in the past, "born on 5/12/1980" isn't one
+            if parsed >= today:
+                return parsed.isoformat()
+
+    match = WEEKDAY_PATTERN.search(text)
+    if match:
+        # The next one to come, saying "Thursday" on a Thursday means next week
+        days_ahead = (WEEKDAYS.index(match.group(1).lower()) - today.weekday()) % 7 or 7
+        return (today + timedelta(days=days_ahead)).isoformat()
+
+    match = ORDINAL_DAY_PATTERN.search(text)
+    if match:
+        day = int(match.group(1))
+        month_start = today.replace(day=1)
+        for _ in range(3):
+            try:
+                candidate = month_start.replace(day=day)
+            except ValueError:
+                candidate = None
+            if candidate and candidate >= today:
+                return candidate.isoformat()
+            month_start = (month_start + timedelta(days=32)).replace(day=1)
+
+    return None
+
+
+def parse_time(text):
+    """
+    24-hour HH:MM time mentioned in the utterance; without am/pm, 1 to 7 o'clock is taken as afternoon.
+    A bare "at 5" only counts next to a time of day or a date ("Tuesday at 5"), not in "I live at 5 Main street".
+    """
+    if NOON_PATTERN.search(text):
+        return '12:00'
+
+    in_context = bool(
+        MORNING_PATTERN.search(text) or AFTERNOON_PATTERN.search(text)
+        or RELATIVE_DATE_PATTERN.search(text) or WEEKDAY_PATTERN.search(text) or EXPLICIT_DATE_PATTERN.search(text)
+    )
+    for match in TIME_PATTERN.finditer(text):
+        preposition, relation, hour, separator, minutes, suffix = match.groups()
+        # A bare number is only a time when something marks it as one
+        bare_hour = preposition and in_context and (not hour.isdigit() or int(hour) <= 12)
+        if not (suffix or relation or separator == ':' or (preposition and minutes) or bare_hour):
+            continue
+
+        hour = int(hour) if hour.isdigit() else NUMBER_WORDS[hour.lower()]
+        if minutes is None:
+            minute = 0
+        elif minutes.isdigit():
+            minute = int(minutes)
+        else:
+            minute = MINUTE_WORDS[re.sub(r'[ -]', ' ', minutes.lower())]
+        if hour > 23 or minute > 59:
+            continue
+
+        if relation:
+            relation = relation.lower()
+            minute = 30 if relation == 'half past' else 15 if relation == 'quarter past' else 45
+            if relation == 'quarter to':
+                hour = (hour - 1) or 12
+
+        suffix = (suffix or '').lower().replace('.', '').replace(' ', '')
+        if suffix in ('am', 'pm') and hour <= 12:
+            hour = hour % 12 + (12 if suffix == 'pm' else 0)
+        elif hour < 12 and AFTERNOON_PATTERN.search(text):
+            hour += 12
+        elif 1 <= hour <= 7 and not MORNING_PATTERN.search(text):
+            # Nobody books a 3am appointment
+            hour += 12
+        return f"{hour:02d}:{minute:02d}"
+
+    return None
+
+
+def normalize_slots(values, today=None):
+    """Clean up slots the LLM returned, dropping anything that doesn't parse"""
+    slots = {}
+    name = (values.get('customer_name') or '').strip()
+    if name and len(name) <= 100:
+        slots['customer_name'] = name
+    if values.get('date'):
+        slots['date'] = parse_date(str(values['date']), today)
+    if values.get('time'):
+        time_text = str(values['time'])
+        if re.fullmatch(r'\d{1,2}:\d{2}', time_text.strip()):
+            hour, minute = (int(part) for part in time_text.strip().split(':'))
+            slots['time'] = f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else None
+        else:
+            slots['time'] = parse_time(time_text)
+    return {slot: value for slot, value in slots.items() if value}
+
+
+class SlotFiller:
+    """
+    Collects the appointment details (name, date, time) turn by turn.
+    Every utterance goes through the regex and dateutil parsers first. Only when
+    a booking is under way, slots are still missing and the parsers found nothing
+    in an utterance that looks like it carries one, the tenant's LLM is asked to
+    extract them with a function call, in the background so the turn doesn't wait.
+    """
+    def __init__(self, llm_fallback=True, max_workers=4):
+        self.llm_fallback = llm_fallback
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='slot-filling')
+        self._lock = threading.Lock()
+        self._stats = {'turns': 0, 'parsed': 0, 'llmCalls': 0, 'llmFilled': 0, 'llmFailures': 0}
+
+    def parse(self, user_input, last_prompt=None, today=None):
+        """Slots the cheap parsers find in one utterance"""
+        name, source = parse_name(user_input, last_prompt)
+        slots = {
+            'customer_name': name,
+            'customer_name_source': source,
+            'date': parse_date(user_input, today),
+            'time': parse_time(user_input),
+        }
+        return {slot: value for slot, value in slots.items() if value}
+
+    def fill(self, details, user_input, last_prompt=None, booking=False, today=None):
+        """
+        Parse one turn against the details collected so far.
+        Returns (slots found, whether the LLM should look at the turn).
+        """
+        user_input = user_input or ''
+        slots = self.parse(user_input, last_prompt, today)
+        # A guess never overwrites a name the caller stated
+        if slots.get('customer_name_source') == 'guessed' and details.get('customer_name') \
+                and details.get('customer_name_source', 'stated') != 'guessed':
+            del slots['customer_name'], slots['customer_name_source']
+        self._count('turns')
+        if slots:
+            self._count('parsed')
+
+        # Until it is confirmed, a guessed name is as good as missing to the LLM fallback
+        known = dict(details, **slots)
+        missing = [
+            slot for slot in SLOTS
+            if not known.get(slot) or (slot == 'customer_name' and known.get('customer_name_source') == 'guessed')
+        ]
+        needs_llm = bool(
+            self.llm_fallback and booking and missing and not slots
+            and (SLOT_HINT_PATTERN.search(user_input) or (last_prompt and SLOT_PROMPT_PATTERN.search(last_prompt)))
+        )
+        return slots, needs_llm
+
+    def fill_with_llm_later(self, llm_config, user_input, last_prompt, apply):
+        """Ask the LLM for the slots in a background thread, then hand them to apply(slots)"""
+        if not llm_router.is_configured(llm_config):
+            return
+        self._executor.submit(self._fill_with_llm, llm_config, user_input, last_prompt, apply)
+
+    def _fill_with_llm(self, llm_config, user_input, last_prompt, apply):
+        today = datetime.now().date()
+        messages = [
+            {'role': 'system', 'content': f"Today is {today.strftime('%A')} {today.isoformat()}. "
+                                          "Extract the appointment details the caller gives in their last message."},
+        ]
+        if last_prompt:
+            messages.append({'role': 'assistant', 'content': last_prompt})
+        messages.append({'role': 'user', 'content': user_input})
+
+        self._count('llmCalls')
+        try:
+            slots = normalize_slots(llm_router.call_function(llm_config, messages, EXTRACT_FUNCTION), today)
+        except (ProviderError, CircuitOpenError) as e:
+            self._count('llmFailures')
+            logger.warning(f"Slot extraction failed: {str(e)}")
+            return
+
+        if slots:
+            self._count('llmFilled')
+            try:
+                apply(slots)
+            except Exception as e:
+                logger.error(f"Error saving extracted slots: {str(e)}")
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+# Shared instance used by the LLM service, SLOT_FILLING_LLM=0 keeps extraction to the parsers
+slot_filler = SlotFiller(llm_fallback=os.getenv('SLOT_FILLING_LLM', '1') == '1')
@@ -0,0 +1,241 @@
+import os
+import re
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from services.call_control import CancelToken
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Where Twilio posts interim transcripts while the caller is still talking
+PARTIAL_CALLBACK_PATH = '/api/webhook/voice/partial'
+
+def normalize_text(text):
+    """Lowercase words only, so punctuation and casing differences between transcripts don't count"""
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def normalized_edit_distance(a, b):
+    """Levenshtein distance between two normalized strings divided by the longer length, 0.0 to 1.0"""
+    if a == b:
+        return 0.0
+    if not a or not b:
+        return 1.0
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1] / max(len(a), len(b))
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return max(1, round(len(text) / 4)) if text else 0
+
+
+class _Speculation:
+    def __init__(self, text):
+        self.text = text
+        self.normalized = normalize_text(text)
+        self.token = CancelToken()
+        self.done = threading.Event()
+        self.reply = None
+        self.started = time.monotonic()
+
+
+class SpeculativeGenerator:
+    """
+    Starts generating a reply from the caller's stable interim transcript before they
+    finish talking. Each new interim text restarts the countdown; once it has been
+    stable for settle_ms the reply is generated in the background. When the final
+    transcript arrives and is within max_distance (normalized edit distance) of the
+    text speculated on, the reply is used as is, so the LLM latency was hidden behind
+    the caller's end-of-speech silence. Otherwise it is thrown away.
+
+    Speculations live in this process's memory, so this assumes a single worker (or
+    routing by CallSid): the partial callbacks and the final transcript of a call must
+    reach the same process. When they don't, take() finds nothing and the reply is
+    generated the normal way, only the head start is lost.
+    """
+    def __init__(self, enabled=False, max_distance=0.1, settle_ms=250, min_words=2, max_age=60, max_workers=16):
+        self.enabled = enabled
+        self.max_distance = max_distance
+        self.settle_ms = settle_ms
+        # Too short to be worth a guess ("yes", "um")
+        self.min_words = min_words
+        # Speculations nobody collected (e.g. a call that vanished) are dropped after this long
+        self.max_age = max_age
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculation')
+        self._lock = threading.Lock()
+        # Wakes the sweeper when a new text is proposed
+        self._wake = threading.Condition(self._lock)
+        self._sweeper = None
+        self._speculations = {}  # call_sid -> _Speculation
+        self._pending = {}  # call_sid -> (text, generate, monotonic time it has settled) waiting to start
+        self._stats = {
+            'started': 0, 'hits': 0, 'misses': 0, 'abandoned': 0, 'expired': 0, 'wastedTokens': 0, 'headStartMs': 0.0
+        }
+
+    @property
+    def partial_callback(self):
+        """URL for Gather's partialResultCallback, None when speculation is off"""
+        return PARTIAL_CALLBACK_PATH if self.enabled else None
+
+    def propose(self, call_sid, stable_text, generate):
+        """
+        Interim transcript for a call. generate(call_sid, text, cancel_token) runs once the
+        text has settled, unless it matches what is already being generated.
+        """
+        if not self.enabled or not call_sid or len(normalize_text(stable_text).split()) < self.min_words:
+            return
+
+        with self._lock:
+            current = self._speculations.get(call_sid)
+            if current is not None and current.normalized == normalize_text(stable_text):
+                return
+
+            # A newer text replaces the one still settling and restarts the countdown
+            self._pending[call_sid] = (stable_text, generate, time.monotonic() + self.settle_ms / 1000.0)
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name='speculation-sweeper', daemon=True)
+                self._sweeper.start()
+            self._wake.notify()
+
+    def _sweep(self):
+        # One thread starts every settled text and drops speculations nobody collected
+        while True:
+            with self._lock:
+                while True:
+                    now = time.monotonic()
+                    settled = [call_sid for call_sid, pending in self._pending.items() if pending[2] <= now]
+                    expired = self._expire(now)
+                    if settled or expired:
+                        break
+                    if self._pending:
+                        timeout = min(pending[2] for pending in self._pending.values()) - now
+                    else:
+                        # Only the max_age check left to do, or nothing at all
+                        timeout = 1.0 if self._speculations else None
+                    self._wake.wait(timeout)
+
+                started, replaced = [], []
+                for call_sid in settled:
+                    text, generate, _ = self._pending.pop(call_sid)
+                    speculation = _Speculation(text)
+                    previous = self._speculations.get(call_sid)
+                    if previous is not None:
+                        replaced.append(previous)
+                    self._speculations[call_sid] = speculation
+                    self._stats['started'] += 1
+                    started.append((call_sid, speculation, generate))
+
+            for speculation in replaced:
+                self._waste(speculation)
+            for speculation in expired:
+                # Never collected, so it counts against the hit rate
+                self._count('expired')
+                self._count('misses')
+                self._waste(speculation)
+            for call_sid, speculation, generate in started:
+                self._executor.submit(self._run, call_sid, speculation, generate)
+
+    def _run(self, call_sid, speculation, generate):
+        try:
+            with tracer.span('speculation', call_sid=call_sid, root=True):
+                speculation.reply = generate(call_sid, speculation.text, speculation.token)
+        except Exception as e:
+            logger.error(f"Speculative generation failed for call {call_sid}: {str(e)}")
+        finally:
+            speculation.done.set()
+
+    def take(self, call_sid, final_text, cancel_token, timeout=30.0):
+        """The speculated reply if it was made from (nearly) the final transcript, else None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            self._pending.pop(call_sid, None)
+            speculation = self._speculations.pop(call_sid, None)
+        if speculation is None:
+            return None
+
+        distance = normalized_edit_distance(speculation.normalized, normalize_text(final_text))
+        if distance > self.max_distance:
+            logger.info(f"Speculation missed for call {call_sid} (distance {distance:.2f})")
+            self._count('misses')
+            self._waste(speculation)
+            return None
+
+        head_start_ms = (time.monotonic() - speculation.started) * 1000
+
+        # Wait for the rest of the generation, giving up if this turn gets preempted
+        deadline = time.monotonic() + timeout
+        while not speculation.done.wait(0.05):
+            if cancel_token.cancelled or time.monotonic() > deadline:
+                speculation.token.cancel('preempted')
+                self._count('misses')
+                return None
+
+        if speculation.reply is None:
+            # Cancelled or failed, generate the normal way
+            self._count('misses')
+            return None
+
+        with self._lock:
+            self._stats['hits'] += 1
+            self._stats['headStartMs'] += head_start_ms
+        return speculation.reply
+
+    def discard(self, call_sid):
+        """Drop any speculation for a call, e.g. once it has ended"""
+        with self._lock:
+            self._pending.pop(call_sid, None)
+            speculation = self._speculations.pop(call_sid, None)
+        if speculation is not None:
+            self._waste(speculation)
+
+    def _waste(self, speculation):
+        # Stop it if still running; a finished reply counts its tokens as wasted
+        speculation.token.cancel('discarded')
+        if speculation.done.is_set() and speculation.reply:
+            self._count('wastedTokens', estimate_tokens(speculation.reply))
+        else:
+            self._count('abandoned')
+
+    def _expire(self, now):
+        # Called with the lock held, returns the speculations it removed
+        cutoff = now - self.max_age
+        expired = [call_sid for call_sid, speculation in self._speculations.items() if speculation.started < cutoff]
+        return [self._speculations.pop(call_sid) for call_sid in expired]
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        decided = stats['hits'] + stats['misses']
+        stats['enabled'] = self.enabled
+        stats['hitRate'] = round(stats['hits'] / decided, 3) if decided else None
+        head_start_ms = stats.pop('headStartMs')
+        stats['avgHeadStartMs'] = round(head_start_ms / stats['hits'], 1) if stats['hits'] else None
+        return stats
+
+
+# Shared instance used by the voice webhooks, SPECULATION_ENABLED=1 turns it on
+speculator = SpeculativeGenerator(
+    enabled=os.getenv('SPECULATION_ENABLED', '0') == '1',
+    max_distance=float(os.getenv('SPECULATION_MAX_DISTANCE', '0.1')),
+    settle_ms=float(os.getenv('SPECULATION_SETTLE_MS', '250')),
+    min_words=int(os.getenv('SPECULATION_MIN_WORDS', '2'))
+)
@@ -0,0 +1,142 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+
+# Upper bounds (ms) of the histogram buckets reported by /api/metrics
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _NoopSpan:
+    """Returned when tracing is off so a disabled span costs one attribute check"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'call_sid', 'root', 'start')
+
+    def __init__(self, tracer, name, call_sid, root):
+        self.tracer = tracer
+        self.name = name
+        self.call_sid = call_sid
+        self.root = root
+
+    def __enter__(self):
+        if self.root:
+            self.tracer.begin_turn(self.call_sid)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        self.tracer.record(self.name, duration_ms, self.call_sid)
+        if self.root:
+            self.tracer.end_turn()
+        return False
+
+
+class Tracer:
+    """
+    Records timed spans of the voice pipeline into an in-process ring buffer.
+    Spans are keyed by call_sid and turn number; a root span (the webhook)
+    sets the key for everything timed on the same thread until it ends, and
+    the turn number is filled in once the call context has been loaded.
+    """
+    def __init__(self, enabled=True, capacity=10000):
+        self.enabled = enabled
+        self.capacity = capacity
+        self._spans = deque(maxlen=capacity)  # (timestamp, name, call_sid, turn, duration_ms)
+        self._local = threading.local()
+
+    def span(self, name, call_sid=None, root=False):
+        """Context manager timing a block; root=True starts a new turn for call_sid"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, call_sid, root)
+
+    def begin_turn(self, call_sid, turn=None):
+        self._local.call_sid = call_sid
+        self._local.turn = turn
+
+    def set_turn(self, turn):
+        """Attach the turn number to the current root span and everything under it"""
+        if self.enabled:
+            self._local.turn = turn
+
+    def end_turn(self):
+        self._local.call_sid = None
+        self._local.turn = None
+
+    def record(self, name, duration_ms, call_sid=None):
+        """Store a measured duration, e.g. a time-to-first-token taken by hand"""
+        if not self.enabled:
+            return
+        local = self._local
+        self._spans.append((
+            time.time(),
+            name,
+            call_sid or getattr(local, 'call_sid', None),
+            getattr(local, 'turn', None),
+            duration_ms
+        ))
+
+    def spans_for(self, call_sid):
+        """Every buffered span of a call, oldest first"""
+        return [
+            {'timestamp': ts, 'name': name, 'turn': turn, 'durationMs': round(duration, 3)}
+            for ts, name, sid, turn, duration in list(self._spans)
+            if sid == call_sid
+        ]
+
+    def summary(self):
+        """Per span name: count, p50/p95/p99, mean and max in ms, plus a bucketed histogram"""
+        durations = {}
+        for _, name, _, _, duration in list(self._spans):
+            durations.setdefault(name, []).append(duration)
+
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            histogram = {}
+            for bound in BUCKETS_MS:
+                histogram[f"le_{bound}"] = sum(1 for value in values if value <= bound)
+            histogram['le_inf'] = len(values)
+
+            summary[name] = {
+                'count': len(values),
+                'p50': round(percentile(values, 50), 3),
+                'p95': round(percentile(values, 95), 3),
+                'p99': round(percentile(values, 99), 3),
+                'mean': round(sum(values) / len(values), 3),
+                'max': round(values[-1], 3),
+                'histogram': histogram
+            }
+        return summary
+
+    def clear(self):
+        self._spans.clear()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# Shared tracer for the whole process, TRACING_ENABLED=0 turns every span into a no-op
+tracer = Tracer(
+    enabled=os.getenv('TRACING_ENABLED', '1') != '0',
+    capacity=int(os.getenv('TRACING_BUFFER_SIZE', '10000'))
+)
@@ -0,0 +1,68 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+
+logger = logging.getLogger(__name__)
+
+class RebasedHttpClient(TwilioHttpClient):
+    """Sends every Twilio API request to another host, e.g. a local stub during load tests"""
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        url = self.base_url + parts.path + (f"?{parts.query}" if parts.query else '')
+        return super().request(method, url, *args, **kwargs)
+
+
+class TwilioClientCache:
+    """
+    One twilio.rest.Client per (account_sid, auth_token), all sharing a single
+    pooled HTTP session so connection and TLS setup are paid once per process
+    instead of once per request.
+    """
+    def __init__(self, max_entries=128, timeout=None, api_base=None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()  # (account_sid, auth_token) -> Client
+        if api_base:
+            self.http_client = RebasedHttpClient(api_base, pool_connections=True, timeout=timeout)
+        else:
+            self.http_client = TwilioHttpClient(pool_connections=True, timeout=timeout)
+
+    def get(self, account_sid, auth_token):
+        """Cached client for the credentials, built on first use"""
+        key = (account_sid, auth_token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = Client(account_sid, auth_token, http_client=self.http_client)
+            self._clients[key] = client
+            while len(self._clients) > self.max_entries:
+                self._clients.popitem(last=False)
+
+        logger.info(f"Created Twilio client for account {account_sid}")
+        return client
+
+    def forget(self, account_sid=None):
+        """Drop the clients of an account (every account when None) so they are rebuilt on next use"""
+        with self._lock:
+            for key in list(self._clients):
+                if account_sid is None or key[0] == account_sid:
+                    del self._clients[key]
+
+
+# Shared instance used wherever a Twilio client is needed
+twilio_clients = TwilioClientCache(
+    max_entries=int(os.getenv('TWILIO_CLIENT_CACHE_SIZE', '128')),
+    timeout=float(os.getenv('TWILIO_HTTP_TIMEOUT', '30')),
+    api_base=os.getenv('TWILIO_API_BASE')
+)
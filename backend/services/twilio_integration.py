@@ -1,9 +1,11 @@
 # twilio_integration.py
 from flask import Blueprint, jsonify, current_app, request
-from twilio.rest import Client
+from services.twilio_clients import twilio_clients
 import os
 from datetime import datetime, timedelta
 import logging
+from services.fanout import fan_out
+from services.response_cache import response_cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,6 +14,9 @@ logger = logging.getLogger(__name__)
 # Blueprint for Twilio routes
 twilio_bp = Blueprint('twilio', __name__, url_prefix='/api/twilio')
 
+# Seconds the stats endpoint waits for Twilio before answering with what it has
+STATS_DEADLINE = float(os.environ.get('TWILIO_STATS_DEADLINE', '5'))
+
 def get_twilio_client():
     """Get a Twilio client instance using environment variables or config."""
     account_sid = os.environ.get('TWILIO_ACCOUNT_SID') or current_app.config.get('TWILIO_ACCOUNT_SID')
@@ -20,9 +25,10 @@ def get_twilio_client():
     if not account_sid or not auth_token:
         raise ValueError("Twilio credentials not found")
     
-    return Client(account_sid, auth_token)
+    return twilio_clients.get(account_sid, auth_token)
 
 @twilio_bp.route('/stats/<user_id>', methods=['GET'])
+@response_cache.cached('stats')
 def get_twilio_stats(user_id):
     """Get Twilio statistics for dashboard."""
     try:
@@ -33,22 +39,25 @@ def get_twilio_stats(user_id):
         yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
         month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
         
-        # Fetch calls from today
-        today_calls = client.calls.list(
-            start_time_after=datetime.fromisoformat(today),
-            limit=100
-        )
-        calls_today = len(today_calls)
+        # Fetch today's calls, this month's calls, recent calls and phone numbers in parallel
+        results, errors = fan_out({
+            'today': lambda: client.calls.list(
+                start_time_after=datetime.fromisoformat(today),
+                limit=100
+            ),
+            'month': lambda: client.calls.list(
+                start_time_after=datetime.fromisoformat(month_start),
+                limit=1000  # Adjust as needed
+            ),
+            'recent': lambda: client.calls.list(limit=5),
+            'phone_numbers': lambda: client.incoming_phone_numbers.list(limit=20)
+        }, timeout=STATS_DEADLINE)
         
-        # Fetch calls from this month
-        month_calls = client.calls.list(
-            start_time_after=datetime.fromisoformat(month_start),
-            limit=1000  # Adjust as needed
-        )
-        calls_this_month = len(month_calls)
+        calls_today = len(results.get('today', []))
+        calls_this_month = len(results.get('month', []))
         
         # Get recent calls (last 5)
-        recent_calls = client.calls.list(limit=5)
+        recent_calls = results.get('recent', [])
         formatted_recent_calls = []
         
         for call in recent_calls:
@@ -68,22 +77,23 @@ def get_twilio_stats(user_id):
         # In a real implementation, this would be stored in a config table
         # Here we'll mock this data
         
-        # Get recordings
+        # Get recordings for the first two calls, also in parallel
+        recording_results, recording_errors = fan_out({
+            call.sid: (lambda sid=call.sid: client.recordings.list(call_sid=sid))
+            for call in recent_calls[:2]
+        }, timeout=STATS_DEADLINE)
+        
         recordings = []
-        for call in recent_calls[:2]:  # Get recordings for first two calls
-            try:
-                call_recordings = client.recordings.list(call_sid=call.sid)
-                for recording in call_recordings:
-                    recordings.append({
-                        'sid': recording.sid,
-                        'duration': recording.duration,
-                        'url': f"https://api.twilio.com/2010-04-01/Accounts/{client.account_sid}/Recordings/{recording.sid}.mp3"
-                    })
-            except Exception as e:
-                logger.error(f"Error fetching recordings for call {call.sid}: {str(e)}")
+        for call in recent_calls[:2]:
+            for recording in recording_results.get(call.sid, []):
+                recordings.append({
+                    'sid': recording.sid,
+                    'duration': recording.duration,
+                    'url': f"https://api.twilio.com/2010-04-01/Accounts/{client.account_sid}/Recordings/{recording.sid}.mp3"
+                })
         
         # Check if any phone numbers are configured
-        phone_numbers = client.incoming_phone_numbers.list(limit=20)
+        phone_numbers = results.get('phone_numbers', [])
         
         # Generate response
         response = {
@@ -102,7 +112,8 @@ def get_twilio_stats(user_id):
             },
             'recentAppointments': [],  # Mock data
             'knowledgeBaseCount': 1,  # Mock data
-            'scriptCount': 1  # Mock data
+            'scriptCount': 1,  # Mock data
+            'partial': bool(errors or recording_errors)  # Some lookups failed or timed out
         }
         
         return jsonify(response), 200
@@ -1,14 +1,17 @@
 # twilio_routes.py - Complete implementation with recording access
-from flask import Blueprint, jsonify, current_app, request, Response
-from twilio.rest import Client
+from flask import Blueprint, jsonify, request, send_file
+from services.twilio_clients import twilio_clients
 import os
 from datetime import datetime, timedelta
 import logging
-import requests
-from requests.auth import HTTPBasicAuth
-import base64
-from werkzeug.exceptions import BadRequest
-from flask import stream_with_context
+from services.call_sync import call_sync
+from services.recording_resolver import recording_resolver
+from services.recording_index import recording_index
+from services.fanout import fan_out
+from services.daily_stats import daily_stats
+from services.response_cache import response_cache
+from services.recording_cache import recording_cache, UpstreamError
+from services.webhook_inbox import webhook_inbox
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +20,15 @@ logger = logging.getLogger(__name__)
 # Create blueprint for Twilio routes
 twilio_bp = Blueprint('twilio', __name__, url_prefix='/api')
 
+# Seconds the dashboard waits for Twilio before answering with what it has
+DASHBOARD_DEADLINE = float(os.environ.get('TWILIO_DASHBOARD_DEADLINE', '5'))
+
+# Call-log page size when the client doesn't ask for one
+CALL_LOG_PAGE_SIZE = int(os.environ.get('CALL_LOG_PAGE_SIZE', '50'))
+
+# How long browsers may keep a recording before revalidating it
+RECORDING_MAX_AGE = int(os.environ.get('RECORDING_MAX_AGE', '86400'))
+
 def get_twilio_client():
     """Get a Twilio client instance using environment variables."""
     try:
@@ -27,7 +39,7 @@ def get_twilio_client():
             logger.error("Twilio credentials not found in environment variables")
             return None
         
-        return Client(account_sid, auth_token)
+        return twilio_clients.get(account_sid, auth_token)
     except Exception as e:
         logger.error(f"Error creating Twilio client: {str(e)}")
         return None
@@ -40,6 +52,7 @@ def get_twilio_credentials():
 
 # Route to replace the dashboard/summary endpoint
 @twilio_bp.route('/dashboard/summary', methods=['GET'])
+@response_cache.cached('dashboard')
 def get_dashboard_summary():
     """
     Get dashboard summary using Twilio data instead of database.
@@ -63,63 +76,48 @@ def get_dashboard_summary():
         today_start = datetime.combine(now.date(), datetime.min.time())
         month_start = datetime(now.year, now.month, 1)
         
-        # Fetch calls from today
-        try:
-            today_calls = client.calls.list(
-                start_time_after=today_start,
-                limit=100
-            )
-            calls_today = len(today_calls)
-        except Exception as e:
-            logger.error(f"Error fetching today's calls: {str(e)}")
-            calls_today = 0
-        
-        # Fetch calls from this month
-        try:
-            month_calls = client.calls.list(
-                start_time_after=month_start,
-                limit=500  # Adjust as needed
-            )
-            calls_this_month = len(month_calls)
-        except Exception as e:
-            logger.error(f"Error fetching month's calls: {str(e)}")
-            calls_this_month = 0
+        # Counters come from local aggregates instead of listing calls just to count them
+        if user_id:
+            stats = daily_stats.summary(user_id, today, month_start.strftime('%Y-%m-%d'))
+            calls_today = stats['calls_today']
+            calls_this_month = stats['calls_this_month']
+        else:
+            stats = None
+            call_sync.ensure_synced(client)
+            calls_today, calls_this_month = call_sync.count_calls(today_start, month_start)
+        
+        # Fetch recent calls and phone numbers in parallel
+        results, errors = fan_out({
+            'recent': lambda: client.calls.list(limit=5),
+            'phone_numbers': lambda: client.incoming_phone_numbers.list(limit=5)
+        }, timeout=DASHBOARD_DEADLINE)
         
         # Get recent calls (last 5)
-        try:
-            recent_calls = client.calls.list(limit=5)
-            formatted_recent_calls = []
-            
-            for call in recent_calls:
-                formatted_recent_calls.append({
-                    'id': call.sid,
-                    'fromNumber': call.from_formatted,  # Fixed: Using from_formatted instead of from_
-                    'toNumber': call.to_formatted,      # Fixed: Using to_formatted instead of to
-                    'duration': int(call.duration) if call.duration else 0,
-                    'startedAt': call.start_time.isoformat() if call.start_time else None,
-                    'outcome': call.status
-                })
-        except Exception as e:
-            logger.error(f"Error fetching recent calls: {str(e)}")
-            formatted_recent_calls = []
+        formatted_recent_calls = []
+        for call in results.get('recent', []):
+            formatted_recent_calls.append({
+                'id': call.sid,
+                'fromNumber': call.from_formatted,  # Fixed: Using from_formatted instead of from_
+                'toNumber': call.to_formatted,      # Fixed: Using to_formatted instead of to
+                'duration': int(call.duration) if call.duration else 0,
+                'startedAt': call.start_time.isoformat() if call.start_time else None,
+                'outcome': call.status
+            })
         
         # Check if we have Twilio phone numbers configured
-        try:
-            phone_numbers = client.incoming_phone_numbers.list(limit=5)
-            twilio_configured = len(phone_numbers) > 0
-        except Exception as e:
-            logger.error(f"Error checking phone numbers: {str(e)}")
-            twilio_configured = False
+        twilio_configured = len(results.get('phone_numbers', [])) > 0
         
         # For other configurations, use mock data for now
         # In a real implementation, you would check these configs from a config table or API
         llm_configured = True
         deepgram_configured = True
         
-        # Mock appointment data
+        # Appointment counters from the rollup when we know whose dashboard this is
+        appointments_today = stats['appointments_today'] if stats else 1
+        upcoming_appointments = stats['upcoming_appointments'] if stats else 3
+        
+        # Mock appointment list
         # In a real implementation, you would get this from your appointments system
-        appointments_today = 1
-        upcoming_appointments = 3
         recent_appointments = [
             {
                 'id': 'apt-1',
@@ -214,38 +212,73 @@ def get_mock_dashboard_data(user_id):
 
 @twilio_bp.route('/webhook/recording-status', methods=['POST'])
 def recording_status_webhook():
-    """Handle recording status callback from Twilio"""
+    """Acknowledge a recording status callback from Twilio and queue it for processing"""
     try:
-        # Extract data from the request
-        call_sid = request.form.get('CallSid')
         recording_sid = request.form.get('RecordingSid')
-        recording_url = request.form.get('RecordingUrl')
         recording_status = request.form.get('RecordingStatus')
         
-        logger.info(f"Recording status update: {recording_status} for call {call_sid}")
+        if not recording_sid or not recording_status or not request.form.get('CallSid'):
+            return jsonify({"error": "CallSid, RecordingSid and RecordingStatus are required"}), 400
         
-        # Store the recording info or update status as needed
-        if recording_status == 'completed':
-            # This is when the recording is ready to be accessed
-            logger.info(f"Recording {recording_sid} for call {call_sid} is now ready")
+        logger.info(f"Recording status update: {recording_status} for call {request.form.get('CallSid')}")
         
-        # Always return a success response to Twilio
+        # Retried deliveries of the same recording status share a key and are dropped
+        webhook_inbox.enqueue(
+            'recording-status',
+            f"recording:{recording_sid}:{recording_status}",
+            request.form.to_dict(),
+            ordering_key=recording_sid
+        )
         return '', 204
         
     except Exception as e:
-        logger.error(f"Error handling recording status: {str(e)}")
+        # Nothing was stored, let Twilio retry
+        logger.error(f"Error queueing recording status: {str(e)}")
         return '', 500
+
+def process_recording_status(form):
+    """Apply a queued recording status callback"""
+    call_sid = form.get('CallSid')
+    recording_sid = form.get('RecordingSid')
+    
+    # Store the recording info or update status as needed
+    if form.get('RecordingStatus') == 'completed':
+        # This is when the recording is ready to be accessed
+        logger.info(f"Recording {recording_sid} for call {call_sid} is now ready")
+        duration = form.get('RecordingDuration')
+        recording_index.record_recording(
+            call_sid,
+            recording_sid,
+            recording_url=form.get('RecordingUrl'),
+            duration=int(duration) if duration else None,
+            channels=form.get('RecordingChannels')
+        )
+        recording_resolver.invalidate(form.get('AccountSid'))
+        response_cache.invalidate('call-logs')
+
+webhook_inbox.register('recording-status', process_recording_status)
     
 # Updated call logs endpoint that uses query parameters
 @twilio_bp.route('/call-logs/<user_id>', methods=['GET'])
+@response_cache.cached('call-logs')
 def get_call_logs(user_id):
-    """Get call logs from Twilio."""
+    """
+    Get one page of call logs from the local mirror of the Twilio call list.
+    Filters run in SQL; the cursor for the next page comes back in X-Next-Cursor.
+    """
     try:
-        # Get query parameters for filters
+        # Get query parameters for filters and paging
         start_date = request.args.get('startDate')
         end_date = request.args.get('endDate')
         status = request.args.get('status')
+        direction = request.args.get('direction')
         phone_number = request.args.get('phoneNumber')
+        cursor = request.args.get('cursor')
+        
+        try:
+            limit = int(request.args.get('limit', CALL_LOG_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"error": "limit must be a number"}), 400
         
         # Get Twilio client
         client = get_twilio_client()
@@ -254,16 +287,22 @@ def get_call_logs(user_id):
             logger.warning("Twilio client not available. Using mock call logs.")
             return jsonify(get_mock_call_logs()), 200
         
-        # Set up query parameters for Twilio
-        twilio_params = {
-            'limit': 200  # We'll fetch a good amount and handle filtering ourselves
+        # Fill the mirror on first use, after that the background sync keeps it current
+        call_sync.ensure_synced(client)
+        
+        # Set up the local query
+        query_params = {
+            'limit': limit,
+            'cursor': cursor,
+            'status': status,
+            'direction': direction,
+            'number_prefix': phone_number
         }
         
         # Add date filters if provided
         if start_date:
             try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-                twilio_params['start_time_after'] = start_date_obj
+                query_params['start_date'] = datetime.strptime(start_date, '%Y-%m-%d')
             except ValueError:
                 logger.error(f"Invalid start date format: {start_date}")
         
@@ -271,65 +310,65 @@ def get_call_logs(user_id):
             try:
                 end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
                 # Add one day to include the entire end date
-                end_date_obj = end_date_obj + timedelta(days=1)
-                twilio_params['start_time_before'] = end_date_obj
+                query_params['end_date'] = end_date_obj + timedelta(days=1)
             except ValueError:
                 logger.error(f"Invalid end date format: {end_date}")
         
-        # Fetch calls from Twilio
-        calls = client.calls.list(**twilio_params)
-        
-        # Format and filter calls
-        formatted_calls = []
-        for call in calls:
-            # Apply status filter if provided
-            if status and call.status.lower() != status.lower():
-                continue
-                
-            # Apply phone number filter if provided
-            # Fixed: Using from_formatted and to_formatted instead of from_ and to
-            if phone_number and (
-                (hasattr(call, 'from_formatted') and phone_number not in call.from_formatted) and 
-                (hasattr(call, 'to_formatted') and phone_number not in call.to_formatted)
-            ):
-                continue
-                
-            # Check for recordings
-            has_recordings = False
-            try:
-                recordings = client.recordings.list(call_sid=call.sid)
-                has_recordings = len(recordings) > 0
-            except Exception as e:
-                logger.error(f"Error checking recordings for call {call.sid}: {str(e)}")
-            
-            # Safely access attributes with error handling
-            # Create formatted call object that matches your component's expectations
-            formatted_call = {
-                'id': call.sid,
-                'callSid': call.sid,
-                'fromNumber': call.from_formatted if hasattr(call, 'from_formatted') else call.from_ if hasattr(call, 'from_') else "Unknown",
-                'toNumber': call.to_formatted if hasattr(call, 'to_formatted') else call.to if hasattr(call, 'to') else "Unknown",
-                'duration': int(call.duration) if call.duration else 0,
-                'status': call.status,
-                'direction': call.direction,
-                'startedAt': call.start_time.isoformat() if call.start_time else None,
-                'created_at': call.date_created.isoformat() if call.date_created else None,
-                'endedAt': call.end_time.isoformat() if call.end_time else None,
-                'recordingCount': len(recordings) if 'recordings' in locals() else 0,
-                'hasRecordings': has_recordings,
-                'hasTranscript': has_recordings  # Assuming if there are recordings, transcripts might be available
-            }
-            formatted_calls.append(formatted_call)
+        # Read one page of calls from the local mirror
+        try:
+            calls, next_cursor = call_sync.page_calls(**query_params)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Recording counts for the page come from the local index only, kept current by the
+        # recording webhooks and the background sync, so the cost stays bounded by the page size
+        recording_counts = recording_index.counts_for_calls([call['call_sid'] for call in calls])
+        
+        formatted_calls = format_call_logs(calls, recording_counts)
         
         # Return formatted calls as a direct array (NOT inside an object)
         # This matches the format your existing component expects
-        return jsonify(formatted_calls), 200
+        response = jsonify(formatted_calls)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
         
     except Exception as e:
         logger.error(f"Error fetching call logs: {str(e)}")
         # Return mock data on error
         return jsonify(get_mock_call_logs()), 200
 
+def format_call_logs(calls, recording_counts):
+    """Shape mirrored call rows the way the call log component expects"""
+    formatted_calls = []
+    for call in calls:
+        from_number = call['from_formatted'] or call['from_number'] or "Unknown"
+        to_number = call['to_formatted'] or call['to_number'] or "Unknown"
+            
+        # Check for recordings
+        recording_count = recording_counts.get(call['call_sid'], 0)
+        has_recordings = recording_count > 0
+        
+        # Create formatted call object that matches your component's expectations
+        formatted_call = {
+            'id': call['call_sid'],
+            'callSid': call['call_sid'],
+            'fromNumber': from_number,
+            'toNumber': to_number,
+            'duration': call['duration'] or 0,
+            'status': call['status'],
+            'direction': call['direction'],
+            'startedAt': call['start_time'],
+            'created_at': call['date_created'],
+            'endedAt': call['end_time'],
+            'recordingCount': recording_count,
+            'hasRecordings': has_recordings,
+            'hasTranscript': has_recordings  # Assuming if there are recordings, transcripts might be available
+        }
+        formatted_calls.append(formatted_call)
+    
+    return formatted_calls
+
 def get_mock_call_logs():
     """Generate mock call logs when Twilio is not available."""
     now = datetime.now()
@@ -419,7 +458,7 @@ def get_call_transcript_direct(call_sid):
 # Updated endpoint for call recordings
 @twilio_bp.route('/call-recordings/<call_sid>', methods=['GET'])
 def get_call_recordings(call_sid):
-    """Get recordings for a specific call."""
+    """Get recordings for a specific call from the local recording index."""
     try:
         # Get Twilio client
         client = get_twilio_client()
@@ -429,51 +468,21 @@ def get_call_recordings(call_sid):
             logger.warning("Twilio client not available. Using mock recordings.")
             return jsonify(get_mock_recordings(call_sid)), 200
         
-        # Fetch recordings for the call
-        recordings = client.recordings.list(call_sid=call_sid)
+        # Read recordings locally, Twilio is only asked if we have nothing for this call
+        recordings = recording_index.recordings_with_fallback(client, call_sid)
         
         # Format recording data to match your component's expectations
         formatted_recordings = []
         for recording in recordings:
-            # Use our proxy endpoint instead of direct Twilio URL
-            recording_url = f"/api/recordings/{recording.sid}"
-            
-            # Check if there's a transcription for this recording
-            transcription_text = None
-            try:
-                # Get all transcriptions without filtering parameters
-                all_transcriptions = client.transcriptions.list()
-                
-                # Filter the list manually to find ones for this recording
-                recording_transcriptions = [t for t in all_transcriptions 
-                                           if hasattr(t, 'recording_sid') and t.recording_sid == recording.sid]
-                
-                if recording_transcriptions and len(recording_transcriptions) > 0:
-                    # Get the transcription text via API
-                    transcription = recording_transcriptions[0]
-                    transcription_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Transcriptions/{transcription.sid}.txt"
-                    
-                    # Make authenticated request to get transcription text
-                    auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
-                    response = requests.get(
-                        transcription_url, 
-                        auth=HTTPBasicAuth(account_sid, auth_token)
-                    )
-                    
-                    if response.status_code == 200:
-                        transcription_text = response.text
-            except Exception as e:
-                logger.error(f"Error fetching transcription for recording {recording.sid}: {str(e)}")
-            
             formatted_recordings.append({
-                'recording_sid': recording.sid,
-                'id': recording.sid,
-                'call_sid': recording.call_sid,
-                'duration': int(recording.duration) if recording.duration else 0,
-                'channels': recording.channels,
-                'date_created': recording.date_created.isoformat() if recording.date_created else None,
-                'recording_url': recording_url,  # Use our proxy endpoint
-                'transcription': transcription_text
+                'recording_sid': recording['recording_sid'],
+                'id': recording['recording_sid'],
+                'call_sid': recording['call_sid'],
+                'duration': recording['duration'] or 0,
+                'channels': recording['channels'],
+                'date_created': recording['date_created'],
+                'recording_url': f"/api/recordings/{recording['recording_sid']}",  # Use our proxy endpoint
+                'transcription': recording['transcription']
             })
         
         return jsonify(formatted_recordings), 200
@@ -501,45 +510,45 @@ def get_mock_recordings(call_sid):
         }
     ]
 
+def send_cached_recording(recording_sid, as_attachment=False):
+    """Serve a recording from the local disk cache, fetching it from Twilio once on a miss"""
+    account_sid, auth_token = get_twilio_credentials()
+    
+    if not account_sid or not auth_token:
+        logger.error("Twilio credentials not found")
+        return "Twilio not configured", 503
+    
+    try:
+        path = recording_cache.get(recording_sid, account_sid, auth_token)
+    except ValueError as e:
+        return str(e), 400
+    except UpstreamError as e:
+        logger.error(f"Error fetching recording {recording_sid}: {e.status_code}")
+        return str(e), e.status_code
+    
+    # Recordings never change, so the SID is a strong ETag; send_file handles
+    # Range and If-None-Match and hands the file to the server's file wrapper
+    response = send_file(
+        path,
+        mimetype='audio/mpeg',
+        as_attachment=as_attachment,
+        download_name=f'recording-{recording_sid}.mp3',
+        conditional=True,
+        etag=recording_sid,
+        max_age=RECORDING_MAX_AGE
+    )
+    
+    # Call audio is private to the account, keep it out of shared caches
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 # Critical endpoint for accessing recordings - make sure this works correctly
 @twilio_bp.route('/recordings/<recording_sid>', methods=['GET'])
 def get_recording(recording_sid):
     """Proxy for Twilio recordings to avoid exposing auth to frontend"""
     try:
-        # Initialize Twilio client
-        account_sid, auth_token = get_twilio_credentials()
-        
-        if not account_sid or not auth_token:
-            logger.error("Twilio credentials not found")
-            return "Twilio not configured", 503
-        
-        # Stream the recording from Twilio
-        recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}.mp3"
-        
-        # Make request to Twilio with auth
-        response = requests.get(
-            recording_url, 
-            auth=(account_sid, auth_token),
-            stream=True
-        )
-        
-        if not response.ok:
-            logger.error(f"Error fetching recording {recording_sid}: {response.status_code}")
-            return f"Error fetching recording: {response.status_code}", response.status_code
-        
-        # Stream the response to the client
-        def generate():
-            for chunk in response.iter_content(chunk_size=4096):
-                yield chunk
-                
-        return Response(
-            stream_with_context(generate()),
-            content_type='audio/mpeg',
-            headers={
-                'Content-Disposition': f'attachment; filename=recording-{recording_sid}.mp3'
-            }
-        )
-        
+        return send_cached_recording(recording_sid, as_attachment=True)
     except Exception as e:
         logger.error(f"Error accessing recording {recording_sid}: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -552,37 +561,7 @@ def get_recording_audio(recording_sid):
     This prevents exposing your Twilio credentials in the frontend.
     """
     try:
-        account_sid, auth_token = get_twilio_credentials()
-        
-        if not account_sid or not auth_token:
-            logger.error("Twilio credentials not found")
-            return "Twilio not configured", 503
-        
-        # Construct the URL to the recording
-        recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Recordings/{recording_sid}.mp3"
-        
-        # Request the recording from Twilio with authentication
-        recording_response = requests.get(
-            recording_url,
-            auth=HTTPBasicAuth(account_sid, auth_token),
-            stream=True
-        )
-        
-        if not recording_response.ok:
-            logger.error(f"Error fetching recording {recording_sid}: {recording_response.status_code}")
-            return f"Error fetching recording: {recording_response.status_code}", recording_response.status_code
-            
-        # Stream the response back to the client
-        return Response(
-            stream_with_context(recording_response.iter_content(chunk_size=1024)),
-            content_type=recording_response.headers.get('Content-Type', 'audio/mpeg'),
-            headers={
-                'Cache-Control': 'no-cache, no-store, must-revalidate',
-                'Pragma': 'no-cache',
-                'Expires': '0'
-            }
-        )
-        
+        return send_cached_recording(recording_sid)
     except Exception as e:
         logger.error(f"Error accessing recording {recording_sid}: {str(e)}")
         return f"Error accessing recording: {str(e)}", 500
@@ -603,8 +582,8 @@ def get_call_transcript(call_sid):
             logger.warning("Twilio client not available. Using mock transcript.")
             return jsonify(get_mock_transcript(call_sid)), 200
         
-        # Get recordings for this call
-        recordings = client.recordings.list(call_sid=call_sid)
+        # Make sure the call's recordings and transcriptions are indexed locally
+        recordings = recording_index.recordings_with_fallback(client, call_sid)
         
         if not recordings:
             return jsonify({
@@ -613,44 +592,14 @@ def get_call_transcript(call_sid):
                 'transcript_parts': []
             }), 200
         
-        # Get transcriptions for all recordings
-        full_transcript = ""
+        # Build the transcript from the local transcriptions
         transcript_parts = []
-        
-        for recording in recordings:
-            try:
-                # Get all transcriptions
-                all_transcriptions = client.transcriptions.list()
-                
-                # Filter for transcriptions related to this recording
-                recording_transcriptions = [t for t in all_transcriptions 
-                                           if hasattr(t, 'recording_sid') and t.recording_sid == recording.sid]
-                
-                for transcription in recording_transcriptions:
-                    # Get the transcription text
-                    transcription_url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Transcriptions/{transcription.sid}.txt"
-                    
-                    # Make authenticated request to get transcription text
-                    response = requests.get(
-                        transcription_url, 
-                        auth=HTTPBasicAuth(account_sid, auth_token)
-                    )
-                    
-                    if response.status_code == 200:
-                        transcript_text = response.text
-                        
-                        # Add to full transcript
-                        full_transcript += transcript_text + " "
-                        
-                        # Add as a segment
-                        transcript_parts.append({
-                            'text': transcript_text,
-                            'timestamp': transcription.date_created.isoformat() if transcription.date_created else datetime.now().isoformat(),
-                            'speaker': 'unknown'  # Twilio doesn't provide speaker diarization
-                        })
-            except Exception as e:
-                logger.error(f"Error processing transcription for recording {recording.sid}: {str(e)}")
-                continue
+        for transcription in recording_index.transcriptions_for_call(call_sid):
+            transcript_parts.append({
+                'text': transcription['transcription_text'],
+                'timestamp': transcription['date_created'] or datetime.now().isoformat(),
+                'speaker': 'unknown'  # Twilio doesn't provide speaker diarization
+            })
         
         # If we couldn't get any transcripts, return empty response
         if not transcript_parts:
@@ -661,6 +610,8 @@ def get_call_transcript(call_sid):
                 'transcript_parts': []
             }), 200
         
+        full_transcript = " ".join(part['text'] for part in transcript_parts)
+        
         # Return in format expected by frontend
         return jsonify({
             'callSid': call_sid,
@@ -1,17 +1,20 @@
 from twilio.twiml.voice_response import VoiceResponse, Gather
-from twilio.rest import Client
+from services.twilio_clients import twilio_clients
+from services.twiml_templates import twiml_templates
 import os
 import json
 import sqlite3
 import logging
+from services.fanout import fan_out
+from services.speculation import speculator
 
 class TwilioService:
     def __init__(self):
         self.client = None
     
     def get_client(self, account_sid, auth_token):
-        """Initialize Twilio client with the provided credentials"""
-        return Client(account_sid, auth_token)
+        """Get the cached Twilio client for the provided credentials"""
+        return twilio_clients.get(account_sid, auth_token)
     
     def get_user_twilio_config(self, user_id):
         """Get Twilio configuration for a user"""
@@ -57,15 +60,29 @@ class TwilioService:
             script_content = json.loads(script['script_content'])
             greeting = script_content.get('outboundGreeting', greeting)
         
-        # Generate the TwiML response
-        return self.generate_twiml_response(greeting)
+        # Generate the TwiML response, starting the media stream for the call
+        return self.generate_twiml_response(greeting, start_stream=True)
     
-    def generate_twiml_response(self, message, gather_speech=True):
+    def generate_twiml_response(self, message, gather_speech=True, speech_timeout='auto', start_stream=False):
         """Generate TwiML response for Twilio with transcription enabled"""
+        # Fork the caller's audio to the server-side VAD so it can detect barge-in
+        stream_url = os.getenv('MEDIA_STREAM_URL') if start_stream else None
+        partial_url = speculator.partial_callback
+        
+        # Only the message changes between turns, so render from a precompiled template
+        return twiml_templates.render(
+            ('reply', gather_speech, speech_timeout, stream_url, partial_url),
+            lambda text: self.build_twiml_response(text, gather_speech, speech_timeout, stream_url, partial_url),
+            message
+        )
+    
+    def build_twiml_response(self, message, gather_speech=True, speech_timeout='auto', stream_url=None, partial_url=None):
+        """Build the TwiML for generate_twiml_response with VoiceResponse"""
         response = VoiceResponse()
         
-        # Add the spoken message
-        response.say(message)
+        if stream_url:
+            start = response.start()
+            start.stream(url=stream_url, track='inbound_track')
         
         # If we want to gather the caller's response
         if gather_speech:
@@ -75,10 +92,15 @@ class TwilioService:
                 action='/api/webhook/voice',  # Should match your Flask route
                 status_callback="https://c4c8-2402-3a80-4671-b63-a07b-70c0-da66-95e8.ngrok-free.app/api/webhook/recording-status",
                 method='POST',
-                speechTimeout=5,  # Use a fixed value instead of 'auto'
+                speechTimeout=speech_timeout,  # 'auto' lets Twilio end the turn as soon as the caller stops
                 speechModel='phone_call',
-                enhanced=True
+                enhanced=True,
+                partialResultCallback=partial_url  # Interim transcripts for speculative replies
             )
+            
+            # Say the message inside the gather so the caller can talk over it
+            if message:
+                gather.say(message)
             response.append(gather)
             
             # Add recording with transcription enabled
@@ -96,6 +118,10 @@ class TwilioService:
             response.say("I didn't receive any input. Goodbye.")
             response.hangup()
         else:
+            # Add the spoken message
+            if message:
+                response.say(message)
+            
             # If we don't want to gather speech (e.g., ending the call)
             response.hangup()
                 
@@ -117,8 +143,8 @@ class TwilioService:
             script_content = json.loads(script['script_content'])
             greeting = script_content.get('greeting', greeting)
         
-        # Generate the TwiML response
-        return self.generate_twiml_response(greeting)
+        # Generate the TwiML response, starting the media stream for the call
+        return self.generate_twiml_response(greeting, start_stream=True)
     
     def send_sms_confirmation(self, user_id, to_number, message):
         """Send an SMS confirmation for scheduled appointments"""
@@ -158,19 +184,20 @@ class TwilioService:
             # Fetch recordings for the call
             recordings = client.recordings.list(call_sid=call_sid)
             
+            # Look up every recording's transcription in parallel
+            transcriptions, _ = fan_out({
+                recording.sid: (lambda sid=recording.sid: client.recordings(sid).transcriptions.list(limit=1))
+                for recording in recordings
+            })
+            
             # Format the recordings data
             formatted_recordings = []
             for recording in recordings:
-                # Get the transcription if available
-                transcriptions = client.transcriptions.list(recording_sid=recording.sid)
+                # Get the most recent transcription if available
                 transcription_text = ""
-                
-                if transcriptions:
-                    # Get the most recent transcription
-                    transcription = transcriptions[0]
-                    # Fetch the full transcription text
-                    transcription_obj = client.transcriptions(transcription.sid).fetch()
-                    transcription_text = transcription_obj.transcription_text
+                recording_transcriptions = transcriptions.get(recording.sid)
+                if recording_transcriptions:
+                    transcription_text = recording_transcriptions[0].transcription_text
                 
                 # Format the recording URL
                 recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{twilio_config.get('accountSid')}/Recordings/{recording.sid}.mp3"
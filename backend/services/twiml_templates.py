@@ -0,0 +1,71 @@
+import threading
+import logging
+from services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the spoken text while a template is compiled; plain ASCII so
+# the XML serializer leaves it untouched
+PLACEHOLDER = 'TWIML-TEXT-PLACEHOLDER-5b1e0c'
+
+def escape_text(text):
+    """Escape element text exactly like ElementTree, which is what VoiceResponse serializes with"""
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+class TwimlTemplates:
+    """
+    Precompiled TwiML documents whose only moving part is the spoken text.
+    Each variant is rendered once through its VoiceResponse builder with a
+    placeholder, split around it, and afterwards a turn is two string
+    concatenations. The builder stays the single source of truth, so the
+    output is byte-identical to calling it directly.
+    """
+    def __init__(self, max_variants=256):
+        self.max_variants = max_variants
+        self._lock = threading.Lock()
+        self._templates = {}  # (variant, has_text) -> (head, tail) or the full document
+
+    def render(self, variant, build, text=None):
+        """
+        TwiML for `variant` saying `text`.
+        `build(text)` must return the VoiceResponse XML for that text, leaving the
+        text out when it is empty; `variant` must capture everything else it depends on.
+        """
+        with tracer.span('twiml.render'):
+            key = (variant, bool(text))
+            template = self._templates.get(key)
+            if template is None:
+                template = self._compile(key, build, text)
+
+            if isinstance(template, str):
+                return template
+            return template[0] + escape_text(text) + template[1]
+
+    def _compile(self, key, build, text):
+        if not text:
+            # Nothing to substitute, the whole document is constant
+            template = build(text)
+        else:
+            head, found, tail = build(PLACEHOLDER).partition(PLACEHOLDER)
+            if not found:
+                raise ValueError(f"TwiML builder for {key[0]} doesn't include the text")
+            template = (head, tail)
+
+        with self._lock:
+            if len(self._templates) >= self.max_variants:
+                self._templates.clear()
+            self._templates[key] = template
+
+        logger.debug(f"Compiled TwiML template {key}")
+        return template
+
+
+# Shared instance used by the voice webhooks
+twiml_templates = TwimlTemplates()
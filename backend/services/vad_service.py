@@ -0,0 +1,204 @@
+import base64
+import logging
+import math
+
+from services.call_control import call_interrupts
+
+logger = logging.getLogger(__name__)
+
+# Twilio media streams deliver 8 kHz mu-law audio in 20 ms frames
+SAMPLE_RATE = 8000
+FRAME_MS = 20
+
+
+def _mulaw_to_linear(byte):
+    """Decode a single G.711 mu-law byte to a 16-bit PCM sample"""
+    u = ~byte & 0xFF
+    sign = u & 0x80
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    sample = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return -sample if sign else sample
+
+MULAW_DECODE_TABLE = [_mulaw_to_linear(b) for b in range(256)]
+
+
+def decode_mulaw(data):
+    """Decode mu-law bytes to a list of PCM samples"""
+    table = MULAW_DECODE_TABLE
+    return [table[b] for b in data]
+
+
+def encode_mulaw(samples):
+    """Encode 16-bit PCM samples to mu-law bytes"""
+    out = bytearray(len(samples))
+    for i, sample in enumerate(samples):
+        sign = 0x80 if sample < 0 else 0
+        magnitude = min(abs(int(sample)), 32635) + 0x84
+
+        exponent = 7
+        mask = 0x4000
+        while exponent > 0 and not magnitude & mask:
+            exponent -= 1
+            mask >>= 1
+
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        out[i] = ~(sign | (exponent << 4) | mantissa) & 0xFF
+    return bytes(out)
+
+
+def frame_energy(samples):
+    """Root-mean-square energy of a frame"""
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def zero_crossing_rate(samples):
+    """Fraction of adjacent sample pairs that change sign"""
+    if len(samples) < 2:
+        return 0.0
+    crossings = 0
+    previous = samples[0]
+    for sample in samples[1:]:
+        if (previous >= 0) != (sample >= 0):
+            crossings += 1
+        previous = sample
+    return crossings / (len(samples) - 1)
+
+
+class VoiceActivityDetector:
+    """Energy / zero-crossing VAD with an adaptive noise floor and end-of-speech hangover"""
+    def __init__(self, frame_ms=FRAME_MS, energy_ratio=3.0, min_energy=300.0,
+                 zcr_range=(0.01, 0.35), onset_frames=3, default_silence_ms=700,
+                 min_silence_ms=300, max_silence_ms=1200, noise_alpha=0.05):
+        self.frame_ms = frame_ms
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.zcr_range = zcr_range
+        self.onset_frames = onset_frames
+        self.default_silence_ms = default_silence_ms
+        self.min_silence_ms = min_silence_ms
+        self.max_silence_ms = max_silence_ms
+        self.noise_alpha = noise_alpha
+
+        self.noise_floor = None
+        self.in_speech = False
+        self.utterance_ms = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self._pause_avg_ms = None
+
+    def is_speech_frame(self, samples):
+        """Classify a single frame as speech or non-speech"""
+        energy = frame_energy(samples)
+        zcr = zero_crossing_rate(samples)
+
+        if self.noise_floor is None:
+            # Assume the stream starts quiet and seed the noise floor from it
+            self.noise_floor = energy
+
+        threshold = max(self.min_energy, self.noise_floor * self.energy_ratio)
+        low, high = self.zcr_range
+        return energy > threshold and low <= zcr <= high, energy
+
+    def end_of_speech_ms(self):
+        """Silence needed to end an utterance, adapted to the caller's own pauses"""
+        if self._pause_avg_ms is None:
+            return self.default_silence_ms
+        return max(self.min_silence_ms, min(self.max_silence_ms, self._pause_avg_ms * 2))
+
+    def _track_pause(self, pause_ms):
+        # Exponential average of the short pauses a caller makes mid-utterance
+        if self._pause_avg_ms is None:
+            self._pause_avg_ms = pause_ms
+        else:
+            self._pause_avg_ms = 0.8 * self._pause_avg_ms + 0.2 * pause_ms
+
+    def process(self, samples):
+        """Feed one frame, returns 'speech_start', 'speech_end' or None"""
+        speech, energy = self.is_speech_frame(samples)
+
+        if not self.in_speech:
+            if speech:
+                self._speech_run += 1
+                if self._speech_run >= self.onset_frames:
+                    self.in_speech = True
+                    self.utterance_ms = self._speech_run * self.frame_ms
+                    self._silence_run = 0
+                    return 'speech_start'
+            else:
+                self._speech_run = 0
+                # Only adapt the noise floor while nobody is talking
+                self.noise_floor += self.noise_alpha * (energy - self.noise_floor)
+            return None
+
+        self.utterance_ms += self.frame_ms
+
+        if speech:
+            if self._silence_run:
+                self._track_pause(self._silence_run * self.frame_ms)
+            self._silence_run = 0
+            return None
+
+        self._silence_run += 1
+        if self._silence_run * self.frame_ms >= self.end_of_speech_ms():
+            self.in_speech = False
+            self._speech_run = 0
+            self._silence_run = 0
+            return 'speech_end'
+        return None
+
+
+class MediaStreamSession:
+    """
+    Runs the VAD over a Twilio media stream and triggers barge-in on caller speech.
+    Only the start of speech is acted on; when the caller's turn ends is still up to
+    the Gather's speechTimeout='auto'.
+    """
+    def __init__(self, detector=None, on_speech_start=None):
+        self.detector = detector or VoiceActivityDetector()
+        self.on_speech_start = on_speech_start or self._barge_in
+        self.call_sid = None
+        self.stream_sid = None
+        self.frame_size = SAMPLE_RATE * self.detector.frame_ms // 1000
+        self._pending = []
+
+    def _barge_in(self, call_sid):
+        # Caller started talking, stop whatever the AI is still preparing to say
+        call_interrupts.interrupt(call_sid, reason='barge-in')
+
+    def handle_message(self, message):
+        """Process one decoded JSON message from the media stream websocket"""
+        event = message.get('event')
+
+        if event == 'start':
+            start = message.get('start', {})
+            self.call_sid = start.get('callSid')
+            self.stream_sid = message.get('streamSid') or start.get('streamSid')
+            logger.info(f"Media stream {self.stream_sid} started for call {self.call_sid}")
+        elif event == 'media':
+            payload = message.get('media', {}).get('payload', '')
+            self.feed(decode_mulaw(base64.b64decode(payload)))
+        elif event == 'stop':
+            logger.info(f"Media stream {self.stream_sid} stopped for call {self.call_sid}")
+
+        return event
+
+    def feed(self, samples):
+        """Feed PCM samples of any length, returns the VAD events they produced"""
+        events = []
+        self._pending.extend(samples)
+
+        while len(self._pending) >= self.frame_size:
+            frame = self._pending[:self.frame_size]
+            del self._pending[:self.frame_size]
+
+            event = self.detector.process(frame)
+            if event == 'speech_start':
+                self.on_speech_start(self.call_sid)
+            if event:
+                events.append(event)
+
+        return events
+
@@ -0,0 +1,177 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Events a consumer may take: due (new, retry backoff over, or abandoned by a dead consumer)
+# and not behind an earlier event of the same ordering key that is still in play
+CLAIMABLE = """
+    (
+        (event.status = 'pending' AND (event.next_attempt_at IS NULL OR event.next_attempt_at <= :now))
+        OR (event.status = 'processing' AND event.claimed_at < :stale)
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM webhook_inbox AS earlier
+        WHERE earlier.ordering_key = event.ordering_key AND earlier.id < event.id
+        AND (earlier.status = 'processing' OR (earlier.status = 'pending' AND earlier.next_attempt_at > :now))
+    )
+"""
+
+class WebhookInbox:
+    """
+    Durable queue for Twilio webhooks.
+    Handlers store the payload under an idempotency key and acknowledge Twilio
+    straight away; a background consumer applies events in batches. A retried
+    delivery maps to the same key and is dropped, so nothing is applied twice.
+    Events sharing an ordering key (e.g. one call's status callbacks) are applied
+    strictly in arrival order: while one is waiting for a retry the ones after it
+    are held back. Retries back off exponentially; once an event has failed for
+    good the events after it are applied without it.
+    """
+    def __init__(self, db_path='voiceai.db', batch_size=100, max_attempts=5, claim_timeout=300, retention_days=7,
+                 retry_delay=5, max_retry_delay=300):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # Give up on an event after this many failed attempts
+        self.max_attempts = max_attempts
+        # Seconds before the first retry, doubling per attempt up to max_retry_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Claimed events not finished within this many seconds are handed out again
+        self.claim_timeout = claim_timeout
+        # Processed and failed events are kept this long so late retries are still recognised
+        self.retention_days = retention_days
+        self.handlers = {}  # kind -> callable(payload)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def register(self, kind, handler):
+        """Set the function that applies events of a kind, it receives the payload dict"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, idempotency_key, payload, ordering_key=None):
+        """Store an event, returns False if one with the same key was already received"""
+        conn = self._connect()
+        with conn:
+            inserted = conn.execute(
+                """
+                INSERT OR IGNORE INTO webhook_inbox
+                (kind, idempotency_key, ordering_key, payload, status, attempts, received_at)
+                VALUES (?, ?, ?, ?, 'pending', 0, ?)
+                """,
+                (kind, idempotency_key, ordering_key, json.dumps(payload), datetime.now().isoformat())
+            ).rowcount
+        conn.close()
+
+        if not inserted:
+            logger.info(f"Dropped duplicate webhook {idempotency_key}")
+        return bool(inserted)
+
+    def _claim(self, conn):
+        # Tag a batch with a claim id so concurrent consumers never share events
+        now = datetime.now()
+        params = {
+            'claim': uuid.uuid4().hex,
+            'now': now.isoformat(),
+            'stale': (now - timedelta(seconds=self.claim_timeout)).isoformat(),
+            'limit': self.batch_size,
+        }
+
+        # The consumer polls constantly, only take the write lock when there is something to claim
+        if not conn.execute(f'SELECT 1 FROM webhook_inbox AS event WHERE {CLAIMABLE} LIMIT 1', params).fetchone():
+            return []
+
+        with conn:
+            conn.execute(
+                f"""
+                UPDATE webhook_inbox SET status = 'processing', claim = :claim, claimed_at = :now
+                WHERE id IN (SELECT id FROM webhook_inbox AS event WHERE {CLAIMABLE} ORDER BY id LIMIT :limit)
+                """,
+                params
+            )
+        return conn.execute('SELECT * FROM webhook_inbox WHERE claim = ? ORDER BY id', (params['claim'],)).fetchall()
+
+    def process_batch(self):
+        """Apply one batch of pending events in arrival order, returns how many were handled"""
+        conn = self._connect()
+        events = self._claim(conn)
+        held = set()  # ordering keys with an event in this batch that wasn't applied
+
+        for event in events:
+            if event['ordering_key'] is not None and event['ordering_key'] in held:
+                # Hand it back untouched, it goes after the earlier event is retried
+                with conn:
+                    conn.execute(
+                        "UPDATE webhook_inbox SET status = 'pending', claim = NULL WHERE id = ?", (event['id'],)
+                    )
+                continue
+
+            handler = self.handlers.get(event['kind'])
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for webhook kind {event['kind']}")
+                handler(json.loads(event['payload']))
+                status, error = 'done', None
+                next_attempt = None
+            except Exception as e:
+                logger.error(f"Error processing webhook {event['idempotency_key']}: {str(e)}")
+                error = str(e)
+                if event['attempts'] + 1 >= self.max_attempts:
+                    status, next_attempt = 'failed', None
+                    if event['ordering_key'] is not None:
+                        logger.warning(f"Webhook {event['idempotency_key']} failed for good, "
+                                       f"later events for {event['ordering_key']} are applied without it")
+                else:
+                    # Back off so a transient error (a locked database) has time to clear
+                    delay = min(self.retry_delay * (2 ** event['attempts']), self.max_retry_delay)
+                    status, next_attempt = 'pending', (datetime.now() + timedelta(seconds=delay)).isoformat()
+                    if event['ordering_key'] is not None:
+                        held.add(event['ordering_key'])
+
+            with conn:
+                conn.execute(
+                    """
+                    UPDATE webhook_inbox
+                    SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = ?, processed_at = ?, claim = NULL
+                    WHERE id = ?
+                    """,
+                    (status, error, next_attempt, datetime.now().isoformat(), event['id'])
+                )
+
+        conn.close()
+        return len(events)
+
+    def drain(self):
+        """Process batches until the inbox is empty"""
+        total = 0
+        while True:
+            handled = self.process_batch()
+            if not handled:
+                return total
+            total += handled
+
+    def purge(self):
+        """Forget processed and failed events past the retention window"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM webhook_inbox WHERE status IN ('done', 'failed') AND processed_at < ?", (cutoff,)
+            ).rowcount
+        conn.close()
+        return deleted
+
+
+# Shared instance used by the webhook routes and the consumer task
+webhook_inbox = WebhookInbox(
+    batch_size=int(os.getenv('WEBHOOK_BATCH_SIZE', '100')),
+    max_attempts=int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '5')),
+    retry_delay=float(os.getenv('WEBHOOK_RETRY_DELAY', '5'))
+)
@@ -0,0 +1,44 @@
+"""Synthetic audio for exercising the VAD without real calls"""
+import base64
+import math
+import random
+
+from services.vad_service import SAMPLE_RATE, FRAME_MS, encode_mulaw
+
+
+def synthesize_pcm(segments, sample_rate=SAMPLE_RATE, seed=0):
+    """
+    Build PCM audio from (kind, duration_ms) segments.
+    kind is 'silence' (faint noise), 'noise' (loud broadband noise) or 'speech' (voiced harmonics).
+    """
+    rng = random.Random(seed)
+    samples = []
+    for kind, duration_ms in segments:
+        count = sample_rate * duration_ms // 1000
+        for i in range(count):
+            t = i / sample_rate
+            if kind == 'speech':
+                # 140 Hz fundamental with a couple of harmonics and a syllable-rate envelope
+                envelope = 0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)
+                value = 6000 * envelope * (
+                    math.sin(2 * math.pi * 140 * t)
+                    + 0.5 * math.sin(2 * math.pi * 280 * t)
+                    + 0.25 * math.sin(2 * math.pi * 420 * t)
+                )
+            elif kind == 'noise':
+                value = rng.uniform(-4000, 4000)
+            else:
+                value = rng.uniform(-40, 40)
+            samples.append(int(value))
+    return samples
+
+
+def media_messages(samples, call_sid='CA00000000000000000000000000000000', stream_sid='MZ0'):
+    """Wrap PCM samples as the start/media/stop messages Twilio sends over the websocket"""
+    messages = [{'event': 'start', 'streamSid': stream_sid, 'start': {'callSid': call_sid, 'streamSid': stream_sid}}]
+    frame_size = SAMPLE_RATE * FRAME_MS // 1000
+    for offset in range(0, len(samples), frame_size):
+        payload = base64.b64encode(encode_mulaw(samples[offset:offset + frame_size])).decode('ascii')
+        messages.append({'event': 'media', 'streamSid': stream_sid, 'media': {'payload': payload}})
+    messages.append({'event': 'stop', 'streamSid': stream_sid})
+    return messages
@@ -0,0 +1,22 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Tests import the backend the way app.py does, as top-level `services`
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture
+def voiceai_db(tmp_path, monkeypatch):
+    """Run the test in an empty directory holding a fresh voiceai.db, as the services expect"""
+    monkeypatch.chdir(tmp_path)
+    with open(os.path.join(BACKEND_DIR, 'schema.sql')) as f:
+        schema = f.read()
+    conn = sqlite3.connect('voiceai.db')
+    conn.executescript(schema)
+    conn.close()
+    return tmp_path / 'voiceai.db'
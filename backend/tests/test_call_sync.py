@@ -0,0 +1,66 @@
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from services.call_sync import TwilioCallSync, to_utc_iso
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    """Server local time five hours behind UTC"""
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def rest_call(sid, date_created, status='completed'):
+    """A call the way the Twilio client returns it, with tz-aware UTC datetimes"""
+    return SimpleNamespace(
+        sid=sid, account_sid='AC1', from_='+15550000001', to='+15550000002', direction='inbound',
+        status=status, duration='30', price=None, start_time=date_created, end_time=date_created,
+        date_created=date_created
+    )
+
+
+class StubClient:
+    def __init__(self, calls):
+        self.calls = SimpleNamespace(list=lambda **kwargs: calls)
+
+
+def test_to_utc_iso_treats_naive_datetimes_as_local(new_york):
+    assert to_utc_iso(datetime(2026, 1, 15, 0, 0)) == '2026-01-15T05:00:00+00:00'
+    assert to_utc_iso(datetime(2026, 1, 15, 3, 0, tzinfo=timezone.utc)) == '2026-01-15T03:00:00+00:00'
+
+
+def test_date_filters_compare_in_utc(voiceai_db, new_york):
+    sync = TwilioCallSync()
+    # 03:00 UTC on the 15th is still the 14th in New York
+    sync.sync(StubClient([
+        rest_call('CA_late_14th', datetime(2026, 1, 15, 3, 0, tzinfo=timezone.utc)),
+        rest_call('CA_morning_15th', datetime(2026, 1, 15, 14, 0, tzinfo=timezone.utc)),
+    ]))
+
+    local_day_start = datetime(2026, 1, 15)
+    calls, _ = sync.page_calls(start_date=local_day_start)
+    assert [call['call_sid'] for call in calls] == ['CA_morning_15th']
+
+    calls, _ = sync.page_calls(end_date=local_day_start)
+    assert [call['call_sid'] for call in calls] == ['CA_late_14th']
+
+    assert sync.count_calls(local_day_start, datetime(2026, 1, 1)) == (1, 2)
+
+
+def test_sync_replaces_callback_date_created(voiceai_db):
+    sync = TwilioCallSync()
+    sync.apply_status_callback({
+        'CallSid': 'CA1', 'CallStatus': 'completed', 'Timestamp': 'Mon, 19 Oct 2026 10:05:00 +0000'
+    })
+    assert sync.page_calls()[0][0]['date_created'] == '2026-10-19T10:05:00+00:00'
+
+    sync.sync(StubClient([rest_call('CA1', datetime(2026, 10, 19, 10, 0, tzinfo=timezone.utc))]))
+
+    assert sync.page_calls()[0][0]['date_created'] == '2026-10-19T10:00:00+00:00'
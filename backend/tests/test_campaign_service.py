@@ -0,0 +1,103 @@
+import json
+import sqlite3
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from services.campaign_service import CampaignDialer
+
+
+class StubTwilioClient:
+    """Records the calls a dialer places instead of talking to Twilio"""
+    def __init__(self):
+        self.placed = []
+        self._sids = itertools.count(1)
+        self.calls = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        call = SimpleNamespace(sid=f"CA{next(self._sids):032d}", **kwargs)
+        self.placed.append(call)
+        return call
+
+
+@pytest.fixture
+def client(voiceai_db):
+    conn = sqlite3.connect(voiceai_db)
+    with conn:
+        conn.execute(
+            'INSERT INTO user_config (user_id, twilio_config) VALUES (?, ?)',
+            ('user-1', json.dumps({'accountSid': 'AC1', 'authToken': 'token', 'phoneNumber': '+15550000000'}))
+        )
+    conn.close()
+    return StubTwilioClient()
+
+
+def dialer_for(client):
+    return CampaignDialer(client_factory=lambda twilio_config: client)
+
+
+def start_campaign(dialer, count, **kwargs):
+    numbers = [f"+1555100{i:04d}" for i in range(count)]
+    campaign_id = dialer.create_campaign('user-1', 'Test', numbers, 'https://example.com/', **kwargs)
+    dialer.set_status(campaign_id, 'running')
+    return campaign_id
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'calls_per_second': 0},
+    {'calls_per_second': -1},
+    {'max_concurrent': 0},
+    {'max_attempts': 0},
+])
+def test_create_campaign_rejects_non_positive_budgets(voiceai_db, kwargs):
+    with pytest.raises(ValueError):
+        CampaignDialer().create_campaign('user-1', 'Test', ['+15551000000'], 'https://example.com', **kwargs)
+
+
+def test_concurrency_cap_holds_across_dialer_processes(client):
+    # Two dialers stand in for the scheduler running in two workers
+    first, second = dialer_for(client), dialer_for(client)
+    start_campaign(first, 10, max_concurrent=3, calls_per_second=100)
+
+    assert first.tick() + second.tick() + first.tick() == 3
+    assert len(client.placed) == 3
+
+    # A finished call frees a slot for whichever worker ticks next
+    first.handle_status(client.placed[0].sid, 'completed')
+    assert second.tick() == 1
+    assert first.tick() == 0
+
+
+def test_calls_per_second_is_shared_across_dialer_processes(client):
+    first, second = dialer_for(client), dialer_for(client)
+    start_campaign(first, 10, max_concurrent=10, calls_per_second=2)
+
+    # One second's worth of budget between them, not per worker
+    assert first.tick() == 2
+    assert second.tick() == 0
+    assert len(client.placed) == 2
+
+
+def test_busy_numbers_are_retried_with_backoff_then_fail(client, voiceai_db):
+    dialer = dialer_for(client)
+    campaign_id = start_campaign(dialer, 1, max_attempts=2, retry_delay=60)
+
+    assert dialer.tick() == 1
+    dialer.handle_status(client.placed[-1].sid, 'busy')
+    assert dialer.progress(campaign_id)['counts'] == {'retry': 1}
+    # Not due again until the backoff has passed
+    assert dialer.tick() == 0
+
+    conn = sqlite3.connect(voiceai_db)
+    with conn:
+        conn.execute("UPDATE campaign_numbers SET next_attempt_at = '2000-01-01T00:00:00'")
+        conn.execute('DELETE FROM campaign_pacing')
+    conn.close()
+
+    assert dialer.tick() == 1
+    dialer.handle_status(client.placed[-1].sid, 'no-answer')
+    assert dialer.progress(campaign_id)['counts'] == {'failed': 1}
+
+    dialer.tick()
+    assert dialer.progress(campaign_id)['status'] == 'completed'
@@ -0,0 +1,15 @@
+from services.llm_providers import LLMRouter, migrate_legacy_config
+
+
+def test_legacy_openai_configs_move_back_to_groq():
+    migrated = migrate_legacy_config({'provider': 'openai', 'model': 'gpt-3.5-turbo', 'apiKey': 'gsk_tenant'})
+    assert migrated == {'provider': 'groq', 'model': 'llama3-8b-8192', 'apiKey': 'gsk_tenant'}
+
+    # Deliberately pointed at an endpoint, or already on another provider
+    assert migrate_legacy_config({'provider': 'openai', 'baseUrl': 'https://llm.example.com/v1'}) is None
+    assert migrate_legacy_config({'provider': 'sutra', 'model': 'sutra-v2'}) is None
+
+
+def test_unsupported_provider_falls_back_with_the_tenants_key():
+    provider, model = LLMRouter().resolve({'provider': 'anthropic', 'model': 'claude-3-haiku', 'apiKey': 'gsk_tenant'})
+    assert (provider.name, provider.api_key, model) == ('groq', 'gsk_tenant', 'llama3-8b-8192')
@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+from services.call_state_store import VersionConflict
+from services.llm_service import LLMService
+
+
+def count(query):
+    conn = sqlite3.connect('voiceai.db')
+    value = conn.execute(query).fetchone()[0]
+    conn.close()
+    return value
+
+
+def start_booked_call(service, call_sid):
+    service.initialize_call_context(call_sid, 'user-1', '+15550000001')
+
+    def book(state):
+        state['context']['has_appointment'] = True
+        state['context']['appointment_details'] = {'customer_name': 'Alex Morgan', 'date': '2026-10-22', 'time': '15:00'}
+
+    service._apply_to_call(call_sid, book)
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_finalize_call_archives_once(voiceai_db, backend):
+    from services.call_state_store import create_call_state_store
+    service = LLMService(call_states=create_call_state_store(backend))
+    start_booked_call(service, 'CA1')
+
+    assert service.finalize_call('CA1', duration=30) is True
+    assert service.finalize_call('CA1', duration=30) is False
+
+    assert count('SELECT COUNT(*) FROM appointments') == 1
+    assert count('SELECT COUNT(*) FROM call_logs') == 1
+    assert count('SELECT SUM(calls) FROM daily_stats') == 1
+    assert count('SELECT SUM(completed_calls) FROM daily_stats') == 1
+    assert count('SELECT SUM(appointments) FROM daily_stats') == 1
+
+
+def test_finalizer_with_stale_context_does_not_archive_again(voiceai_db, monkeypatch):
+    # Two workers (say the sweeper and the status callback) both read the call before either deletes it
+    from services.call_state_store import create_call_state_store
+    first, second = (LLMService(call_states=create_call_state_store('sqlite')) for _ in range(2))
+    start_booked_call(first, 'CA2')
+    stale = second.get_call_context('CA2')
+    monkeypatch.setattr(second, 'get_call_context', lambda call_sid: stale)
+
+    assert first.finalize_call('CA2', duration=10) is True
+    assert second.finalize_call('CA2', duration=10) is False
+
+    assert count('SELECT COUNT(*) FROM appointments') == 1
+    assert count('SELECT SUM(completed_calls) FROM daily_stats') == 1
+
+
+def test_turn_survives_persistent_version_conflicts(voiceai_db, monkeypatch):
+    service = LLMService()
+    service.initialize_call_context('CA3', 'user-1', '+15550000001')
+    monkeypatch.setattr(service, '_generate_response', lambda context, user_input, cancel_token: 'Sure thing.')
+
+    def always_conflict(call_sid, state, expected_version):
+        raise VersionConflict(call_sid)
+
+    monkeypatch.setattr(service.call_states, 'save', always_conflict)
+
+    assert service.process_user_input('CA3', 'Hello there') == 'Sure thing.'
+
+
+def test_speculation_does_not_keep_error_replies(voiceai_db, monkeypatch):
+    from services.call_control import CancelToken
+    from services.llm_providers import ProviderError
+    from services.llm_service import llm_router
+    service = LLMService()
+    service.initialize_call_context('CA4', 'user-1', '+15550000001')
+
+    # Not configured: the real turn says so, a speculation has nothing to offer
+    monkeypatch.setattr(llm_router, 'is_configured', lambda llm_config: False)
+    assert service._speculate('CA4', 'I need an appointment', CancelToken()) is None
+
+    def provider_down(*args, **kwargs):
+        raise ProviderError('groq', 'unavailable', 503)
+
+    monkeypatch.setattr(llm_router, 'is_configured', lambda llm_config: True)
+    monkeypatch.setattr(llm_router, 'complete', provider_down)
+    assert service._speculate('CA4', 'I need an appointment', CancelToken()) is None
+    assert service._generate_response(service.get_call_context('CA4'), 'Hello', CancelToken()).startswith("I'm sorry")
@@ -0,0 +1,20 @@
+import sqlite3
+
+from services.phone_routes import PhoneRouteTable
+
+
+def test_lookup_between_write_and_commit_does_not_keep_old_route(voiceai_db):
+    routes = PhoneRouteTable()
+    routes.set_user_numbers('old-owner', ['+1 (800) 555-0000'])
+    assert routes.lookup('+18005550000') == 'old-owner'
+
+    conn = sqlite3.connect('voiceai.db')
+    routes.set_user_numbers('new-owner', ['+18005550000'], conn=conn)
+    # A call rings before the config save commits, it still sees (and caches) the old owner
+    assert routes.lookup('+18005550000') == 'old-owner'
+    conn.commit()
+    conn.close()
+    routes.invalidate()
+
+    assert routes.lookup('+18005550000') == 'new-owner'
+
@@ -0,0 +1,39 @@
+import pytest
+import requests
+
+from services import recording_cache as recording_cache_module
+from services.recording_cache import RecordingCache, UpstreamError
+
+RECORDING_SID = 'RE' + 'a' * 32
+
+
+def test_network_errors_surface_as_upstream_errors(tmp_path, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError('connection refused')
+
+    monkeypatch.setattr(recording_cache_module.requests, 'get', unreachable)
+    cache = RecordingCache(directory=str(tmp_path))
+
+    with pytest.raises(UpstreamError) as raised:
+        cache.get(RECORDING_SID, 'AC1', 'token')
+    assert raised.value.status_code == 502
+
+
+def test_dropped_download_leaves_no_partial_file(tmp_path, monkeypatch):
+    class DroppedResponse:
+        ok = True
+        status_code = 200
+
+        def iter_content(self, chunk_size):
+            yield b'ID3'
+            raise requests.exceptions.ChunkedEncodingError('connection reset')
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(recording_cache_module.requests, 'get', lambda *args, **kwargs: DroppedResponse())
+    cache = RecordingCache(directory=str(tmp_path))
+
+    with pytest.raises(UpstreamError):
+        cache.get(RECORDING_SID, 'AC1', 'token')
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,94 @@
+from datetime import date
+
+import pytest
+
+from services.slot_filling import SlotFiller, merge_extracted, parse_date, parse_name, parse_time
+
+TODAY = date(2026, 10, 19)
+NAME_PROMPT = 'Sure, can I get your name please?'
+
+
+@pytest.mark.parametrize('text, last_prompt', [
+    ("It's Tuesday at 3.", None),
+    ('This is October 5th', None),
+    ("I'm Ok with 2 pm", None),
+    ('Sounds good', NAME_PROMPT),
+    ('Tuesday works', NAME_PROMPT),
+    ('tomorrow morning', NAME_PROMPT),
+    ('half past ten', 'May I have your name?'),
+    ("It's May", None),
+])
+def test_dates_and_filler_words_are_not_names(text, last_prompt):
+    assert parse_name(text, last_prompt) == (None, None)
+
+
+@pytest.mark.parametrize('text, last_prompt, expected', [
+    ('My name is alex morgan', None, ('Alex Morgan', 'stated')),
+    ('Hi, this is Alex Morgan calling', None, ('Alex Morgan', 'guessed')),
+    ('alex morgan', NAME_PROMPT, ('Alex Morgan', 'guessed')),
+    # Month names are names too once the caller said so, or when followed by a surname
+    ('My name is Jan Kowalski', None, ('Jan Kowalski', 'stated')),
+    ('my name is June Carter', None, ('June Carter', 'stated')),
+    ('Hi this is April Jones', None, ('April Jones', 'guessed')),
+    ('April Jones', NAME_PROMPT, ('April Jones', 'guessed')),
+])
+def test_names(text, last_prompt, expected):
+    assert parse_name(text, last_prompt) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('I live at 5 Main street', None),
+    ("It's Tuesday at 3.", '15:00'),
+    ('tomorrow at 10', '10:00'),
+    ('at 9 in the morning', '09:00'),
+    ("at 4 o'clock", '16:00'),
+    ('at 2 pm', '14:00'),
+    ('at 10:30', '10:30'),
+])
+def test_bare_at_hour_needs_a_time_of_day_or_a_date(text, expected):
+    assert parse_time(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('I was born on 5/12/1980', None),
+    ('2026-10-01', None),
+    ('October 5th', '2027-10-05'),
+    ('October 25th, 2026', '2026-10-25'),
+])
+def test_appointment_dates_are_never_in_the_past(text, expected):
+    assert parse_date(text, TODAY) == expected
+
+
+def test_stated_name_replaces_a_guess_but_not_the_other_way_round():
+    filler = SlotFiller(llm_fallback=False)
+    details = {}
+
+    slots, _ = filler.fill(details, "Hi, it's Sam", booking=True, today=TODAY)
+    details.update(slots)
+    assert details == {'customer_name': 'Sam', 'customer_name_source': 'guessed'}
+
+    slots, _ = filler.fill(details, 'My name is Samantha Lee', booking=True, today=TODAY)
+    details.update(slots)
+    assert details['customer_name'] == 'Samantha Lee'
+
+    slots, _ = filler.fill(details, "I'm Happy to wait", booking=True, today=TODAY)
+    assert 'customer_name' not in slots
+
+
+def test_llm_extraction_replaces_only_a_guessed_name():
+    guessed = {'customer_name': 'Sam', 'customer_name_source': 'guessed', 'date': '2026-10-20'}
+    merge_extracted(guessed, {'customer_name': 'Samantha Lee', 'date': '2026-10-21', 'time': '15:00'})
+    assert guessed == {
+        'customer_name': 'Samantha Lee', 'customer_name_source': 'extracted', 'date': '2026-10-20', 'time': '15:00'
+    }
+
+    stated = {'customer_name': 'Samantha Lee', 'customer_name_source': 'stated'}
+    merge_extracted(stated, {'customer_name': 'Sam'})
+    assert stated['customer_name'] == 'Samantha Lee'
+
+
+def test_guessed_name_still_lets_the_llm_look():
+    filler = SlotFiller(llm_fallback=True)
+    details = {'customer_name': 'Sam', 'customer_name_source': 'guessed', 'date': '2026-10-20', 'time': '15:00'}
+    _, needs_llm = filler.fill(details, 'The name is for my husband', last_prompt=NAME_PROMPT, booking=True, today=TODAY)
+    assert needs_llm
@@ -0,0 +1,93 @@
+import time
+import threading
+
+from services.call_control import CancelToken
+from services.speculation import SpeculativeGenerator
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def recording_generator():
+    generated = []
+
+    def generate(call_sid, text, cancel_token):
+        generated.append(text)
+        return f"reply to {text}"
+
+    return generated, generate
+
+
+def test_only_the_settled_text_is_generated_and_taken():
+    speculator = SpeculativeGenerator(enabled=True, settle_ms=50)
+    generated, generate = recording_generator()
+
+    for text in ('I would like', 'I would like to book', 'I would like to book a table'):
+        speculator.propose('CA1', text, generate)
+    wait_for(lambda: generated)
+
+    reply = speculator.take('CA1', 'I would like to book a table.', CancelToken())
+    assert reply == 'reply to I would like to book a table'
+    assert generated == ['I would like to book a table']
+    assert speculator.stats()['hits'] == 1
+
+
+def test_one_sweeper_thread_serves_every_proposal():
+    speculator = SpeculativeGenerator(enabled=True, settle_ms=200)
+    generated, generate = recording_generator()
+    before = threading.active_count()
+
+    for i in range(50):
+        speculator.propose(f"CA{i % 5}", f"partial text number {i}", generate)
+
+    assert threading.active_count() - before <= 1
+    wait_for(lambda: len(generated) == 5)
+
+
+def test_final_transcript_that_differs_is_a_miss():
+    speculator = SpeculativeGenerator(enabled=True, settle_ms=10)
+    generated, generate = recording_generator()
+
+    speculator.propose('CA1', 'what time do you open', generate)
+    wait_for(lambda: generated)
+
+    assert speculator.take('CA1', 'what time do you close on sundays', CancelToken()) is None
+    assert speculator.stats()['misses'] == 1
+
+
+def test_uncollected_speculations_expire_as_misses():
+    speculator = SpeculativeGenerator(enabled=True, settle_ms=10, max_age=0.1)
+    generated, generate = recording_generator()
+
+    speculator.propose('CA1', 'cancel my appointment', generate)
+    wait_for(lambda: speculator.stats()['expired'] == 1)
+
+    stats = speculator.stats()
+    assert stats['misses'] == 1
+    assert stats['hitRate'] == 0.0
+    assert speculator.take('CA1', 'cancel my appointment', CancelToken()) is None
+
+
+def test_giving_up_on_a_running_speculation_is_a_miss():
+    speculator = SpeculativeGenerator(enabled=True, settle_ms=10)
+    started, release = threading.Event(), threading.Event()
+
+    def generate(call_sid, text, cancel_token):
+        started.set()
+        release.wait(2)
+        return 'too late'
+
+    speculator.propose('CA1', 'is anyone there', generate)
+    assert started.wait(2)
+
+    preempted = CancelToken()
+    preempted.cancel('new turn')
+    assert speculator.take('CA1', 'is anyone there', preempted) is None
+    release.set()
+
+    stats = speculator.stats()
+    assert (stats['hits'], stats['misses']) == (0, 1)
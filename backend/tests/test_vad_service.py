@@ -0,0 +1,79 @@
+from services.vad_service import VoiceActivityDetector, MediaStreamSession, decode_mulaw, encode_mulaw
+from tests.audio_fixtures import synthesize_pcm, media_messages
+
+CALL_SID = 'CA' + '1' * 32
+
+
+def run_session(segments):
+    """Feed synthetic audio through a session, returns the speech starts and ends it saw"""
+    calls = []
+    detector = VoiceActivityDetector()
+    process = detector.process
+
+    def record_end(frame):
+        event = process(frame)
+        if event == 'speech_end':
+            calls.append(('end', detector.utterance_ms))
+        return event
+
+    detector.process = record_end
+    session = MediaStreamSession(detector=detector, on_speech_start=lambda call_sid: calls.append(('start', call_sid)))
+    for message in media_messages(synthesize_pcm(segments), call_sid=CALL_SID):
+        session.handle_message(message)
+    return calls
+
+
+def test_mulaw_round_trip_stays_close():
+    samples = [0, 100, -100, 1000, -1000, 8000, -8000, 32000, -32000]
+    decoded = decode_mulaw(encode_mulaw(samples))
+    for original, restored in zip(samples, decoded):
+        # mu-law keeps roughly 3% relative precision
+        assert abs(original - restored) <= max(16, abs(original) * 0.04)
+
+
+def test_detects_speech_start_and_end():
+    calls = run_session([('silence', 500), ('speech', 800), ('silence', 1500)])
+
+    assert [call[0] for call in calls] == ['start', 'end']
+    assert calls[0][1] == CALL_SID
+    # The utterance covers the speech plus the end-of-speech hangover
+    assert 800 <= calls[1][1] <= 800 + 1200 + 100
+
+
+def test_speech_start_fires_within_onset_frames():
+    detector = VoiceActivityDetector()
+    quiet = synthesize_pcm([('silence', 200)])
+    speech = synthesize_pcm([('speech', 200)])
+
+    frame = 160
+    for offset in range(0, len(quiet), frame):
+        assert detector.process(quiet[offset:offset + frame]) is None
+
+    events = [detector.process(speech[offset:offset + frame]) for offset in range(0, len(speech), frame)]
+    assert events.index('speech_start') == detector.onset_frames - 1
+
+
+def test_broadband_noise_is_not_speech():
+    calls = run_session([('silence', 300), ('noise', 1000), ('silence', 500)])
+
+    assert calls == []
+
+
+def test_short_pause_does_not_end_utterance():
+    calls = run_session([('silence', 300), ('speech', 600), ('silence', 200), ('speech', 600), ('silence', 1500)])
+
+    assert [call[0] for call in calls] == ['start', 'end']
+
+
+def test_barge_in_interrupts_call(monkeypatch):
+    interrupted = []
+    monkeypatch.setattr(
+        'services.vad_service.call_interrupts.interrupt',
+        lambda call_sid, reason=None: interrupted.append((call_sid, reason))
+    )
+
+    session = MediaStreamSession()
+    for message in media_messages(synthesize_pcm([('silence', 300), ('speech', 300)]), call_sid=CALL_SID):
+        session.handle_message(message)
+
+    assert interrupted == [(CALL_SID, 'barge-in')]
@@ -0,0 +1,121 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from services.call_sync import TwilioCallSync
+from services.webhook_inbox import WebhookInbox
+
+
+def statuses(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = [row[0] for row in conn.execute('SELECT status FROM webhook_inbox ORDER BY id')]
+    conn.close()
+    return rows
+
+
+def retry_now(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE webhook_inbox SET next_attempt_at = '2000-01-01T00:00:00' WHERE status = 'pending'")
+    conn.close()
+
+
+def test_failed_event_backs_off_and_holds_back_later_events_of_the_same_key(voiceai_db):
+    inbox = WebhookInbox(max_attempts=2)
+    applied = []
+    failing = {'in-progress'}
+
+    def handler(payload):
+        if payload['status'] in failing:
+            raise RuntimeError('database busy')
+        applied.append((payload['sid'], payload['status']))
+
+    inbox.register('call-status', handler)
+    inbox.enqueue('call-status', 'CA1:in-progress', {'sid': 'CA1', 'status': 'in-progress'}, ordering_key='CA1')
+    inbox.enqueue('call-status', 'CA1:completed', {'sid': 'CA1', 'status': 'completed'}, ordering_key='CA1')
+    inbox.enqueue('call-status', 'CA2:completed', {'sid': 'CA2', 'status': 'completed'}, ordering_key='CA2')
+
+    # Other calls aren't held up, CA1's completed waits for its in-progress, which isn't retried straight away
+    inbox.drain()
+    assert applied == [('CA2', 'completed')]
+    assert statuses(voiceai_db) == ['pending', 'pending', 'done']
+
+    failing.clear()
+    retry_now(voiceai_db)
+    inbox.drain()
+    assert applied == [('CA2', 'completed'), ('CA1', 'in-progress'), ('CA1', 'completed')]
+
+
+def test_events_behind_a_permanently_failed_event_are_released(voiceai_db):
+    inbox = WebhookInbox(max_attempts=2)
+    applied = []
+
+    def handler(payload):
+        if payload['status'] == 'ringing':
+            raise RuntimeError('bad payload')
+        applied.append(payload['status'])
+
+    inbox.register('call-status', handler)
+    inbox.enqueue('call-status', 'CA1:ringing', {'status': 'ringing'}, ordering_key='CA1')
+    inbox.enqueue('call-status', 'CA1:completed', {'status': 'completed'}, ordering_key='CA1')
+
+    inbox.drain()
+    assert applied == []
+    assert statuses(voiceai_db) == ['pending', 'pending']
+
+    retry_now(voiceai_db)
+    inbox.drain()
+    assert applied == ['completed']
+    assert statuses(voiceai_db) == ['failed', 'done']
+
+
+def test_poll_behind_a_backed_off_event_does_not_write(voiceai_db):
+    inbox = WebhookInbox()
+    inbox.register('call-status', lambda payload: 1 / 0)
+    inbox.enqueue('call-status', 'CA1:ringing', {}, ordering_key='CA1')
+    inbox.enqueue('call-status', 'CA1:completed', {}, ordering_key='CA1')
+    inbox.drain()
+
+    writer = sqlite3.connect(voiceai_db, timeout=0)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        assert inbox.process_batch() == 0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_idle_poll_does_not_wait_for_the_write_lock(voiceai_db):
+    inbox = WebhookInbox()
+
+    writer = sqlite3.connect(voiceai_db, timeout=0)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        assert inbox.process_batch() == 0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_purge_removes_old_failed_events(voiceai_db):
+    inbox = WebhookInbox(max_attempts=1, retention_days=7)
+    inbox.register('call-status', lambda payload: 1 / 0)
+    inbox.enqueue('call-status', 'CA1:completed', {}, ordering_key='CA1')
+    inbox.drain()
+
+    conn = sqlite3.connect(voiceai_db)
+    with conn:
+        conn.execute('UPDATE webhook_inbox SET processed_at = ?', ((datetime.now() - timedelta(days=8)).isoformat(),))
+    conn.close()
+
+    assert inbox.purge() == 1
+
+
+def test_status_callback_never_moves_a_call_backwards(voiceai_db):
+    sync = TwilioCallSync()
+    sync.apply_status_callback({'CallSid': 'CA1', 'CallStatus': 'completed', 'CallDuration': '42'})
+    sync.apply_status_callback({'CallSid': 'CA1', 'CallStatus': 'in-progress'})
+
+    conn = sqlite3.connect(voiceai_db)
+    status, duration = conn.execute("SELECT status, duration FROM twilio_calls WHERE call_sid = 'CA1'").fetchone()
+    conn.close()
+    assert (status, duration) == ('completed', 42)
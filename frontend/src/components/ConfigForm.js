@@ -54,9 +54,9 @@ const ConfigForm = () => {
   const [twilioPhoneNumber, setTwilioPhoneNumber] = useState('');
 
   // LLM config
-  const [llmProvider, setLlmProvider] = useState('openai');
+  const [llmProvider, setLlmProvider] = useState('groq');
   const [llmApiKey, setLlmApiKey] = useState('');
-  const [llmModel, setLlmModel] = useState('gpt-3.5-turbo');
+  const [llmModel, setLlmModel] = useState('llama3-8b-8192');
 
   // Deepgram config
   const [deepgramApiKey, setDeepgramApiKey] = useState('');
@@ -81,9 +81,9 @@ const ConfigForm = () => {
         
         // Set LLM config
         if (config.llmConfig) {
-          setLlmProvider(config.llmConfig.provider || 'openai');
+          setLlmProvider(config.llmConfig.provider || 'groq');
           setLlmApiKey(config.llmConfig.apiKey || '');
-          setLlmModel(config.llmConfig.model || 'gpt-3.5-turbo');
+          setLlmModel(config.llmConfig.model || 'llama3-8b-8192');
         }
         
         // Set Deepgram config
@@ -246,7 +246,9 @@ const ConfigForm = () => {
                     onChange={(e) => setLlmProvider(e.target.value)}
                     label="Provider"
                   >
+                    <MenuItem value="groq">Groq</MenuItem>
                     <MenuItem value="openai">OpenAI</MenuItem>
+                    <MenuItem value="sutra">Sutra</MenuItem>
                     <MenuItem value="anthropic">Anthropic</MenuItem>
                     <MenuItem value="google">Google AI</MenuItem>
                   </Select>
@@ -272,6 +274,15 @@ const ConfigForm = () => {
                     onChange={(e) => setLlmModel(e.target.value)}
                     label="Model"
                   >
+                    {llmProvider === 'groq' && (
+                      <>
+                        <MenuItem value="llama3-8b-8192">Llama 3 8B</MenuItem>
+                        <MenuItem value="llama3-70b-8192">Llama 3 70B</MenuItem>
+                      </>
+                    )}
+                    {llmProvider === 'sutra' && (
+                      <MenuItem value="sutra-v2">Sutra V2</MenuItem>
+                    )}
                     {llmProvider === 'openai' && (
                       <>
                         <MenuItem value="gpt-3.5-turbo">GPT-3.5 Turbo</MenuItem>